@@ -0,0 +1,327 @@
+"""
+Пакетная обработка скважин с диска без Telegram.
+
+Примеры:
+    python batch.py wells/ --output-dir results/
+    python batch.py 'archive/2023/*' 'archive/2024/*' -o results/ --workers 4
+    python batch.py wells/ -o results/ --force     # пересчитать все
+
+Скважина - папка, в которой есть roH, roV и z (типы определяются по
+содержимому, имена файлов не важны). Папки и шаблоны glob просматриваются
+рекурсивно, результат каждой скважины пишется в predictions_<папка>.dat.
+Скважины, у которых результат новее входных файлов и модели, пропускаются.
+"""
+import argparse
+import contextlib
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import processor
+import well_archive
+import worker_pool
+
+DEFAULT_BATCH_WELLS = 16
+
+
+class BatchWell:
+    """Скважина на диске: файлы roH, roV, z и путь результата."""
+
+    def __init__(self, name, paths, output_path=None):
+        self.name = name
+        self.paths = paths  # [roH, roV, z]
+        self.output_path = output_path
+
+    def is_up_to_date(self, model_path):
+        """Результат существует и новее входных файлов и модели."""
+        try:
+            output_mtime = os.stat(self.output_path).st_mtime_ns
+        except OSError:
+            return False
+        return all(
+            os.stat(path).st_mtime_ns <= output_mtime
+            for path in self.paths + [model_path]
+        )
+
+
+def _pattern_root(pattern):
+    """Папка шаблона до первого элемента с символами glob."""
+    if os.path.isdir(pattern):
+        return pattern
+    parts = []
+    for part in pattern.split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or '.'
+
+
+def _expand(patterns):
+    """
+    Файлы по папкам и шаблонам glob (папки просматриваются рекурсивно).
+
+    Returns:
+        dict: путь файла: папка аргумента, по которой он найден
+    """
+    files = {}
+    for pattern in patterns:
+        root_dir = os.path.abspath(_pattern_root(pattern))
+        paths = [pattern] if os.path.isdir(pattern) else glob.glob(
+            pattern, recursive=True
+        )
+        for path in paths:
+            if os.path.isdir(path):
+                for root, dirs, names in os.walk(path):
+                    dirs[:] = [name for name in dirs if not name.startswith('.')]
+                    for name in names:
+                        if not name.startswith('.'):
+                            files.setdefault(
+                                os.path.abspath(os.path.join(root, name)), root_dir
+                            )
+            elif os.path.isfile(path):
+                files.setdefault(os.path.abspath(path), root_dir)
+    return dict(sorted(files.items()))
+
+
+def find_wells(patterns, output_dir):
+    """
+    Скважины по папкам и шаблонам glob.
+
+    Файлы группируются по папкам, тип файла определяется
+    get_file_type_by_content, файлы неизвестного типа пропускаются.
+
+    Returns:
+        tuple: (список BatchWell, список пар (папка, причина) для папок
+            без полного набора roH/roV/z или с лишними файлами)
+    """
+    folders = {}  # папка: {тип: путь}
+    roots = {}  # папка: папка аргумента
+    errors = {}  # папка: причина
+    for path, root_dir in _expand(patterns).items():
+        file_type = processor.get_file_type_by_content(path)
+        if file_type == 'unknown':
+            continue
+        folder = os.path.dirname(path)
+        files = folders.setdefault(folder, {})
+        roots.setdefault(folder, root_dir)
+        if file_type in files:
+            errors.setdefault(folder, f"несколько файлов типа {file_type}")
+        files[file_type] = path
+
+    wells = []
+    skipped = []
+    for folder, files in folders.items():
+        # Имя скважины - путь папки относительно папки аргумента,
+        # поэтому оно не зависит от остальных найденных скважин
+        name = os.path.relpath(folder, roots[folder])
+        if name == '.':
+            name = os.path.basename(folder)
+        name = name.replace(os.sep, '/')
+        missing = [
+            file_type for file_type in well_archive.FILE_TYPES
+            if file_type not in files
+        ]
+        if folder in errors:
+            skipped.append((name, errors[folder]))
+        elif missing:
+            skipped.append((name, "нет файлов: " + ", ".join(missing)))
+        else:
+            wells.append(BatchWell(
+                name, [files[file_type] for file_type in well_archive.FILE_TYPES]
+            ))
+
+    filenames = well_archive.prediction_filenames([well.name for well in wells])
+    for well, filename in zip(wells, filenames):
+        well.output_path = os.path.join(output_dir, filename)
+    return wells, skipped
+
+
+def _write_atomic(path, data):
+    """Запись через временный файл: оборванный результат не считается готовым."""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+
+def _load_well(paths):
+    """Разбор файлов скважины: (domain_h, domain_v, z)."""
+    well = []
+    for path, file_type in zip(paths, well_archive.FILE_TYPES):
+        with open(path, 'rb') as f:
+            parsed, _ = processor.prepare_input(f.read(), file_type)
+        well.append(parsed)
+    return tuple(well)
+
+
+def process_batch(batch):
+    """
+    Расчет пакета скважин одним вызовом processor.process_wells.
+
+    Если пакет не удалось посчитать, скважины считаются по одной,
+    чтобы ошибка одной скважины не останавливала остальные.
+
+    Args:
+        batch: пары (пути [roH, roV, z], путь результата)
+
+    Returns:
+        list: для каждой скважины пара (число глубин, ошибка или None)
+    """
+    if len(batch) > 1:
+        try:
+            wells = [_load_well(paths) for paths, _ in batch]
+            results = processor.process_wells(wells, cache=None)
+            for (_, output_path), data in zip(batch, results):
+                _write_atomic(output_path, data)
+            return [(len(well[2]), None) for well in wells]
+        except Exception:
+            pass
+
+    outcomes = []
+    for paths, output_path in batch:
+        try:
+            well = _load_well(paths)
+            _write_atomic(output_path, processor.process_wells([well], cache=None)[0])
+            outcomes.append((len(well[2]), None))
+        except Exception as e:
+            outcomes.append((0, str(e)))
+    return outcomes
+
+
+def _quiet_process_batch(batch):
+    """process_batch без сообщений processor в stdout процесса пула."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return process_batch(batch)
+
+
+def run(wells, workers=1, batch_wells=DEFAULT_BATCH_WELLS, log=print):
+    """
+    Расчет скважин пакетами в пуле процессов с выводом прогресса.
+
+    Returns:
+        tuple: (число посчитанных скважин, число глубин,
+            список пар (скважина, ошибка))
+    """
+    batches = [
+        wells[i:i + batch_wells] for i in range(0, len(wells), batch_wells)
+    ]
+    done = 0
+    depths = 0
+    failed = []
+    start = time.perf_counter()
+
+    def report(batch, outcomes):
+        nonlocal done, depths
+        for well, (n_depths, error) in zip(batch, outcomes):
+            done += 1
+            depths += n_depths
+            if error is not None:
+                failed.append((well.name, error))
+                log(f"❌ {well.name}: {error}")
+        elapsed = time.perf_counter() - start
+        rate = done / elapsed if elapsed else 0.0
+        eta = (len(wells) - done) / rate if rate else 0.0
+        log(
+            f"📊 {done}/{len(wells)} скважин, {rate:.2f} скважин/с, "
+            f"{depths / elapsed if elapsed else 0.0:.0f} глубин/с, "
+            f"осталось ~{eta:.0f} с"
+        )
+
+    def task(batch):
+        return [(well.paths, well.output_path) for well in batch]
+
+    if workers == 1:
+        for batch in batches:
+            report(batch, _quiet_process_batch(task(batch)))
+    else:
+        # Ядра делятся между процессами, как в пуле бота
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=worker_pool.configure_worker,
+            initargs=({'intra_op_threads': worker_pool.threads_per_worker(workers)},),
+        ) as executor:
+            futures = {
+                executor.submit(_quiet_process_batch, task(batch)): batch
+                for batch in batches
+            }
+            try:
+                for future in as_completed(futures):
+                    report(futures[future], future.result())
+            except BaseException:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    return done - len(failed), depths, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('inputs', nargs='+',
+                        help="папки или шаблоны glob с файлами roH/roV/z")
+    parser.add_argument('-o', '--output-dir', required=True,
+                        help="папка для файлов predictions_<скважина>.dat")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="число процессов")
+    parser.add_argument('--batch-wells', type=int, default=DEFAULT_BATCH_WELLS,
+                        help="скважин в одном вызове process_wells")
+    parser.add_argument('--force', action='store_true',
+                        help="пересчитать и скважины с готовым результатом")
+    args = parser.parse_args(argv)
+
+    if args.workers < 1 or args.batch_wells < 1:
+        parser.error("--workers и --batch-wells должны быть положительными")
+
+    def log(text):
+        print(text, file=sys.stderr)
+
+    model_path = processor.DEFAULT_MODEL_PATH
+    if not os.path.exists(model_path):
+        log(f"❌ Модель ONNX не найдена: {model_path}")
+        return 1
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    wells, skipped = find_wells(args.inputs, args.output_dir)
+    for name, reason in skipped:
+        log(f"⚠️ {name}: {reason}")
+
+    pending = [
+        well for well in wells if args.force or not well.is_up_to_date(model_path)
+    ]
+    log(
+        f"🔍 Найдено скважин: {len(wells)}, с готовым результатом: "
+        f"{len(wells) - len(pending)}, к расчету: {len(pending)}"
+    )
+    if not wells and not skipped:
+        log("❌ Не найдено ни одной скважины")
+        return 1
+
+    start = time.perf_counter()
+    processed, depths, failed = run(
+        pending, workers=min(args.workers, max(len(pending), 1)),
+        batch_wells=args.batch_wells, log=log
+    ) if pending else (0, 0, [])
+    elapsed = time.perf_counter() - start
+
+    log(
+        f"✅ Готово за {elapsed:.1f} с: посчитано {processed}, "
+        f"пропущено готовых {len(wells) - len(pending)}, "
+        f"ошибок {len(failed)}, неполных папок {len(skipped)}"
+    )
+    if processed and elapsed:
+        log(
+            f"   {processed / elapsed:.2f} скважин/с, "
+            f"{depths / elapsed:.0f} глубин/с"
+        )
+    return 1 if failed or skipped else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
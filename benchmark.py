@@ -0,0 +1,382 @@
+"""
+Воспроизводимый бенчмарк обработки на синтетических скважинах.
+
+Примеры:
+    python benchmark.py                       # базовый набор сценариев
+    python benchmark.py --full --repeat 5     # полная сетка параметров
+    python benchmark.py --output new.json --compare old.json
+
+Результаты (время этапов, пропускная способность, пиковая память)
+пишутся в JSON, который можно сравнивать между коммитами.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import onnxruntime as ort
+
+import processor
+from metrics import metrics
+
+# Базовый сценарий; в наборе по умолчанию от него меняется один параметр
+BASE_SCENARIO = {
+    'layers': 1000, 'interval_m': 1000.0, 'anisotropic': 0.5, 'z_step': 0.1
+}
+LAYERS = (10, 100, 1000, 10000)
+INTERVALS_M = (100.0, 1000.0, 5000.0)
+ANISOTROPIC_FRACTIONS = (0.0, 0.5, 1.0)
+Z_STEPS = (0.1, 0.2)
+
+# Глубина кровли интервала и запас модели за его границами (м)
+TOP_DEPTH = 1000.0
+MODEL_MARGIN = 30.0
+
+# Наименьшая толщина слоя (м): слои тоньше шага сетки модели
+# сеть не различает
+MIN_THICKNESS = processor.MODEL_STEP
+
+# Диапазоны параметров слоя: (нижняя, верхняя граница, логарифмическая
+# шкала). Сопротивления (Ом·м) берутся равномерно по логарифму, диаметры (м)
+# - равномерно; вне этих диапазонов предсказания сети уходят в 0 или inf
+LAYER_PARAMETERS = (
+    ('mud_resistivity', 0.05, 2.0, True),
+    ('borehole_diameter', 0.15, 0.3, False),
+    ('invaded_resistivity', 1.0, 100.0, True),
+    ('invasion_diameter', 0.3, 2.0, False),
+    ('resistivity', 1.0, 200.0, True),
+)
+# Отношение вертикального сопротивления к горизонтальному
+# в анизотропных слоях
+ANISOTROPY_RANGE = (1.0, 4.0)
+
+STAGES = (
+    'parse', 'crop', 'rasterize', 'modify_matrix', 'normalize',
+    'session_run', 'postprocess', 'write'
+)
+
+
+def fits(layers, interval_m):
+    """Помещаются ли слои толщиной от MIN_THICKNESS в модель интервала."""
+    return layers * MIN_THICKNESS <= interval_m + 2 * MODEL_MARGIN
+
+
+def make_dataset(layers, interval_m, anisotropic, z_step, seed=0):
+    """
+    Синтетические файлы roH.obl, roV.obl и z.ini.
+
+    Толщины слоев случайны, но не меньше MIN_THICKNESS; значения слоев
+    берутся из диапазонов LAYER_PARAMETERS. Изотропный
+    слой: 5 параметров в roH, в roV они же и то же сопротивление пласта.
+    Анизотропный: сопротивление раствора, диаметр скважины и
+    горизонтальное сопротивление в roH, в roV к ним добавляется
+    вертикальное (ANISOTROPY_RANGE).
+
+    Args:
+        layers: число слоев модели
+        interval_m: длина интервала глубин z (м)
+        anisotropic: доля анизотропных слоев (3 значения в roH,
+            4 в roV) среди изотропных (5 и 6 значений)
+        z_step: шаг глубин z (0.1 или 0.2 м)
+        seed: зерно генератора
+
+    Returns:
+        tuple: (roH, roV, z) в bytes
+    """
+    rng = np.random.default_rng(seed)
+
+    model_top = TOP_DEPTH - MODEL_MARGIN
+    model_length = interval_m + 2 * MODEL_MARGIN
+    if not fits(layers, interval_m):
+        raise ValueError(
+            f"{layers} слоев толщиной от {MIN_THICKNESS} м "
+            f"не помещаются в модель длиной {model_length} м"
+        )
+    thickness = MIN_THICKNESS + rng.dirichlet(np.ones(layers)) * (
+        model_length - layers * MIN_THICKNESS
+    )
+    bounds = model_top + np.concatenate(([0.0], np.cumsum(thickness)))
+    bounds[-1] = model_top + model_length
+    values = np.empty((layers, len(LAYER_PARAMETERS)))
+    for column, (_, low, high, log_scale) in enumerate(LAYER_PARAMETERS):
+        if log_scale:
+            values[:, column] = np.exp(
+                rng.uniform(np.log(low), np.log(high), layers)
+            )
+        else:
+            values[:, column] = rng.uniform(low, high, layers)
+    is_anisotropic = rng.random(layers) < anisotropic
+    vertical = values[:, -1] * np.where(
+        is_anisotropic, rng.uniform(*ANISOTROPY_RANGE, layers), 1.0
+    )
+
+    roh_lines = []
+    rov_lines = []
+    for i in range(layers):
+        depths = f"{bounds[i]:.4f} {bounds[i + 1]:.4f}"
+        roh_values = values[i, [0, 1, 4]] if is_anisotropic[i] else values[i]
+        roh_line = depths + "".join(f" {v:.3f}" for v in roh_values)
+        roh_lines.append(roh_line)
+        rov_lines.append(roh_line + f" {vertical[i]:.3f}")
+
+    n_depths = int(round(interval_m / z_step)) + 1
+    z = np.round(TOP_DEPTH + np.arange(n_depths) * z_step, 1)
+    z_lines = ["DEPT"] + [f"{depth:.1f}" for depth in z]
+
+    return tuple(
+        ("\n".join(lines) + "\n").encode('utf-8')
+        for lines in (roh_lines, rov_lines, z_lines)
+    )
+
+
+def scenarios(full=False):
+    """
+    Сценарии: полная сетка или изменение одного параметра от базового.
+
+    Сочетания, где слои не помещаются в интервал (см. fits), пропускаются.
+    """
+    if full:
+        for layers, interval_m, anisotropic, z_step in itertools.product(
+            LAYERS, INTERVALS_M, ANISOTROPIC_FRACTIONS, Z_STEPS
+        ):
+            if not fits(layers, interval_m):
+                continue
+            yield {
+                'layers': layers, 'interval_m': interval_m,
+                'anisotropic': anisotropic, 'z_step': z_step
+            }
+        return
+
+    seen = []
+    for key, options in (
+        ('layers', LAYERS), ('interval_m', INTERVALS_M),
+        ('anisotropic', ANISOTROPIC_FRACTIONS), ('z_step', Z_STEPS)
+    ):
+        for value in options:
+            scenario = dict(BASE_SCENARIO, **{key: value})
+            if scenario not in seen:
+                seen.append(scenario)
+                yield scenario
+
+
+def run_pipeline(solver, dataset):
+    """Разбор, расчет и запись результата в памяти, как для загрузок бота."""
+    roh_data, rov_data, z_data = dataset
+    domain_h = processor.LayerTable.from_flat(*processor.parse_obl_buffer(roh_data))
+    domain_v = processor.LayerTable.from_flat(*processor.parse_obl_buffer(rov_data))
+    z = processor.parse_z_buffer(z_data)
+
+    start = time.perf_counter()
+    predictions = solver(domain_h, domain_v, z)
+    solver_time = time.perf_counter() - start
+
+    processor.predictions_to_bytes(z, predictions)
+    return solver_time
+
+
+def measure(solver, dataset, repeat):
+    """Время этапов и всей обработки (медиана и минимум по повторам)."""
+    totals = []
+    solver_times = []
+    stage_times = {stage: [] for stage in STAGES}
+
+    for _ in range(repeat):
+        metrics.take_snapshot()
+        start = time.perf_counter()
+        solver_times.append(run_pipeline(solver, dataset))
+        totals.append(time.perf_counter() - start)
+
+        _, histograms = metrics.take_snapshot()
+        for stage in STAGES:
+            values = histograms.get(
+                ('bkz_stage_duration_seconds', (('stage', stage),))
+            )
+            stage_times[stage].append(values[-2] if values else 0.0)
+
+    def summary(values):
+        return {'median': statistics.median(values), 'min': min(values)}
+
+    return {
+        'total': summary(totals),
+        'solver': summary(solver_times),
+        'stages': {stage: summary(values) for stage, values in stage_times.items()},
+    }
+
+
+def measure_memory(solver, dataset):
+    """
+    Пиковая память одного прогона.
+
+    tracemalloc учитывает массивы NumPy, но не память ONNX Runtime;
+    ru_maxrss - пик всего процесса с начала запуска.
+    """
+    tracemalloc.start()
+    try:
+        run_pipeline(solver, dataset)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        max_rss *= 1024  # в Linux ru_maxrss в КБ
+    return {'traced_peak_bytes': peak, 'max_rss_bytes': max_rss}
+
+
+def environment(model_path):
+    """Сведения о коде и окружении для сравнения результатов."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'onnxruntime': ort.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'model': os.path.basename(model_path),
+        'session_config': processor.SESSION_CONFIG,
+    }
+
+
+def run_benchmark(model_path=processor.DEFAULT_MODEL_PATH, full=False,
+                  repeat=3, seed=0, window_size=None, log=print):
+    """Прогон всех сценариев; результат - словарь для JSON."""
+    # Без кэша подготовки входа: иначе со второго повтора этапы
+    # подготовки не выполняются и не измеряются
+    solver = processor.BKZStd6GradientNNSolver(
+        model_path, window_size=window_size, grid_cache=None
+    )
+    solver.warm_up()
+
+    results = []
+    for index, scenario in enumerate(scenarios(full)):
+        dataset = make_dataset(**scenario, seed=seed + index)
+        n_depths = len(dataset[2].splitlines()) - 1
+
+        timings = measure(solver, dataset, repeat)
+        memory = measure_memory(solver, dataset)
+        solver_time = timings['solver']['median']
+        total_time = timings['total']['median']
+        input_bytes = sum(len(data) for data in dataset)
+
+        result = dict(scenario)
+        result.update({
+            'depths': n_depths,
+            'input_bytes': input_bytes,
+            'timings_s': timings,
+            'throughput': {
+                'depths_per_s': n_depths / solver_time if solver_time else None,
+                'input_mb_per_s': (
+                    input_bytes / 1024 / 1024 / total_time if total_time else None
+                ),
+            },
+            'memory': memory,
+        })
+        results.append(result)
+
+        log(
+            f"layers={scenario['layers']:>5} interval={scenario['interval_m']:>6.0f} м "
+            f"aniso={scenario['anisotropic']:.1f} step={scenario['z_step']:.1f}: "
+            f"всего {total_time * 1000:8.1f} мс, решатель {solver_time * 1000:8.1f} мс, "
+            f"{result['throughput']['depths_per_s']:10.0f} глубин/с, "
+            f"пик {memory['traced_peak_bytes'] / 1024 / 1024:7.1f} МБ"
+        )
+
+    return {
+        'environment': environment(solver.model_path),
+        'settings': {
+            'full': full, 'repeat': repeat, 'seed': seed,
+            'window_size': window_size,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, log=print):
+    """Сравнение медианного полного времени с прошлым отчетом."""
+    def key(result):
+        return tuple(result[name] for name in BASE_SCENARIO)
+
+    previous = {key(result): result for result in baseline['results']}
+    log(f"Сравнение с {baseline['environment'].get('commit')}:")
+    for result in report['results']:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        new_time = result['timings_s']['total']['median']
+        old_time = old['timings_s']['total']['median']
+        log(
+            f"  {key(result)}: {old_time * 1000:.1f} → {new_time * 1000:.1f} мс "
+            f"({new_time / old_time:.2f}x)"
+        )
+
+
+def json_safe_stdout():
+    """
+    Перенаправление сообщений processor (print) в stderr, чтобы stdout
+    оставался для JSON с результатами (benchmark.py, quantize.py).
+    """
+    return contextlib.redirect_stdout(sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', default=processor.DEFAULT_MODEL_PATH,
+                        help="путь к модели ONNX")
+    parser.add_argument('--full', action='store_true',
+                        help="полная сетка параметров вместо базового набора")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="число замеров каждого сценария")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="зерно генератора синтетических данных")
+    parser.add_argument('--window-size', type=int, default=None,
+                        help="оконный режим решателя (строк модели на окно)")
+    parser.add_argument('--output', help="файл JSON с результатами "
+                                         "(по умолчанию - stdout)")
+    parser.add_argument('--compare', help="прошлый JSON для сравнения")
+    args = parser.parse_args(argv)
+
+    if args.repeat < 1:
+        parser.error("--repeat должен быть положительным")
+
+    def log(text):
+        print(text, file=sys.stderr)
+
+    with json_safe_stdout():
+        report = run_benchmark(
+            args.model, full=args.full, repeat=args.repeat, seed=args.seed,
+            window_size=args.window_size, log=log
+        )
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f), log=log)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        log(f"✅ Результаты сохранены в: {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
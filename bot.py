@@ -1,7 +1,7 @@
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command, CommandStart
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.types import (
-    FSInputFile, 
+    BufferedInputFile, 
     ReplyKeyboardMarkup, 
     KeyboardButton, 
     ReplyKeyboardRemove,
@@ -11,14 +11,32 @@ from aiogram.types import (
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 import asyncio
 import os
-import tempfile
-from config import BOT_TOKEN
-from utils import file_manager, get_file_type
+from config import (
+    BOT_TOKEN, UPLOADS_IN_MEMORY, UPLOAD_SWEEP_INTERVAL_SECONDS, SPECULATIVE_PROCESSING,
+    ARCHIVE_MAX_WELLS, ARCHIVE_MAX_MB, ARCHIVE_BATCH_WELLS, ONNX_WARMUP
+)
+from utils import file_manager, detect_file_type, read_file_head, SNIFF_BYTES
+from scheduler import job_scheduler, QueueFullError
 import processor
+import well_archive
+from metrics import metrics
 
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
 
+# Максимальный размер файла и архива (Bot API скачивает файлы до 20 МБ)
+MAX_FILE_BYTES = 10 * 1024 * 1024
+MAX_ARCHIVE_BYTES = 20 * 1024 * 1024
+# Сколько пропущенных скважин архива перечислять в сообщении
+ARCHIVE_REPORT_LINES = 20
+
+# Слова в /intervals, просящие один общий файл вместо файла на интервал
+COMBINED_WORDS = ('вместе', 'combined')
+
+# Обработки, запущенные заранее при загрузке третьего файла:
+# user_id -> ((roh, rov, z), asyncio.Task)
+speculative_runs = {}
+
 # ==================== КЛАВИАТУРЫ ====================
 
 def get_main_keyboard():
@@ -89,6 +107,8 @@ async def cmd_start(message: types.Message):
         "• Бот сам определит тип каждого файла\n"
         "• Поддерживаются файлы .obl, .ini, .txt\n"
         "• Максимальный размер файла: 10 МБ\n"
+        "• Много скважин сразу: архив .zip или .tar, в нем по папке "
+        "с roH, roV и z на скважину\n"
         "• Обработка занимает несколько секунд\n\n"
         "📌 Используйте кнопки ниже для управления:"
     )
@@ -117,6 +137,8 @@ async def cmd_help(message: types.Message):
         "/start - Главное меню\n"
         "/clear - Удалить все файлы\n"
         "/status - Показать загруженные файлы\n"
+        "/intervals 1000-1100 1250-1300 - Расчет по интервалам глубин из z.ini "
+        "(файл на интервал, со словом «вместе» - один файл)\n"
         "/help - Эта справка\n\n"
         "⚠️ *Ограничения:*\n"
         "• Максимум 10 МБ на файл\n"
@@ -135,6 +157,7 @@ async def cmd_help(message: types.Message):
 async def cmd_clear(message: types.Message):
     """Обработка команды /clear."""
     user_id = message.from_user.id
+    discard_speculative_run(user_id)
     file_manager.clear_user_files(user_id)
     await message.answer(
         "✅ Все ваши файлы удалены.\n\n"
@@ -147,6 +170,25 @@ async def cmd_status(message: types.Message):
     """Обработка команды /status."""
     await show_status(message)
 
+@dp.message(Command("intervals"))
+async def cmd_intervals(message: types.Message, command: CommandObject):
+    """Обработка команды /intervals: несколько интервалов одной модели."""
+    args = (command.args or "").split()
+    combined = any(arg.lower() in COMBINED_WORDS for arg in args)
+    try:
+        intervals = processor.parse_depth_intervals(
+            " ".join(arg for arg in args if arg.lower() not in COMBINED_WORDS)
+        )
+    except ValueError as e:
+        await message.answer(
+            f"❌ {str(e)}\n\n"
+            "Пример: /intervals 1000-1100 1250-1300\n"
+            "Чтобы получить один файл, добавьте слово «вместе».",
+            reply_markup=get_main_keyboard()
+        )
+        return
+    await process_user_intervals(message.from_user.id, message, intervals, combined)
+
 # ==================== ОБРАБОТЧИКИ КНОПОК ====================
 
 @dp.message(F.text == "📤 Отправить файлы")
@@ -196,7 +238,7 @@ async def handle_clear(message: types.Message):
         )
         return
     
-    file_list = "\n".join([f"• {os.path.basename(f)}" for f in user_files])
+    file_list = "\n".join([f"• {f.name}" for f in user_files])
     
     # Создаем временную клавиатуру для подтверждения
     confirm_keyboard = ReplyKeyboardMarkup(
@@ -221,6 +263,7 @@ async def handle_clear(message: types.Message):
 async def handle_confirm_clear(message: types.Message):
     """Подтверждение удаления файлов."""
     user_id = message.from_user.id
+    discard_speculative_run(user_id)
     file_manager.clear_user_files(user_id)
     await message.answer(
         "✅ Все файлы успешно удалены!",
@@ -244,12 +287,14 @@ async def handle_help(message: types.Message):
 async def handle_restart(message: types.Message):
     """Обработка нажатия кнопки 'Перезапустить'."""
     user_id = message.from_user.id
+    discard_speculative_run(user_id)
     file_manager.clear_user_files(user_id)
     await cmd_start(message)
 
 @dp.message(F.text == "❌ Отмена")
 async def handle_cancel(message: types.Message):
     """Обработка нажатия кнопки 'Отмена'."""
+    discard_speculative_run(message.from_user.id)
     await message.answer(
         "❌ Действие отменено.",
         reply_markup=get_main_keyboard()
@@ -264,6 +309,7 @@ async def handle_start_processing(message: types.Message):
 @dp.message(F.text == "❌ Нет, отправить ещё файлы")
 async def handle_more_files(message: types.Message):
     """Пользователь хочет отправить больше файлов."""
+    discard_speculative_run(message.from_user.id)
     await message.answer(
         "❌ Обработка отменена.\n\n"
         "Вы можете отправить другие файлы.",
@@ -300,10 +346,10 @@ async def show_status(message: types.Message):
         return
     
     file_info = []
-    for i, file_path in enumerate(user_files, 1):
-        filename = os.path.basename(file_path)
-        file_type = get_file_type(filename)
-        size = os.path.getsize(file_path) / 1024  # размер в КБ
+    for i, user_file in enumerate(user_files, 1):
+        filename = user_file.name
+        file_type = user_file.file_type
+        size = user_file.size / 1024  # размер в КБ
         
         file_info.append(
             f"{i}. *{filename}*\n"
@@ -333,6 +379,11 @@ async def handle_document(message: types.Message):
     user_id = message.from_user.id
     document = message.document
     
+    # Архив со многими скважинами обрабатывается целиком
+    if well_archive.is_archive_name(document.file_name):
+        await handle_archive(message)
+        return
+    
     # Проверяем расширение файла
     allowed_extensions = ['.obl', '.ini', '.txt', '.dat']
     file_ext = os.path.splitext(document.file_name)[1].lower()
@@ -347,7 +398,7 @@ async def handle_document(message: types.Message):
         return
     
     # Проверяем размер файла (максимум 10 MB)
-    if document.file_size and document.file_size > 10 * 1024 * 1024:
+    if document.file_size and document.file_size > MAX_FILE_BYTES:
         await message.answer(
             "❌ Файл слишком большой. Максимальный размер: *10 МБ*.",
             parse_mode="Markdown",
@@ -356,22 +407,60 @@ async def handle_document(message: types.Message):
         return
     
     try:
-        # Создаём временную папку для пользователя
-        temp_dir = os.path.join(tempfile.gettempdir(), f"tg_bot_{user_id}")
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # Скачиваем файл
-        file_path = os.path.join(temp_dir, document.file_name)
+        # Набор файлов меняется, заранее начатая обработка не нужна
+        discard_speculative_run(user_id)
         
         await message.answer(f"📥 *Загружаю {document.file_name}...*", parse_mode="Markdown")
-        await bot.download(document, destination=file_path)
         
-        # Сохраняем информацию о файле
-        file_manager.add_file(user_id, file_path)
+        if UPLOADS_IN_MEMORY:
+            # Скачиваем файл в память, без записи на диск
+            data = (await bot.download(document)).getvalue()
+            # Тип определяется один раз по началу содержимого
+            file_type = detect_file_type(data[:SNIFF_BYTES], document.file_name)
+            replaced = file_manager.add_data(
+                user_id, document.file_name, data, file_type
+            )
+        else:
+            # Создаём временную папку для пользователя
+            temp_dir = file_manager.user_dir(user_id)
+            os.makedirs(temp_dir, exist_ok=True)
+            
+            # Скачиваем файл
+            file_path = os.path.join(temp_dir, document.file_name)
+            await bot.download(document, destination=file_path)
+            file_type = detect_file_type(
+                read_file_head(file_path), document.file_name
+            )
+            
+            # Сохраняем информацию о файле
+            replaced = file_manager.add_file(user_id, file_path, file_type)
+        
+        # Файл разбирается сразу, в отдельном потоке: ошибки формата видны
+        # при загрузке, а обработка начнется с готовых массивов
+        user_file = file_manager.get_user_file(user_id, file_type)
+        if user_file is not None:
+            user_file.prepared = asyncio.ensure_future(
+                asyncio.to_thread(prepare_user_file, user_file, file_type)
+            )
+            try:
+                await user_file.prepared
+            except ValueError as e:
+                file_manager.remove_file(user_id, user_file)
+                metrics.inc('bkz_errors_total', source='upload')
+                await message.answer(
+                    f"❌ *Ошибка формата файла {document.file_name}:*\n\n{str(e)}\n\n"
+                    "Файл не сохранён. Исправьте его и отправьте снова.",
+                    parse_mode="Markdown",
+                    reply_markup=get_main_keyboard()
+                )
+                return
         
         # Проверяем количество файлов
         user_files = file_manager.get_user_files(user_id)
-        file_type = get_file_type(document.file_name)
+        replaced_note = (
+            f"♻️ Заменён ранее загруженный файл {replaced.name}\n\n"
+            if replaced is not None else ""
+        )
         
         await message.answer(
             f"✅ *Файл успешно загружен!*\n\n"
@@ -379,6 +468,7 @@ async def handle_document(message: types.Message):
             f"• Имя: {document.file_name}\n"
             f"• Тип: {file_type}\n"
             f"• Размер: {document.file_size / 1024:.1f} КБ\n\n"
+            f"{replaced_note}"
             f"📊 *Прогресс:* {len(user_files)}/3 файлов",
             parse_mode="Markdown",
             reply_markup=get_main_keyboard()
@@ -386,6 +476,9 @@ async def handle_document(message: types.Message):
         
         # Если есть 3 файла - предлагаем начать обработку
         if len(user_files) == 3:
+            # Обработка начинается сразу, не дожидаясь подтверждения
+            if SPECULATIVE_PROCESSING:
+                start_speculative_run(user_id)
             await message.answer(
                 "🎯 *Все файлы загружены!*\n\n"
                 "Хотите начать обработку?",
@@ -399,6 +492,275 @@ async def handle_document(message: types.Message):
             reply_markup=get_main_keyboard()
         )
 
+async def handle_archive(message: types.Message):
+    """Пакетная обработка архива со скважинами в отдельных папках."""
+    user_id = message.from_user.id
+    document = message.document
+    
+    if document.file_size and document.file_size > MAX_ARCHIVE_BYTES:
+        await message.answer(
+            "❌ Архив слишком большой. Максимальный размер: *20 МБ*.",
+            parse_mode="Markdown",
+            reply_markup=get_main_keyboard()
+        )
+        return
+    
+    status_message = await message.answer(
+        f"📦 Загружаю архив {document.file_name}..."
+    )
+    try:
+        await process_archive(user_id, message, document, status_message)
+    except Exception as e:
+        await message.answer(
+            f"❌ Ошибка обработки архива {document.file_name}:\n\n{str(e)}\n\n"
+            "Пожалуйста, проверьте архив и попробуйте снова.",
+            reply_markup=get_main_keyboard()
+        )
+
+async def process_archive(user_id, message, document, status_message):
+    """Загрузка, расчет и отправка результатов архива (см. handle_archive)."""
+    try:
+        archive = await bot.download(document)
+        # Файлы распаковываются и разбираются по одному в отдельном потоке
+        wells, skipped = await asyncio.to_thread(
+            well_archive.read_wells, archive, document.file_name,
+            ARCHIVE_MAX_WELLS, MAX_FILE_BYTES, ARCHIVE_MAX_MB * 1024 * 1024
+        )
+    except ValueError as e:
+        metrics.inc('bkz_errors_total', source='upload')
+        await message.answer(
+            f"❌ Ошибка архива {document.file_name}:\n\n{str(e)}",
+            reply_markup=get_main_keyboard()
+        )
+        return
+    
+    if not wells:
+        await message.answer(
+            "❌ В архиве нет папок с полным набором файлов roH, roV и z.\n\n"
+            + format_archive_report(skipped),
+            reply_markup=get_main_keyboard()
+        )
+        return
+    
+    results = []
+    failed = []
+    on_position = queue_position_notifier(message)
+    
+    async def show_progress():
+        done = len(results) + len(failed)
+        await status_message.edit_text(
+            f"📦 Скважин в архиве: {len(wells)}\n"
+            f"⚙ Обработано: {done}/{len(wells)}"
+        )
+    
+    try:
+        await show_progress()
+        for start in range(0, len(wells), ARCHIVE_BATCH_WELLS):
+            chunk = wells[start:start + ARCHIVE_BATCH_WELLS]
+            chunk_results, chunk_failed = await run_archive_wells(
+                user_id, chunk, on_position
+            )
+            results.extend(chunk_results)
+            failed.extend(chunk_failed)
+            await show_progress()
+    except QueueFullError:
+        await message.answer(
+            "🚦 *Сервер сейчас перегружен.*\n\n"
+            "Отправьте архив ещё раз через минуту.",
+            parse_mode="Markdown",
+            reply_markup=get_main_keyboard()
+        )
+        return
+    
+    report = format_archive_report(skipped + failed)
+    if not results:
+        await message.answer(
+            "❌ Не удалось обработать ни одной скважины.\n\n" + report,
+            reply_markup=get_main_keyboard()
+        )
+        return
+    
+    if report:
+        await message.answer(report)
+    await message.answer("📤 *Отправляю результат...*", parse_mode="Markdown")
+    archive_data = await asyncio.to_thread(well_archive.pack_predictions, results)
+    await message.answer_document(
+        BufferedInputFile(archive_data, filename="predictions.zip"),
+        caption=(
+            f"✅ *Обработка завершена!*\n\n"
+            f"📄 Обработано скважин: {len(results)} из "
+            f"{len(wells) + len(skipped)}."
+        ),
+        parse_mode="Markdown",
+        reply_markup=get_main_keyboard()
+    )
+
+async def run_archive_wells(user_id, wells, on_position=None):
+    """
+    Расчет скважин архива одной задачей очереди.
+    
+    Returns:
+        tuple: (пары (имя скважины, bytes .dat), пары (имя, ошибка))
+    """
+    # Скважины, уже посчитанные раньше, отдаются из кэша без очереди
+    cache_keys = [processor.cache_key_for_digests(well.digests) for well in wells]
+    results = await get_cached_results(cache_keys, processor.predictions_to_bytes)
+    to_solve = [i for i, result in enumerate(results) if result is None]
+    if not to_solve:
+        return [(well.name, result) for well, result in zip(wells, results)], []
+    
+    try:
+        solved = await job_scheduler.submit(
+            user_id,
+            processor.process_wells,
+            [(wells[i].domain_h, wells[i].domain_v, wells[i].z) for i in to_solve],
+            [cache_keys[i] for i in to_solve],
+            on_position=on_position
+        )
+    except QueueFullError:
+        raise
+    except Exception as e:
+        if len(wells) == 1:
+            return [], [(wells[0].name, str(e))]
+        # Ошибка одной скважины не должна останавливать остальные
+        failed = []
+        for i in to_solve:
+            well_results, well_failed = await run_archive_wells(
+                user_id, [wells[i]], on_position
+            )
+            if well_results:
+                results[i] = well_results[0][1]
+            failed.extend(well_failed)
+        done = [
+            (well.name, result) for well, result in zip(wells, results)
+            if result is not None
+        ]
+        return done, failed
+    
+    for i, result in zip(to_solve, solved):
+        results[i] = result
+    return [(well.name, result) for well, result in zip(wells, results)], []
+
+def format_archive_report(skipped):
+    """Список пропущенных скважин архива с причинами."""
+    if not skipped:
+        return ""
+    lines = [f"⚠ Пропущено скважин: {len(skipped)}"]
+    lines.extend(
+        f"• {name}: {reason}" for name, reason in skipped[:ARCHIVE_REPORT_LINES]
+    )
+    if len(skipped) > ARCHIVE_REPORT_LINES:
+        lines.append(f"… и ещё {len(skipped) - ARCHIVE_REPORT_LINES}")
+    return "\n".join(lines)
+
+def prepare_user_file(user_file, file_type):
+    """Разбор файла пользователя (выполняется в отдельном потоке)."""
+    return processor.prepare_input(user_file.read(), file_type)
+
+async def get_prepared(user_file, file_type):
+    """Разобранный файл и его хэш; разбор, если он не был сделан при загрузке."""
+    if user_file.prepared is None or user_file.file_type != file_type:
+        return await asyncio.to_thread(prepare_user_file, user_file, file_type)
+    return await user_file.prepared
+
+def read_cached_results(cache_keys, to_bytes, require_all=False):
+    """
+    Готовые результаты из кэша: to_bytes(z, предсказания) или None для
+    каждого ключа. С require_all - только если в кэше есть все ключи,
+    иначе None. Попадания учитываются, только если результат отдается
+    отсюда; остальное учитывает задача очереди.
+    """
+    cached = processor.cached_results(cache_keys)
+    if require_all and any(result is None for result in cached):
+        return None
+    results = [
+        None if result is None else to_bytes(*result) for result in cached
+    ]
+    hits = sum(result is not None for result in results)
+    if hits:
+        metrics.inc('bkz_cache_requests_total', hits, result='hit')
+    return results
+
+async def get_cached_results(cache_keys, to_bytes, require_all=False):
+    """Результаты из кэша до постановки задачи в очередь (чтение в отдельном потоке)."""
+    return await asyncio.to_thread(
+        read_cached_results, cache_keys, to_bytes, require_all
+    )
+
+async def run_processing(user_id, roh_file, rov_file, z_file, on_position=None):
+    """Расчет по файлам пользователя через очередь задач: (bytes .dat, из кэша ли)."""
+    # Файлы уже разобраны при загрузке
+    (domain_h, roh_digest), (domain_v, rov_digest), (z, z_digest) = (
+        await asyncio.gather(
+            get_prepared(roh_file, 'roh'),
+            get_prepared(rov_file, 'rov'),
+            get_prepared(z_file, 'z')
+        )
+    )
+    cache_key = processor.cache_key_for_digests(
+        [roh_digest, rov_digest, z_digest]
+    )
+    
+    # Результат из кэша не ждет в очереди за чужими задачами
+    [cached] = await get_cached_results([cache_key], processor.predictions_to_bytes)
+    if cached is not None:
+        return cached, True
+    
+    # Запускаем обработку в пуле процессов через очередь задач; повторный
+    # расчет той же модели с другим z.ini идет в процесс с ее кэшем
+    return await job_scheduler.submit(
+        user_id,
+        processor.process_prepared,
+        domain_h, domain_v, z, cache_key,
+        on_position=on_position,
+        affinity=(roh_digest, rov_digest)
+    )
+
+def start_speculative_run(user_id):
+    """Запуск обработки до подтверждения, если типы всех файлов известны."""
+    files = tuple(
+        file_manager.get_user_file(user_id, file_type)
+        for file_type in ('roh', 'rov', 'z')
+    )
+    if None in files:
+        return
+    
+    discard_speculative_run(user_id)
+    task = asyncio.create_task(run_processing(user_id, *files))
+    # Ошибка будет показана, только если пользователь подтвердит обработку
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+    speculative_runs[user_id] = (files, task)
+
+def discard_speculative_run(user_id):
+    """Отмена заранее начатой обработки; ее результат не нужен."""
+    run = speculative_runs.pop(user_id, None)
+    if run is not None:
+        run[1].cancel()
+
+def take_speculative_run(user_id, files):
+    """Заранее начатая обработка тех же файлов или None."""
+    run = speculative_runs.pop(user_id, None)
+    if run is None:
+        return None
+    
+    run_files, task = run
+    usable = all(a is b for a, b in zip(run_files, files)) and not (
+        task.done() and (task.cancelled() or isinstance(task.exception(), QueueFullError))
+    )
+    if not usable:
+        task.cancel()
+        return None
+    return task
+
+def forget_removed_file(user_id, user_file):
+    """Отмена заранее начатой обработки, если один из ее файлов удален."""
+    run = speculative_runs.get(user_id)
+    if run is not None and any(f is user_file for f in run[0]):
+        discard_speculative_run(user_id)
+
+# Файлы удаляются и без участия пользователя (устаревание, квоты)
+file_manager.on_remove = forget_removed_file
+
 async def process_user_files(user_id, message):
     """Обработка файлов пользователя."""
     user_files = file_manager.get_user_files(user_id)
@@ -411,21 +773,10 @@ async def process_user_files(user_id, message):
         return
     
     try:
-        # Определяем тип каждого файла
-        roh_file = None
-        rov_file = None
-        z_file = None
-        
-        for file_path in user_files:
-            filename = os.path.basename(file_path)
-            file_type = get_file_type(filename)
-            
-            if file_type == 'roh' and roh_file is None:
-                roh_file = file_path
-            elif file_type == 'rov' and rov_file is None:
-                rov_file = file_path
-            elif file_type == 'z' and z_file is None:
-                z_file = file_path
+        # Файлы каждого типа
+        roh_file = file_manager.get_user_file(user_id, 'roh')
+        rov_file = file_manager.get_user_file(user_id, 'rov')
+        z_file = file_manager.get_user_file(user_id, 'z')
         
         # Проверяем, что нашли все три типа
         if not (roh_file and rov_file and z_file):
@@ -434,12 +785,21 @@ async def process_user_files(user_id, message):
             await message.answer(
                 "⚠ *Внимание:* Не удалось определить типы файлов автоматически.\n"
                 "Использую порядок загрузки:\n"
-                f"1. {os.path.basename(roh_file)} → roH\n"
-                f"2. {os.path.basename(rov_file)} → roV\n"
-                f"3. {os.path.basename(z_file)} → z",
+                f"1. {roh_file.name} → roH\n"
+                f"2. {rov_file.name} → roV\n"
+                f"3. {z_file.name} → z",
                 parse_mode="Markdown"
             )
         
+        # Результат заранее начатой обработки отправляется сразу
+        speculative_task = take_speculative_run(
+            user_id, (roh_file, rov_file, z_file)
+        )
+        if speculative_task is not None and speculative_task.done():
+            result, from_cache = speculative_task.result()
+            await send_result(user_id, message, result, from_cache)
+            return
+        
         # Создаём клавиатуру с индикатором процесса
         processing_keyboard = ReplyKeyboardMarkup(
             keyboard=[[KeyboardButton(text="⏳ Обработка...")]],
@@ -455,36 +815,132 @@ async def process_user_files(user_id, message):
             reply_markup=processing_keyboard
         )
         
-        # Запускаем обработку в отдельном потоке
-        output_file = await asyncio.to_thread(
-            processor.process_files,
-            roh_file, rov_file, z_file
-        )
-        
-        # Отправляем результат
-        await message.answer("📤 *Отправляю результат...*", parse_mode="Markdown")
+        try:
+            if speculative_task is not None:
+                result, from_cache = await speculative_task
+            else:
+                result, from_cache = await run_processing(
+                    user_id, roh_file, rov_file, z_file,
+                    on_position=queue_position_notifier(message)
+                )
+        except QueueFullError:
+            await message.answer(
+                "🚦 *Сервер сейчас перегружен.*\n\n"
+                "Файлы сохранены, попробуйте начать обработку через минуту.",
+                parse_mode="Markdown",
+                reply_markup=get_confirmation_keyboard()
+            )
+            return
         
-        # Отправляем файл
-        document = FSInputFile(output_file, filename="all_predictions.dat")
-        await message.answer_document(
-            document,
-            caption="✅ *Обработка завершена!*\n\n"
-                   "📄 Файл с результатами готов.\n"
-                   "Вы можете начать новую обработку.",
-            parse_mode="Markdown"
+        await send_result(user_id, message, result, from_cache)
+            
+    except Exception as e:
+        await message.answer(
+            f"❌ *Ошибка обработки:*\n\n{str(e)}\n\n"
+            "Пожалуйста, проверьте файлы и попробуйте снова.",
+            parse_mode="Markdown",
+            reply_markup=get_main_keyboard()
         )
-        
-        # Очищаем временные файлы
         file_manager.clear_user_files(user_id)
-        if os.path.exists(output_file):
-            os.remove(output_file)
-        
-        # Возвращаем основную клавиатуру
+
+def queue_position_notifier(message):
+    """Функция для on_position: сообщение о месте в очереди, обновляемое при его изменении."""
+    queue_message = None
+    queue_message_lock = asyncio.Lock()
+    
+    async def show_queue_position(position):
+        nonlocal queue_message
+        text = f"🕐 *Задача в очереди.* Позиция: {position}"
+        async with queue_message_lock:
+            if queue_message is None:
+                queue_message = await message.answer(text, parse_mode="Markdown")
+            else:
+                await queue_message.edit_text(text, parse_mode="Markdown")
+    
+    return show_queue_position
+
+async def run_interval_processing(user_id, roh_file, rov_file, z_file, intervals,
+                                  combined, on_position=None):
+    """Расчет интервалов глубин через очередь задач: список bytes .dat."""
+    (domain_h, roh_digest), (domain_v, rov_digest), (z, _) = await asyncio.gather(
+        get_prepared(roh_file, 'roh'),
+        get_prepared(rov_file, 'rov'),
+        get_prepared(z_file, 'z')
+    )
+    z_list = processor.split_z_intervals(z, intervals)
+    cache_keys = processor.cache_keys_for_intervals(roh_digest, rov_digest, z_list)
+    
+    # Если все интервалы уже считались, задача в очередь не ставится
+    cached = await get_cached_results(
+        cache_keys, lambda z_part, predictions: predictions, require_all=True
+    )
+    if cached is not None:
+        return await asyncio.to_thread(
+            processor.intervals_to_bytes, z_list, cached, combined
+        )
+    
+    # Все интервалы считаются одной задачей, одним пакетом
+    return await job_scheduler.submit(
+        user_id,
+        processor.process_intervals,
+        domain_h, domain_v, z_list, combined, cache_keys,
+        on_position=on_position,
+        affinity=(roh_digest, rov_digest)
+    )
+
+async def process_user_intervals(user_id, message, intervals, combined):
+    """Обработка нескольких интервалов глубин по файлам пользователя."""
+    files = tuple(
+        file_manager.get_user_file(user_id, file_type)
+        for file_type in ('roh', 'rov', 'z')
+    )
+    if None in files:
         await message.answer(
-            "✨ *Готово!* Вы можете начать новую обработку.",
+            "❌ Для расчета по интервалам нужны файлы roH.obl, roV.obl и z.ini.",
             reply_markup=get_main_keyboard()
         )
-            
+        return
+    
+    # Заранее начатая обработка считает весь z.ini и здесь не нужна
+    discard_speculative_run(user_id)
+    
+    try:
+        await message.answer(
+            f"⚙ *Начинаю обработку интервалов: {len(intervals)}...*\n\n"
+            "⏳ Пожалуйста, подождите...",
+            parse_mode="Markdown"
+        )
+        
+        try:
+            results = await run_interval_processing(
+                user_id, *files, intervals, combined,
+                on_position=queue_position_notifier(message)
+            )
+        except QueueFullError:
+            await message.answer(
+                "🚦 *Сервер сейчас перегружен.*\n\n"
+                "Файлы сохранены, попробуйте через минуту.",
+                parse_mode="Markdown",
+                reply_markup=get_main_keyboard()
+            )
+            return
+        except ValueError as e:
+            # В интервале меньше двух глубин: файлы в порядке, можно указать другие
+            await message.answer(
+                f"❌ {str(e)}",
+                reply_markup=get_main_keyboard()
+            )
+            return
+        
+        if combined:
+            filenames = ["predictions_intervals.dat"]
+        else:
+            filenames = [
+                processor.interval_filename(top, bottom)
+                for top, bottom in intervals
+            ]
+        await send_results(user_id, message, list(zip(filenames, results)))
+        
     except Exception as e:
         await message.answer(
             f"❌ *Ошибка обработки:*\n\n{str(e)}\n\n"
@@ -494,6 +950,45 @@ async def process_user_files(user_id, message):
         )
         file_manager.clear_user_files(user_id)
 
+async def send_results(user_id, message, documents, from_cache=False):
+    """Отправка файлов с результатами и очистка файлов пользователя."""
+    # Отправляем результат
+    await message.answer("📤 *Отправляю результат...*", parse_mode="Markdown")
+    
+    # Отправляем файлы
+    caption = (
+        "✅ *Обработка завершена!*\n\n"
+        + ("📄 Файл с результатами готов.\n" if len(documents) == 1
+           else f"📄 Файлов с результатами: {len(documents)}.\n")
+    )
+    if from_cache:
+        caption += "♻️ Эти файлы уже обрабатывались, результат взят из кэша.\n"
+    caption += "Вы можете начать новую обработку."
+    
+    for index, (filename, result) in enumerate(documents):
+        # Подпись - у последнего файла
+        last = index == len(documents) - 1
+        await message.answer_document(
+            BufferedInputFile(result, filename=filename),
+            caption=caption if last else None,
+            parse_mode="Markdown" if last else None
+        )
+    
+    # Очищаем временные файлы
+    file_manager.clear_user_files(user_id)
+    
+    # Возвращаем основную клавиатуру
+    await message.answer(
+        "✨ *Готово!* Вы можете начать новую обработку.",
+        reply_markup=get_main_keyboard()
+    )
+
+async def send_result(user_id, message, result, from_cache):
+    """Отправка файла с результатами и очистка файлов пользователя."""
+    await send_results(
+        user_id, message, [("all_predictions.dat", result)], from_cache
+    )
+
 @dp.message()
 async def handle_other_messages(message: types.Message):
     """Обработка всех остальных сообщений."""
@@ -515,11 +1010,26 @@ async def main():
     print("🤖 Бот запущен...")
     print("✨ Используйте Ctrl+C для остановки")
     
+    # Файлы, оставшиеся на диске с прошлого запуска
+    restored = file_manager.restore()
+    if restored:
+        print(f"📂 Восстановлено файлов: {restored}")
+    file_manager.start_sweeper(UPLOAD_SWEEP_INTERVAL_SECONDS)
+    
+    # Процессы обработки с загруженной моделью запускаются заранее
+    if ONNX_WARMUP:
+        try:
+            await asyncio.to_thread(job_scheduler.start)
+        except Exception as e:
+            print(f"❌ Ошибка прогрева модели: {e}")
+    
     try:
         await dp.start_polling(bot)
     except Exception as e:
         print(f"❌ Ошибка: {e}")
     finally:
+        await file_manager.stop_sweeper()
+        job_scheduler.shutdown()
         print("🛑 Бот остановлен")
 
 if __name__ == "__main__":
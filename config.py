@@ -1,12 +1,94 @@
 from dotenv import load_dotenv
 import os
+import tempfile
 
 load_dotenv()
 
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 APP_URL = os.getenv('APP_URL')
 
+# Настройки ONNX Runtime
+# Уровень оптимизации графа: disable, basic, extended, all
+ONNX_GRAPH_OPTIMIZATION = os.getenv('ONNX_GRAPH_OPTIMIZATION', 'all')
+# Файл для сохранения оптимизированной модели (пусто - не сохранять).
+# При уровне all файл привязан к процессору, на котором создан.
+ONNX_OPTIMIZED_MODEL_PATH = os.getenv('ONNX_OPTIMIZED_MODEL_PATH') or None
+# Число потоков (0 - выбор ONNX Runtime)
+ONNX_INTRA_OP_THREADS = int(os.getenv('ONNX_INTRA_OP_THREADS', '0'))
+ONNX_INTER_OP_THREADS = int(os.getenv('ONNX_INTER_OP_THREADS', '0'))
+# Режим выполнения: sequential или parallel
+ONNX_EXECUTION_MODE = os.getenv('ONNX_EXECUTION_MODE', 'sequential')
+# Оконный режим: длина центральной части окна в строках модели
+# (0 - вся последовательность за один вызов сети). Результат тот же,
+# но пиковая память на длинных скважинах ограничена размером окна
+ONNX_WINDOW_SIZE = int(os.getenv('ONNX_WINDOW_SIZE', '0')) or None
+# Прогрев модели при запуске
+ONNX_WARMUP = os.getenv('ONNX_WARMUP', '1') != '0'
+
+# Кэш результатов обработки
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', '1') != '0'
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR') or os.path.join(
+    tempfile.gettempdir(), 'bkz_result_cache'
+)
+RESULT_CACHE_MAX_MB = int(os.getenv('RESULT_CACHE_MAX_MB', '200'))
+RESULT_CACHE_MAX_AGE_HOURS = float(os.getenv('RESULT_CACHE_MAX_AGE_HOURS', '168'))
+
+# Кэш подготовки входа сети по содержимому roH/roV для повторных расчетов
+# с другим z.ini: общий размер, делится поровну между процессами
+# обработки (0 - отключить)
+GRID_CACHE_MAX_MB = int(os.getenv('GRID_CACHE_MAX_MB', '128'))
+
+# Очередь задач обработки
+# Число процессов для расчетов. Каждый процесс держит свою сессию модели
+# и данные выполняемой задачи, поэтому по умолчанию процессов немного:
+# увеличивать по объему памяти, а не по числу ядер (ядра делятся между
+# процессами, см. worker_pool.threads_per_worker)
+PROCESSING_WORKERS = int(os.getenv('PROCESSING_WORKERS', '2'))
+# Максимум ожидающих задач
+PROCESSING_QUEUE_SIZE = int(os.getenv('PROCESSING_QUEUE_SIZE', '20'))
+# Максимум одновременно выполняемых задач одного пользователя
+PROCESSING_PER_USER_LIMIT = int(os.getenv('PROCESSING_PER_USER_LIMIT', '1'))
+# Максимум ожидающих задач одного пользователя
+PROCESSING_PER_USER_QUEUE = int(os.getenv('PROCESSING_PER_USER_QUEUE', '5'))
+
+# Хранение загруженных файлов
+# 1 - в памяти процесса (без записи на диск), 0 - в /tmp/tg_bot_<user_id>
+UPLOADS_IN_MEMORY = os.getenv('UPLOADS_IN_MEMORY', '1') != '0'
+# Файлы, не использовавшиеся дольше этого срока, удаляются
+UPLOAD_TTL_MINUTES = float(os.getenv('UPLOAD_TTL_MINUTES', '60'))
+# Период проверки устаревших файлов
+UPLOAD_SWEEP_INTERVAL_SECONDS = float(os.getenv('UPLOAD_SWEEP_INTERVAL_SECONDS', '60'))
+# Квоты на размер всех загруженных файлов и файлов одного пользователя
+UPLOAD_MAX_TOTAL_MB = int(os.getenv('UPLOAD_MAX_TOTAL_MB', '500'))
+UPLOAD_MAX_USER_MB = int(os.getenv('UPLOAD_MAX_USER_MB', '30'))
+
+# Обработка начинается сразу после загрузки третьего файла, не дожидаясь
+# подтверждения; результат отбрасывается при отмене, очистке или удалении
+# устаревших файлов
+SPECULATIVE_PROCESSING = os.getenv('SPECULATIVE_PROCESSING', '0') == '1'
+
+# Пакетные архивы скважин (.zip/.tar)
+# Максимум скважин в одном архиве
+ARCHIVE_MAX_WELLS = int(os.getenv('ARCHIVE_MAX_WELLS', '200'))
+# Максимальный суммарный размер распакованных файлов архива
+ARCHIVE_MAX_MB = int(os.getenv('ARCHIVE_MAX_MB', '500'))
+# Скважин в одной задаче очереди обработки
+ARCHIVE_BATCH_WELLS = int(os.getenv('ARCHIVE_BATCH_WELLS', '16'))
+
+# Вебхук
+# 1 - обновления ставятся в очередь и Telegram получает ответ сразу,
+# 0 - ответ после полной обработки обновления
+WEBHOOK_ASYNC = os.getenv('WEBHOOK_ASYNC', '1') != '0'
+# Число задач, обрабатывающих обновления из очереди
+WEBHOOK_CONSUMERS = int(os.getenv('WEBHOOK_CONSUMERS', '8'))
+# Максимум обновлений в очереди
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+# Сколько последних update_id помнить для отбрасывания повторов
+WEBHOOK_DEDUP_SIZE = int(os.getenv('WEBHOOK_DEDUP_SIZE', '10000'))
+# Сколько секунд при остановке дообрабатывать принятые обновления
+WEBHOOK_DRAIN_SECONDS = float(os.getenv('WEBHOOK_DRAIN_SECONDS', '20'))
+
 # Проверка на локальном запуске
 if __name__ == "__main__":
     print(f"BOT_TOKEN установлен: {'Да' if BOT_TOKEN else 'Нет'}")
-    print(f"APP_URL: {APP_URL}")
\ No newline at end of file
+    print(f"APP_URL: {APP_URL}")
@@ -0,0 +1,167 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Границы корзин гистограмм длительности этапов (секунды)
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+_DESCRIPTIONS = {
+    'bkz_stage_duration_seconds': (
+        "Длительность этапов обработки: parse, crop, rasterize, "
+        "modify_matrix, normalize, session_run, postprocess, write"
+    ),
+    'bkz_cache_requests_total': "Обращения к кэшу результатов",
+    'bkz_grid_cache_requests_total': "Обращения к кэшу подготовки входа сети",
+    'bkz_errors_total': "Ошибки по месту возникновения",
+    'bkz_jobs_total': "Завершенные задачи обработки",
+}
+
+
+class MetricsRegistry:
+    """
+    Счетчики и гистограммы в формате Prometheus.
+
+    Метрики процессов пула собираются там же локально, забираются
+    вместе с результатом задачи (take_snapshot) и добавляются в реестр
+    основного процесса (merge). Текущие значения вроде длины очереди
+    берутся при каждом запросе /metrics из функций add_gauge.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}  # (имя, метки): значение
+        self._histograms = {}  # (имя, метки): [корзины..., сумма, число]
+        self._gauges = {}  # имя: (описание, функция)
+
+    def inc(self, name, amount=1, **labels):
+        """Увеличение счетчика."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Добавление значения в гистограмму."""
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @contextmanager
+    def timer(self, stage):
+        """Замер длительности этапа обработки."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(
+                'bkz_stage_duration_seconds',
+                time.perf_counter() - start, stage=stage
+            )
+
+    def timed(self, stage):
+        """Декоратор: замер длительности вызовов функции как этапа stage."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add_gauge(self, name, description, func):
+        """Текущее значение, вычисляемое функцией при каждом запросе."""
+        self._gauges[name] = (description, func)
+
+    def take_snapshot(self):
+        """Накопленные значения с обнулением (для передачи из процесса пула)."""
+        with self._lock:
+            snapshot = (self._counters, self._histograms)
+            self._counters = {}
+            self._histograms = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """Добавление значений из take_snapshot другого процесса."""
+        counters, histograms = snapshot
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, values in histograms.items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    self._histograms[key] = list(values)
+                else:
+                    for i, value in enumerate(values):
+                        histogram[i] += value
+
+    def render(self):
+        """Текст метрик в формате Prometheus."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+        lines = []
+        described = set()
+
+        def describe(name, metric_type, description=None):
+            if name in described:
+                return
+            described.add(name)
+            lines.append(f"# HELP {name} {description or _DESCRIPTIONS.get(name, name)}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        for (name, labels), value in counters:
+            describe(name, 'counter')
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), values in histograms:
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                bucket_labels = labels + (('le', _format_value(bound)),)
+                lines.append(
+                    f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}"
+                )
+            bucket_labels = labels + (('le', '+Inf'),)
+            lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {values[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-2])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {values[-1]}")
+
+        for name, (description, func) in sorted(self._gauges.items()):
+            try:
+                value = func()
+            except Exception:
+                continue
+            describe(name, 'gauge', description)
+            lines.append(f"{name} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{value}"' for key, value in labels)
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+metrics = MetricsRegistry()
@@ -1,12 +1,23 @@
 import numpy as np
 import onnxruntime as ort
+import contextlib
+import hashlib
+import io
 import os
 import tempfile
 import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import config
+from metrics import metrics
+from result_cache import ResultCache, result_cache
+from utils import detect_file_type, read_file_head
 
 
 def format_depth_value(depth):
     """Форматирование значения глубины."""
+    depth = float(depth)
     if depth.is_integer():
         return f"{depth:.0f}"
     else:
@@ -23,142 +34,481 @@ SOLVER_CONFIGS = [
 ]
 
 # Константы
+DEFAULT_MODEL_PATH = "BKZ_solver_900k.onnx"
 BUFFER_DEPTH = 20.0
 MODEL_STEP = 0.1
 DISTANCE_THRESHOLD = 1.0
 LOG_REPLACE_VALUE = -1.0
+ZERO_TOLERANCE = 1e-4
+DEFAULT_BATCH_SIZE = 16
+# Шаг округления длины входа при пакетном расчете разных скважин
+WELLS_BUCKET_STEP = 1024
 
-# Глобальные переменные для обработки
-_first_elements = []
-_session_cache = None
+# Рецептивное поле сети в строках модели (назад и вперед по глубине)
+NN_RECEPTIVE_FIELD_BACK = 197
+NN_RECEPTIVE_FIELD_FORWARD = 203
 
+# Запасы окон в оконном режиме: не меньше BUFFER_DEPTH и рецептивного поля
+WINDOW_MARGIN_BACK = max(
+    int(round(BUFFER_DEPTH / MODEL_STEP)), NN_RECEPTIVE_FIELD_BACK
+)
+WINDOW_MARGIN_FORWARD = max(
+    int(round(BUFFER_DEPTH / MODEL_STEP)), NN_RECEPTIVE_FIELD_FORWARD
+)
 
-def load_obl_file_with_separator(filepath):
-    """Загрузка входных файлов."""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        lines = [line.strip() for line in f if line.strip()]
+# Настройки сессии ONNX Runtime по умолчанию (см. config.py)
+SESSION_CONFIG = {
+    'graph_optimization': config.ONNX_GRAPH_OPTIMIZATION,
+    'optimized_model_path': config.ONNX_OPTIMIZED_MODEL_PATH,
+    'intra_op_threads': config.ONNX_INTRA_OP_THREADS,
+    'inter_op_threads': config.ONNX_INTER_OP_THREADS,
+    'execution_mode': config.ONNX_EXECUTION_MODE,
+}
+
+# Длина окна решателей обработки (см. config.py); None - вход целиком
+WINDOW_SIZE = config.ONNX_WINDOW_SIZE
+
+_GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+_EXECUTION_MODES = {
+    'sequential': ort.ExecutionMode.ORT_SEQUENTIAL,
+    'parallel': ort.ExecutionMode.ORT_PARALLEL,
+}
+
+# Версия расчета для ключей кэша результатов; увеличивать при изменении
+# подготовки входа или обработки предсказаний
+CACHE_VERSION = 1
+
+# Признак кэша по умолчанию в process_files_cached
+DEFAULT_CACHE = object()
+
+# Число строк в одном блоке при записи файла .dat
+WRITE_CHUNK_ROWS = 65536
+
+# Длина фиктивного входа для прогрева модели (в строках модели)
+WARMUP_LENGTH = 1024
+
+# Общие сессии ONNX по пути модели и настройкам
+# (InferenceSession.run потокобезопасен)
+_session_cache = {}
+_session_lock = threading.Lock()
+
+
+@metrics.timed('parse')
+def parse_obl_buffer(buffer):
+    """
+    Разбор содержимого файла roH/roV за один проход.
     
-    line_lengths = [len(line.split()) for line in lines]
-    total_values = sum(line_lengths) + max(0, len(lines) - 1)
+    Разрывы строк и начала чисел ищутся векторно по байтам буфера,
+    сами числа разбираются одним вызовом np.array по списку bytes.split,
+    без разбора каждой строки отдельно.
     
-    data = np.empty(total_values, dtype=np.float32)
+    Returns:
+        tuple: (плоский массив значений с разделителями -1,
+                массив (n_layers, 2) с началом и концом каждого слоя)
+    """
+    if isinstance(buffer, str):
+        buffer = buffer.encode('utf-8')
     
-    pos = 0
-    separator = -1.0
-    for i, line in enumerate(lines):
-        values = np.fromstring(line, sep=' ', dtype=np.float32)
-        data[pos:pos + len(values)] = values
-        pos += len(values)
-        if i != len(lines) - 1:
-            data[pos] = separator
-            pos += 1
+    raw = np.frombuffer(buffer, dtype=np.uint8)
+    is_break = (raw == ord('\n')) | (raw == ord('\r'))
+    is_space = is_break | (raw == ord(' ')) | (raw == ord('\t')) | (
+        raw == ord('\v')) | (raw == ord('\f'))
+    
+    previous_space = np.empty_like(is_space)
+    previous_space[:1] = True
+    previous_space[1:] = is_space[:-1]
+    token_starts = np.flatnonzero(~is_space & previous_space)
+    if token_starts.size == 0:
+        # Пустой файл: о нем сообщит _check_layers
+        return (
+            np.empty(0, dtype=np.float32), np.empty((0, 2), dtype=np.intp)
+        )
+    
+    # Номер строки каждого числа; пустые строки не дают чисел
+    token_lines = np.searchsorted(np.flatnonzero(is_break), token_starts)
+    line_starts = np.flatnonzero(np.diff(token_lines, prepend=-1))
+    line_lengths = np.diff(line_starts, append=token_lines.size)
+    
+    # bytes.split делит по тем же пробельным символам, что и is_space
+    try:
+        values = np.array(buffer.split(), dtype=np.float32)
+    except ValueError:
+        raise ValueError(_describe_bad_token(buffer)) from None
+    
+    n_layers = line_lengths.size
+    data = np.full(
+        values.size + max(0, n_layers - 1), -1.0, dtype=np.float32
+    )
+    data[np.arange(values.size) + np.repeat(np.arange(n_layers), line_lengths)] = values
+    
+    layer_ends = np.cumsum(line_lengths) + np.arange(n_layers)
+    layer_bounds = np.column_stack((layer_ends - line_lengths, layer_ends))
+    
+    return data, layer_bounds
+
+
+def _describe_bad_token(buffer):
+    """Сообщение о первом значении, которое не удалось разобрать."""
+    for line_number, line in enumerate(buffer.splitlines(), 1):
+        for token in line.split():
+            try:
+                float(token)
+            except ValueError:
+                token = token.decode('utf-8', 'replace')
+                return f"Некорректное значение в строке {line_number}: {token}"
+    return "Не удалось разобрать числовые значения"
+
+
+@metrics.timed('parse')
+def parse_z_buffer(buffer):
+    """Разбор содержимого файла z.ini (первая строка - заголовок)."""
+    if isinstance(buffer, str):
+        buffer = buffer.encode('utf-8')
+    return np.loadtxt(io.BytesIO(buffer), dtype=np.float32, skiprows=1)
+
+
+def parse_input(data, file_type):
+    """
+    Разбор содержимого одного входного файла по его типу.
+    
+    Returns:
+        LayerTable для roh/rov, массив глубин для z
+    """
+    if file_type in ('roh', 'rov'):
+        return _check_layers(LayerTable.from_flat(*parse_obl_buffer(data)))
+    if file_type == 'z':
+        z = parse_z_buffer(data)
+        if z.ndim != 1 or len(z) == 0:
+            raise ValueError("Файл z.ini пуст или имеет неверный формат")
+        return z
+    raise ValueError(f"Неизвестный тип файла: {file_type}")
+
+
+def prepare_input(data, file_type):
+    """
+    Подготовка файла заранее, при загрузке: разбор и хэш для кэша.
+    
+    Returns:
+        tuple: (результат parse_input, ResultCache.digest содержимого)
+    """
+    return parse_input(data, file_type), ResultCache.digest(data)
+
+
+def parse_depth_intervals(text):
+    """
+    Разбор списка интервалов глубин вида "1000-1100 1250.5-1300".
+    
+    Returns:
+        list: пары (кровля, подошва) в порядке перечисления
+    """
+    text = text.replace('–', '-').replace('—', '-')
+    intervals = []
+    for token in text.replace(',', ' ').replace(';', ' ').split():
+        parts = token.split('-')
+        try:
+            if len(parts) != 2:
+                raise ValueError
+            top, bottom = float(parts[0]), float(parts[1])
+        except ValueError:
+            raise ValueError(
+                f"Неверный интервал '{token}', ожидается кровля-подошва"
+            ) from None
+        if not top < bottom:
+            raise ValueError(f"Кровля интервала {token} должна быть выше подошвы")
+        intervals.append((top, bottom))
+    
+    if not intervals:
+        raise ValueError("Не указаны интервалы глубин")
+    return intervals
+
+
+def split_z_intervals(z, intervals):
+    """
+    Глубины z, попадающие в каждый интервал (границы включаются).
+    
+    В каждом интервале должно быть не меньше двух глубин: по ним
+    определяется шаг z.
+    """
+    z_list = []
+    for top, bottom in intervals:
+        z_part = z[(z >= top) & (z <= bottom)]
+        if len(z_part) < 2:
+            raise ValueError(
+                f"В интервале {format_depth_value(top)}-"
+                f"{format_depth_value(bottom)} м "
+                + ("нет глубин" if len(z_part) == 0 else "только одна глубина")
+                + " из z.ini, нужно не меньше двух"
+            )
+        z_list.append(z_part)
+    return z_list
+
 
+def interval_filename(top, bottom):
+    """Имя файла .dat с результатами одного интервала."""
+    return (
+        f"predictions_{format_depth_value(top)}-"
+        f"{format_depth_value(bottom)}.dat"
+    )
+
+
+def load_obl_file(filepath):
+    """Загрузка файла roH/roV вместе с границами слоев."""
+    with open(filepath, 'rb') as f:
+        return parse_obl_buffer(f.read())
+
+
+def load_obl_file_with_separator(filepath):
+    """Загрузка входных файлов."""
+    data, _ = load_obl_file(filepath)
     return data
 
 
-def _find_layer_boundaries(domain_data):
-    """Нахождение границ слоев."""
-    separator_indices = np.where(domain_data == -1.0)[0]
+class LayerTable:
+    """
+    Слои модели roH/roV в компактном виде.
+    
+    Значения сопротивлений всех слоев лежат подряд в одном буфере values,
+    offsets (длины n_layers + 1) задает начало значений каждого слоя,
+    кровля и подошва хранятся отдельными столбцами top и bottom.
+    """
+    
+    def __init__(self, top, bottom, values, offsets):
+        self.top = top
+        self.bottom = bottom
+        self.values = values
+        self.offsets = offsets
+    
+    @classmethod
+    def from_flat(cls, domain_data, layer_bounds=None):
+        """
+        Построение таблицы из плоского массива с разделителями -1.
+        
+        Если известны границы слоев от parse_obl_buffer, разделители
+        не ищутся повторно.
+        """
+        domain_data = np.asarray(domain_data, dtype=np.float32)
+        if layer_bounds is None:
+            separator_indices = np.where(domain_data == -1.0)[0]
+            
+            split_indices = np.concatenate(
+                ([-1], separator_indices, [len(domain_data)])
+            )
+            layer_bounds = np.column_stack(
+                (split_indices[:-1] + 1, split_indices[1:])
+            )
+        
+        layer_bounds = np.asarray(layer_bounds, dtype=np.intp).reshape(-1, 2)
+        layer_bounds = layer_bounds[layer_bounds[:, 1] > layer_bounds[:, 0]]
+        starts, ends = layer_bounds[:, 0], layer_bounds[:, 1]
+        if np.any(ends - starts < 2):
+            raise ValueError("Каждый слой должен содержать кровлю и подошву")
+        
+        value_counts = ends - starts - 2
+        offsets = np.zeros(len(starts) + 1, dtype=np.intp)
+        np.cumsum(value_counts, out=offsets[1:])
+        
+        value_indices = np.arange(offsets[-1]) + np.repeat(
+            starts + 2 - offsets[:-1], value_counts
+        )
+        
+        return cls(
+            top=domain_data[starts],
+            bottom=domain_data[starts + 1],
+            values=domain_data[value_indices],
+            offsets=offsets,
+        )
     
-    split_indices = np.concatenate(([-1], separator_indices, [len(domain_data)]))
+    def __len__(self):
+        return len(self.top)
     
-    segments = []
-    for i in range(len(split_indices) - 1):
-        start = split_indices[i] + 1
-        end = split_indices[i + 1]
-        if end > start:
-            segment = domain_data[start:end]
-            segments.append(segment.astype(np.float32))
+    def layer(self, index):
+        """Значения сопротивлений одного слоя (без кровли и подошвы)."""
+        return self.values[self.offsets[index]:self.offsets[index + 1]]
     
-    return segments
+    def slice(self, start=0, stop=None):
+        """Диапазон слоев; глубины копируются, значения общие."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+        return LayerTable(
+            top=self.top[start:stop].copy(),
+            bottom=self.bottom[start:stop].copy(),
+            values=self.values,
+            offsets=self.offsets[start:stop + 1],
+        )
+
+
+def as_layer_table(domain, layer_bounds=None):
+    """Таблица слоев из LayerTable или плоского массива с разделителями."""
+    if isinstance(domain, LayerTable):
+        return domain
+    return LayerTable.from_flat(domain, layer_bounds)
+
+
+def _check_layers(table):
+    """Таблица слоев roH/roV, в которой есть хотя бы один слой."""
+    if len(table) == 0:
+        raise ValueError("Файл roH/roV пуст или не содержит слоев")
+    return table
+
 
+def load_obl_layers(filepath):
+    """Загрузка файла roH/roV в виде таблицы слоев."""
+    return _check_layers(LayerTable.from_flat(*load_obl_file(filepath)))
 
-def crop_input_model_bkz_std_6_gradient(domain_h, domain_v, z):
-    """Обработка слоев."""
-    global _first_elements
+
+@metrics.timed('crop')
+def crop_input_model_bkz_std_6_gradient(domain_h, domain_v, z,
+                                        layer_bounds=None):
+    """
+    Обработка слоев.
     
-    domain_h_list = _find_layer_boundaries(domain_h)
-    domain_v_list = _find_layer_boundaries(domain_v)
+    Args:
+        domain_h, domain_v: LayerTable или плоские массивы с разделителями
+        layer_bounds: пара (границы слоев roH, границы слоев roV)
+            от load_obl_file для плоских массивов; None - искать
+            по разделителям
     
-    domain_depth_columns = np.vstack([layer[:2] for layer in domain_h_list])
+    Returns:
+        tuple: (слои roH, слои roV, кровли слоев и конечная глубина)
+    """
+    h_bounds, v_bounds = layer_bounds or (None, None)
+    domain_h = as_layer_table(domain_h, h_bounds).slice()
+    domain_v = as_layer_table(domain_v, v_bounds).slice()
+    
+    domain_depth_columns = np.column_stack((domain_h.top, domain_h.bottom))
     start_depth = z[0] - BUFFER_DEPTH
     end_depth = z[-1] + BUFFER_DEPTH
     
     # Обработка начальной границы
     if start_depth < domain_depth_columns[0, 0]:
-        domain_h_list[0][0] = domain_v_list[0][0] = start_depth
+        domain_h.top[0] = domain_v.top[0] = start_depth
     elif start_depth > domain_depth_columns[0, 0]:
         mask = start_depth < domain_depth_columns[:, 1]
         if np.any(mask):
             first_match_idx = np.argmax(mask)
-            domain_h_list = domain_h_list[first_match_idx:]
-            domain_v_list = domain_v_list[first_match_idx:]
-            domain_h_list[0][0] = domain_v_list[0][0] = start_depth
+            domain_h = domain_h.slice(first_match_idx)
+            domain_v = domain_v.slice(first_match_idx)
+            domain_h.top[0] = domain_v.top[0] = start_depth
     
     # Обработка конечной границы
     if end_depth > domain_depth_columns[-1, 1]:
-        domain_h_list[-1][1] = domain_v_list[-1][1] = end_depth
+        domain_h.bottom[-1] = domain_v.bottom[-1] = end_depth
     elif end_depth < domain_depth_columns[-1, 1]:
         reversed_mask = end_depth > domain_depth_columns[::-1, 0]
         if np.any(reversed_mask):
             last_match_idx = (
                 len(domain_depth_columns) - np.argmax(reversed_mask) - 1
             )
-            if last_match_idx < len(domain_h_list) - 1:
-                domain_h_list = domain_h_list[:last_match_idx + 1]
-                domain_v_list = domain_v_list[:last_match_idx + 1]
-            domain_h_list[-1][1] = domain_v_list[-1][1] = end_depth
+            if last_match_idx < len(domain_h) - 1:
+                domain_h = domain_h.slice(0, last_match_idx + 1)
+                domain_v = domain_v.slice(0, last_match_idx + 1)
+            domain_h.bottom[-1] = domain_v.bottom[-1] = end_depth
     
-    _first_elements = [arr[0] for arr in domain_h_list] + [end_depth]
+    first_elements = np.append(domain_h.top, end_depth)
     
-    return domain_h_list, domain_v_list
+    return domain_h, domain_v, first_elements
 
 
-def create_model_for_nn_bkz_std_6_gradient(domain_h_list, domain_v_list):
-    """Создание модели сопротивлений."""
-    top_depth = np.round(domain_h_list[0][0], 3)
-    bottom_depth = np.round(domain_h_list[-1][1], 3)
+def _layer_data_rows(domain_h, domain_v, layer_ids):
+    """
+    Строки модели для выбранных слоев сразу.
     
-    n_depths = int((bottom_depth - top_depth) / MODEL_STEP) + 1
-    nn_resistivity_model = np.zeros((n_depths, 6), dtype=np.float32)
+    Изотропный слой (5 значений в roH): значения roH и повтор последнего.
+    Анизотропный слой: первые три значения roH, 0, последнее значение roH
+    и последнее значение roV.
+    """
+    first_h = domain_h.offsets[layer_ids]
+    last_h = domain_h.offsets[layer_ids + 1] - 1
+    last_v = domain_v.offsets[layer_ids + 1] - 1
+    counts_h = last_h + 1 - first_h
+    counts_v = last_v + 1 - domain_v.offsets[layer_ids]
+    isotropic = counts_h == 5
+    if np.any(~isotropic & (counts_h < 3)) or np.any(
+        ~isotropic & (counts_v < 1)
+    ):
+        raise ValueError("Недостаточно значений в анизотропном слое")
+    
+    # Для изотропных слоев берутся первые 5 значений, иначе первые 3
+    column_offsets = np.minimum(
+        np.arange(5), np.where(isotropic, 4, 2)[:, None]
+    )
+    data_rows = np.empty((len(layer_ids), 6), dtype=np.float32)
+    data_rows[:, :5] = domain_h.values[first_h[:, None] + column_offsets]
+    data_rows[:, 5] = data_rows[:, 4]
+    
+    anisotropic = ~isotropic
+    data_rows[anisotropic, 3] = 0.0
+    data_rows[anisotropic, 4] = domain_h.values[last_h[anisotropic]]
+    data_rows[anisotropic, 5] = domain_v.values[last_v[anisotropic]]
+    
+    return data_rows
 
-    all_data_rows = []
-    all_start_indices = []
-    all_end_indices = []
+
+def _row_owners(domain_h, domain_v, top_depth, n_depths):
+    """
+    Слой каждой строки сетки MODEL_STEP, начинающейся с top_depth.
     
-    for layer_h, layer_v in zip(domain_h_list, domain_v_list):
-        if layer_h.shape[0] == 7:  # изотропный слой
-            data_row = np.hstack((layer_h[2:], layer_h[-1]))
-        else:  # анизотропный слой
-            data_row = np.hstack((
-                layer_h[2:5], 0.0, layer_h[-1], layer_v[-1]
-            ))
-        
-        start_idx = int(np.round((layer_h[0] - top_depth) / MODEL_STEP))
-        end_idx = int(np.round((layer_h[1] - top_depth) / MODEL_STEP))
-        
-        start_idx = max(0, min(start_idx, n_depths - 1))
-        end_idx = max(0, min(end_idx, n_depths - 1))
-        
-        if start_idx <= end_idx:
-            all_data_rows.append(data_row)
-            all_start_indices.append(start_idx)
-            all_end_indices.append(end_idx)
+    Returns:
+        tuple: (номера слоев с хотя бы одной строкой, индекс в них
+            для каждой строки; -1 - строка не покрыта слоями)
+    """
+    n_layers = min(len(domain_h), len(domain_v))
+    start_indices = np.round(
+        (domain_h.top[:n_layers] - top_depth) / MODEL_STEP
+    ).astype(np.intp)
+    end_indices = np.round(
+        (domain_h.bottom[:n_layers] - top_depth) / MODEL_STEP
+    ).astype(np.intp)
+    np.clip(start_indices, 0, n_depths - 1, out=start_indices)
+    np.clip(end_indices, 0, n_depths - 1, out=end_indices)
     
-    for data_row, start_idx, end_idx in zip(
-        all_data_rows, all_start_indices, all_end_indices
-    ):
-        nn_resistivity_model[start_idx:end_idx + 1] = data_row
+    valid = start_indices <= end_indices
+    layer_ids = np.flatnonzero(valid)
+    start_indices = start_indices[valid]
+    lengths = end_indices[valid] - start_indices + 1
+    row_starts = np.cumsum(lengths) - lengths
     
-    return nn_resistivity_model
+    rows = np.arange(lengths.sum()) + np.repeat(
+        start_indices - row_starts, lengths
+    )
+    row_owner = np.full(n_depths, -1, dtype=np.intp)
+    np.maximum.at(
+        row_owner, rows, np.repeat(np.arange(len(layer_ids)), lengths)
+    )
+    return layer_ids, row_owner
 
 
-def modify_matrix(matrix, first_elements):
-    """Модификация входной матрицы."""
-    matrix = np.asarray(matrix, dtype=np.float64)
-    sorted_elements = sorted(first_elements)
+@metrics.timed('rasterize')
+def create_model_for_nn_bkz_std_6_gradient(domain_h, domain_v):
+    """
+    Создание модели сопротивлений по таблицам слоев roH и roV.
+    
+    Индексы всех слоев на сетке MODEL_STEP считаются сразу; при
+    перекрытии (общая граница соседних слоев) строка достается
+    последнему слою, как при поочередном заполнении.
+    """
+    top_depth = np.round(domain_h.top[0], 3)
+    bottom_depth = np.round(domain_h.bottom[-1], 3)
+    
+    n_depths = int((bottom_depth - top_depth) / MODEL_STEP) + 1
+    layer_ids, row_owner = _row_owners(domain_h, domain_v, top_depth, n_depths)
+    
+    # Непокрытые строки (row_owner = -1) берут последнюю, нулевую строку
+    data_rows = np.zeros((len(layer_ids) + 1, 6), dtype=np.float32)
+    data_rows[:-1] = _layer_data_rows(domain_h, domain_v, layer_ids)
+    nn_resistivity_model = np.take(data_rows, row_owner, axis=0)
     
-    num_rows = matrix.shape[0]
+    return nn_resistivity_model
+
+
+def _border_distances_loop(num_rows, sorted_elements):
+    """Эталонный построчный расчет расстояний до границ слоев."""
     n_elements = len(sorted_elements)
     
     dist_to_next_col = np.empty(num_rows, dtype=np.float64)
@@ -169,7 +519,7 @@ def modify_matrix(matrix, first_elements):
     model_step = MODEL_STEP
     threshold = DISTANCE_THRESHOLD
     replace_val = LOG_REPLACE_VALUE
-    zero_tol = 1e-4
+    zero_tol = ZERO_TOLERANCE
     
     borders = sorted_elements
     last_valid_index = n_elements - 2
@@ -219,6 +569,160 @@ def modify_matrix(matrix, first_elements):
             border_index <= last_valid_index):
             border_index += 1
     
+    return dist_to_next_col, dist_to_prev_col
+
+
+def _border_distances_rows(positions, borders, start, state, expected_state,
+                           dist_to_next_col, dist_to_prev_col):
+    """
+    Строки начиная со start по правилам _border_distances_loop.
+    
+    state - индекс границы цикла в начале строки start. Расчет идет,
+    пока он не совпадет с expected_state (индексом, из которого исходит
+    векторизованный расчет), результаты пишутся в dist_to_next_col
+    и dist_to_prev_col.
+    
+    Returns:
+        int: первая строка, с которой снова верен векторизованный расчет
+    """
+    n_elements = len(borders)
+    last_valid_index = n_elements - 2
+    num_rows = len(positions)
+    
+    row = start
+    while row < num_rows and state != expected_state[row]:
+        position = positions[row]
+        border_index = state
+        has_next = border_index + 1 < n_elements
+        if (has_next and
+                abs(position - borders[border_index + 1]) < ZERO_TOLERANCE and
+                border_index < last_valid_index):
+            border_index += 1
+            has_next = border_index + 1 < n_elements
+        
+        if has_next:
+            dist_to_next = borders[border_index + 1] - position
+            if dist_to_next > DISTANCE_THRESHOLD:
+                dist_to_next = LOG_REPLACE_VALUE
+            elif abs(dist_to_next) < ZERO_TOLERANCE:
+                dist_to_next = 0.0
+        else:
+            dist_to_next = LOG_REPLACE_VALUE
+        
+        dist_to_prev = position - borders[border_index]
+        if dist_to_prev > DISTANCE_THRESHOLD:
+            dist_to_prev = LOG_REPLACE_VALUE
+        elif abs(dist_to_prev) < ZERO_TOLERANCE:
+            dist_to_prev = 0.0
+        
+        dist_to_next_col[row] = dist_to_next
+        dist_to_prev_col[row] = dist_to_prev
+        
+        row += 1
+        state = border_index
+        if (row < num_rows and has_next and
+                positions[row] > borders[border_index + 1]):
+            state += 1
+    
+    return row
+
+
+def _border_distances_numpy(num_rows, sorted_elements):
+    """
+    Векторизованный расчет расстояний до границ слоев.
+    
+    Повторяет _border_distances_loop: позиции накапливаются тем же
+    последовательным сложением шага, индекс слоя находится через
+    searchsorted. Если за один шаг сетки пересекается больше одной
+    границы (слои тоньше шага), цикл отстает от searchsorted; только
+    такие участки, до совпадения индексов, считаются по правилам цикла
+    (_border_distances_rows).
+    """
+    n_elements = len(sorted_elements)
+    if num_rows == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty.copy()
+    
+    # Тип позиции совпадает с типом current_position в цикле
+    position_dtype = np.asarray(sorted_elements[0] + MODEL_STEP).dtype
+    steps = np.full(num_rows, MODEL_STEP, dtype=position_dtype)
+    steps[0] = sorted_elements[0]
+    positions = np.add.accumulate(steps, dtype=position_dtype)
+    
+    borders = np.asarray(sorted_elements)
+    
+    # Индекс слоя в начале строки: последняя граница строго выше позиции
+    start_index = np.searchsorted(borders, positions, side='left') - 1
+    np.clip(start_index, 0, n_elements - 1, out=start_index)
+    
+    # Переход на следующую границу в пределах допуска
+    can_shift = start_index < n_elements - 2
+    shift_border = borders[np.minimum(start_index + 1, n_elements - 1)]
+    shifted = can_shift & (np.abs(positions - shift_border) < ZERO_TOLERANCE)
+    border_index = start_index + shifted
+    
+    has_next = border_index + 1 < n_elements
+    next_border = borders[np.minimum(border_index + 1, n_elements - 1)]
+    
+    dist_to_next = np.where(
+        has_next, next_border - positions, LOG_REPLACE_VALUE
+    ).astype(np.float64)
+    dist_to_next[dist_to_next > DISTANCE_THRESHOLD] = LOG_REPLACE_VALUE
+    dist_to_next[has_next & (np.abs(dist_to_next) < ZERO_TOLERANCE)] = 0.0
+    
+    dist_to_prev = (positions - borders[border_index]).astype(np.float64)
+    dist_to_prev[dist_to_prev > DISTANCE_THRESHOLD] = LOG_REPLACE_VALUE
+    dist_to_prev[np.abs(dist_to_prev) < ZERO_TOLERANCE] = 0.0
+    
+    # Индекс, с которым цикл начнет следующую строку: не больше одной
+    # границы за шаг. Строки, где он расходится с start_index, и строки
+    # после них до совпадения индексов пересчитываются по правилам цикла
+    loop_state = border_index[:-1] + (has_next[:-1] & (positions[1:] > next_border[:-1]))
+    diverged = np.flatnonzero(loop_state != start_index[1:]) + 1
+    if start_index[0] != 0:
+        diverged = np.concatenate(([0], diverged))
+    
+    synced_row = -1
+    for row in diverged:
+        # Строки до synced_row уже посчитаны по правилам цикла
+        if row <= synced_row:
+            continue
+        state = 0 if row == 0 else loop_state[row - 1]
+        synced_row = _border_distances_rows(
+            positions, borders, row, state, start_index,
+            dist_to_next, dist_to_prev
+        )
+    
+    return dist_to_next, dist_to_prev
+
+
+def border_distances(num_rows, first_elements, engine="numpy"):
+    """
+    Расстояния от строк сетки до соседних границ слоев.
+    
+    Args:
+        num_rows: число строк сетки MODEL_STEP от первой границы
+        first_elements: кровли слоев и конечная глубина
+        engine: 'numpy' (векторизованный расчет) или 'loop' (эталонный цикл)
+    
+    Returns:
+        tuple: (расстояние до следующей границы, до предыдущей)
+    """
+    if engine not in ("numpy", "loop"):
+        raise ValueError(f"Неизвестный способ расчета: {engine}")
+    
+    if isinstance(first_elements, np.ndarray):
+        sorted_elements = np.sort(first_elements)
+    else:
+        sorted_elements = sorted(first_elements)
+    
+    if engine == "numpy":
+        return _border_distances_numpy(num_rows, sorted_elements)
+    return _border_distances_loop(num_rows, sorted_elements)
+
+
+def _assemble_nn_input(dist_to_next_col, dist_to_prev_col, matrix):
+    """Вход сети: расстояния до границ и модель сопротивлений."""
     result_matrix = np.column_stack((
         dist_to_next_col.reshape(-1, 1), 
         dist_to_prev_col.reshape(-1, 1), 
@@ -230,6 +734,24 @@ def modify_matrix(matrix, first_elements):
     return result_matrix
 
 
+@metrics.timed('modify_matrix')
+def modify_matrix(matrix, first_elements, engine="numpy"):
+    """
+    Модификация входной матрицы.
+    
+    Args:
+        matrix: модель сопротивлений с шагом MODEL_STEP
+        first_elements: кровли слоев и конечная глубина
+        engine: 'numpy' (векторизованный расчет) или 'loop' (эталонный цикл)
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    dist_to_next_col, dist_to_prev_col = border_distances(
+        matrix.shape[0], first_elements, engine
+    )
+    return _assemble_nn_input(dist_to_next_col, dist_to_prev_col, matrix)
+
+
+@metrics.timed('normalize')
 def normalize_nn_input_bkz_std_6_gradient(nn_input):
     """Нормализация входных данных."""
     nn_input_normalized = nn_input.copy()
@@ -245,67 +767,529 @@ def normalize_nn_input_bkz_std_6_gradient(nn_input):
     return nn_input_normalized
 
 
+def create_onnx_session(model_path, graph_optimization='all',
+                        optimized_model_path=None, intra_op_threads=0,
+                        inter_op_threads=0, execution_mode='sequential'):
+    """
+    Создание сессии ONNX Runtime с заданными настройками.
+    
+    Args:
+        model_path: путь к модели ONNX
+        graph_optimization: уровень оптимизации графа
+            ('disable', 'basic', 'extended', 'all')
+        optimized_model_path: файл для оптимизированной модели; если он
+            новее исходной модели, загружается он без повторной оптимизации
+        intra_op_threads: потоков внутри операции (0 - по умолчанию)
+        inter_op_threads: потоков между операциями (0 - по умолчанию)
+        execution_mode: 'sequential' или 'parallel'
+    """
+    if graph_optimization not in _GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(
+            f"Неизвестный уровень оптимизации: {graph_optimization}"
+        )
+    if execution_mode not in _EXECUTION_MODES:
+        raise ValueError(f"Неизвестный режим выполнения: {execution_mode}")
+    
+    options = ort.SessionOptions()
+    options.graph_optimization_level = _GRAPH_OPTIMIZATION_LEVELS[
+        graph_optimization
+    ]
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.execution_mode = _EXECUTION_MODES[execution_mode]
+    
+    if optimized_model_path:
+        if (os.path.exists(optimized_model_path) and
+                os.path.getmtime(optimized_model_path) >=
+                os.path.getmtime(model_path)):
+            model_path = optimized_model_path
+            options.graph_optimization_level = _GRAPH_OPTIMIZATION_LEVELS[
+                'disable'
+            ]
+        else:
+            return _create_and_save_optimized(
+                model_path, options, optimized_model_path
+            )
+    
+    return ort.InferenceSession(
+        model_path,
+        sess_options=options,
+        providers=['CPUExecutionProvider']
+    )
+
+
+def _create_and_save_optimized(model_path, options, optimized_model_path):
+    """
+    Сессия с сохранением оптимизированной модели.
+    
+    Каждый процесс пула пишет модель в свой временный файл рядом
+    с optimized_model_path и атомарно переносит его на место
+    (os.replace), поэтому одновременный запуск процессов не оставляет
+    недописанного файла.
+    """
+    root, ext = os.path.splitext(optimized_model_path)
+    fd, temp_path = tempfile.mkstemp(
+        prefix=os.path.basename(root) + '.', suffix=ext,
+        dir=os.path.dirname(os.path.abspath(optimized_model_path))
+    )
+    os.close(fd)
+    options.optimized_model_filepath = temp_path
+    try:
+        session = ort.InferenceSession(
+            model_path,
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+        try:
+            os.replace(temp_path, optimized_model_path)
+        except OSError as e:
+            # Сессия уже создана и работает без сохраненной модели
+            print(f"⚠ Не удалось сохранить оптимизированную модель: {e}")
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+    return session
+
+
+def prepare_nn_input(domain_h, domain_v, z, layer_bounds=None):
+    """
+    Нормализованный вход сети для интервала z: обрезка модели, сетка
+    MODEL_STEP, расстояния до границ и нормализация.
+    """
+    (domain_h_processed, domain_v_processed,
+     first_elements) = crop_input_model_bkz_std_6_gradient(
+        domain_h, domain_v, z, layer_bounds
+    )
+    nn_input = create_model_for_nn_bkz_std_6_gradient(
+        domain_h_processed, domain_v_processed
+    )
+    nn_input = modify_matrix(nn_input, first_elements)
+    nn_input_normalized = normalize_nn_input_bkz_std_6_gradient(nn_input)
+    
+    return nn_input_normalized.astype(np.float32)
+
+
+class ModelGrid:
+    """
+    Не зависящая от z часть входа сети для модели roH/roV.
+    
+    Нормализованные столбцы сопротивлений считаются один раз для каждого
+    слоя модели. Разметка строк по слоям и расстояния до границ зависят
+    от интервала z (crop_input_model_bkz_std_6_gradient заменяет кровлю
+    первого слоя и подошву последнего краями запаса BUFFER_DEPTH,
+    позиции строк накапливаются от начала интервала), поэтому window
+    считает их для каждого интервала так же, как обычный расчет.
+    """
+    
+    def __init__(self, domain_h, domain_v):
+        self.domain_h = as_layer_table(domain_h)
+        self.domain_v = as_layer_table(domain_v)
+        n_layers = min(len(self.domain_h), len(self.domain_v))
+        
+        # Последняя строка - непокрытые слоями строки сетки
+        data_rows = np.zeros((n_layers + 1, 6), dtype=np.float32)
+        data_rows[:-1] = _layer_data_rows(
+            self.domain_h, self.domain_v, np.arange(n_layers)
+        )
+        zeros = np.zeros(n_layers + 1)
+        with np.errstate(divide='ignore'):
+            self.layer_columns = normalize_nn_input_bkz_std_6_gradient(
+                _assemble_nn_input(
+                    zeros, zeros, np.asarray(data_rows, dtype=np.float64)
+                )
+            )[:, 2:].astype(np.float32)
+    
+    @property
+    def nbytes(self):
+        arrays = [self.layer_columns]
+        for table in (self.domain_h, self.domain_v):
+            arrays.extend((table.top, table.bottom, table.values, table.offsets))
+        return sum(array.nbytes for array in arrays)
+    
+    def window(self, z):
+        """Нормализованный вход сети для интервала z."""
+        domain_h, domain_v, first_elements = crop_input_model_bkz_std_6_gradient(
+            self.domain_h, self.domain_v, z
+        )
+        top_depth = np.round(domain_h.top[0], 3)
+        bottom_depth = np.round(domain_h.bottom[-1], 3)
+        n_depths = int((bottom_depth - top_depth) / MODEL_STEP) + 1
+        
+        # Обрезанная таблица - срез исходной, номер ее первого слоя
+        # находится по началу значений
+        first_layer = np.searchsorted(
+            self.domain_h.offsets, domain_h.offsets[0], side='right'
+        ) - 1
+        with metrics.timer('rasterize'):
+            layer_ids, row_owner = _row_owners(
+                domain_h, domain_v, top_depth, n_depths
+            )
+            row_layers = np.append(layer_ids + first_layer, -1)[row_owner]
+        
+        with metrics.timer('modify_matrix'):
+            dist_to_next_col, dist_to_prev_col = border_distances(
+                n_depths, first_elements
+            )
+        
+        nn_input = np.empty((n_depths, 8), dtype=np.float32)
+        nn_input[:, 0] = dist_to_next_col
+        nn_input[:, 1] = dist_to_prev_col
+        np.take(self.layer_columns, row_layers, axis=0, out=nn_input[:, 2:])
+        return nn_input
+
+
+class ModelGridCache:
+    """
+    LRU-кэш подготовки входа сети по содержимому roH/roV.
+    
+    Хранит ModelGrid модели и готовые входы сети для недавних интервалов.
+    Вход зависит только от крайних глубин z, поэтому повторный расчет
+    с другим шагом z.ini берет его целиком, а с другим интервалом -
+    собирает из ModelGrid. Суммарный размер записей ограничен max_bytes.
+    """
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # ключ: ModelGrid или вход сети
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key_for(domain_h, domain_v):
+        """Ключ по содержимому таблиц слоев."""
+        key_hash = hashlib.blake2b(digest_size=16)
+        for table in (domain_h, domain_v):
+            for array in (table.top, table.bottom, table.values, table.offsets):
+                array = np.ascontiguousarray(array)
+                key_hash.update(str((array.dtype.str, array.shape)).encode())
+                key_hash.update(array.data)
+        return key_hash.digest()
+    
+    def prepare(self, domain_h, domain_v, z):
+        """Нормализованный вход сети (только для чтения)."""
+        key = self.key_for(domain_h, domain_v)
+        z = np.asarray(z)
+        window_key = (key, z.dtype.str, z[0].item(), z[-1].item())
+        
+        nn_input = self._get(window_key)
+        if nn_input is not None:
+            metrics.inc('bkz_grid_cache_requests_total', result='hit')
+            return nn_input
+        
+        grid = self._get(key)
+        metrics.inc(
+            'bkz_grid_cache_requests_total',
+            result='miss' if grid is None else 'grid'
+        )
+        if grid is None:
+            grid = ModelGrid(domain_h, domain_v)
+            self._put(key, grid)
+        
+        nn_input = grid.window(z)
+        nn_input.flags.writeable = False
+        self._put(window_key, nn_input)
+        return nn_input
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+    
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+    
+    def _put(self, key, entry):
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = entry
+            self._total_bytes += entry.nbytes
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.nbytes
+
+
+# Кэш подготовки входа сети в процессе; None - без кэша
+model_grid_cache = (
+    ModelGridCache(config.GRID_CACHE_MAX_MB * 1024 * 1024)
+    if config.GRID_CACHE_MAX_MB > 0 else None
+)
+
+
 class BKZStd6GradientNNSolver:
     """Класс решателя нейронной сети."""
     
-    def __init__(self, model_path="BKZ_solver_900k.onnx"):
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, window_size=None,
+                 session_config=None, grid_cache=DEFAULT_CACHE):
+        """
+        Args:
+            model_path: путь к модели ONNX
+            window_size: длина центральной части окна (в строках модели)
+                для оконного режима; None - вход целиком
+            session_config: настройки сессии поверх SESSION_CONFIG
+                (аргументы create_onnx_session)
+            grid_cache: ModelGridCache; по умолчанию общий кэш процесса
+                (model_grid_cache), None - вход сети всегда строится заново
+        """
+        if window_size is not None and window_size < 1:
+            raise ValueError("Длина окна должна быть положительной")
         self._session = None
         self._input_name = None
         self._output_name = None
         self.model_path = model_path
+        self.window_size = window_size
+        self.session_config = dict(SESSION_CONFIG, **(session_config or {}))
+        self.grid_cache = (
+            model_grid_cache if grid_cache is DEFAULT_CACHE else grid_cache
+        )
 
-    def __call__(self, domain_h, domain_v, z):
-        return self._process_inputs(domain_h, domain_v, z)
+    def __call__(self, domain_h, domain_v, z, layer_bounds=None):
+        return self._process_inputs(domain_h, domain_v, z, layer_bounds)
 
-    def _process_inputs(self, domain_h, domain_v, z):
+    def _process_inputs(self, domain_h, domain_v, z, layer_bounds=None):
         if self._session is None:
             self._init_onnx_session()
 
-        domain_h_processed, domain_v_processed = crop_input_model_bkz_std_6_gradient(
-            domain_h, domain_v, z
-        )
-        nn_input = create_model_for_nn_bkz_std_6_gradient(
-            domain_h_processed, domain_v_processed
-        )
-        nn_input = modify_matrix(nn_input, _first_elements)
-        nn_input_normalized = normalize_nn_input_bkz_std_6_gradient(nn_input)
-        nn_input_normalized = np.expand_dims(nn_input_normalized, 0).astype(
-            np.float32
+        nn_input_normalized = self._prepare_input(
+            domain_h, domain_v, z, layer_bounds
         )
-        
-        raw_predictions = self._session.run(
-            [self._output_name], 
-            {self._input_name: nn_input_normalized}
+        raw_predictions = self._run_batched(
+            [nn_input_normalized], DEFAULT_BATCH_SIZE, None, map
         )[0]
         
         processed_predictions = self._process_predictions(raw_predictions, z)
         
         return processed_predictions
 
-    def _init_onnx_session(self):
-        global _session_cache
-        
-        if _session_cache is None:
-            # Проверяем наличие файла модели
-            if not os.path.exists(self.model_path):
-                raise FileNotFoundError(
-                    f"Модель ONNX не найдена: {self.model_path}. "
-                    "Убедитесь, что файл находится в корневой директории."
+    def solve_many(self, inputs, batch_size=DEFAULT_BATCH_SIZE,
+                   bucket_step=None, workers=1):
+        """
+        Пакетный расчет для нескольких скважин.
+        
+        Args:
+            inputs: последовательность троек (domain_h, domain_v, z),
+                допускается четвертый элемент layer_bounds
+            batch_size: максимум скважин в одном вызове session.run
+            bucket_step: шаг округления длины входа (в строках модели);
+                None - в пакет попадают только входы одинаковой длины
+            workers: число потоков для подготовки входов и запуска пакетов
+        
+        Returns:
+            list: предсказания для каждой скважины в исходном порядке
+        """
+        if batch_size < 1:
+            raise ValueError("Размер пакета должен быть положительным")
+        if workers < 1:
+            raise ValueError("Число потоков должно быть положительным")
+        if self._session is None:
+            self._init_onnx_session()
+
+        inputs = list(inputs)
+        if workers == 1:
+            prepared = [self._prepare_input(*well) for well in inputs]
+            raw_predictions = self._run_batched(
+                prepared, batch_size, bucket_step, map
+            )
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                prepared = list(pool.map(
+                    lambda well: self._prepare_input(*well), inputs
+                ))
+                raw_predictions = self._run_batched(
+                    prepared, batch_size, bucket_step, pool.map
                 )
-            
+        
+        return [
+            self._process_predictions(raw, well[2])
+            for raw, well in zip(raw_predictions, inputs)
+        ]
+
+    def solve_intervals(self, domain_h, domain_v, z_list):
+        """
+        Расчет нескольких интервалов z одной модели за один session.run.
+        
+        Входы интервалов дополняются до длины самого длинного, как в
+        _run_batched. Не зависящая от z часть входа готовится один раз
+        (grid_cache).
+        
+        Returns:
+            list: предсказания для каждого интервала в исходном порядке
+        """
+        if not z_list:
+            raise ValueError("Не указаны интервалы глубин")
+        if self._session is None:
+            self._init_onnx_session()
+        
+        domain_h = as_layer_table(domain_h)
+        domain_v = as_layer_table(domain_v)
+        prepared = [self._prepare_input(domain_h, domain_v, z) for z in z_list]
+        longest = max(
+            stop - start
+            for nn_input in prepared
+            for start, stop, _, _ in self._windows(nn_input.shape[0])
+        )
+        raw_predictions = self._run_batched(prepared, len(prepared), longest, map)
+        
+        return [
+            self._process_predictions(raw, z)
+            for raw, z in zip(raw_predictions, z_list)
+        ]
+
+    def _prepare_input(self, domain_h, domain_v, z, layer_bounds=None):
+        """Подготовка нормализованного входа сети для одной скважины."""
+        if self.grid_cache is not None:
+            h_bounds, v_bounds = layer_bounds or (None, None)
+            domain_h = as_layer_table(domain_h, h_bounds)
+            domain_v = as_layer_table(domain_v, v_bounds)
+            layer_bounds = None
             try:
-                _session_cache = ort.InferenceSession(
-                    self.model_path,
-                    providers=['CPUExecutionProvider']
+                return self.grid_cache.prepare(domain_h, domain_v, z)
+            except ValueError:
+                # Ошибка может быть в слое вне интервала, которого
+                # обычный расчет не касается
+                pass
+        
+        return prepare_nn_input(domain_h, domain_v, z, layer_bounds)
+
+    def _windows(self, length):
+        """
+        Разбиение входа длины length на перекрывающиеся окна.
+        
+        Returns:
+            list: кортежи (начало окна, конец окна, начало центральной
+                части, конец центральной части) в строках входа
+        """
+        if self.window_size is None:
+            return [(0, length, 0, length)]
+        
+        window_length = (
+            WINDOW_MARGIN_BACK + self.window_size + WINDOW_MARGIN_FORWARD
+        )
+        if length <= window_length:
+            return [(0, length, 0, length)]
+        
+        windows = []
+        for core_start in range(0, length, self.window_size):
+            core_end = min(core_start + self.window_size, length)
+            start = min(
+                max(core_start - WINDOW_MARGIN_BACK, 0), length - window_length
+            )
+            windows.append((start, start + window_length, core_start, core_end))
+        
+        return windows
+
+    def _run_batched(self, prepared, batch_size, bucket_step, map_func):
+        """
+        Запуск сети пакетами, сгруппированными по длине входа.
+        
+        В оконном режиме длинные входы режутся на окна одинаковой длины,
+        которые идут в общие пакеты, а центральные части окон сшиваются.
+        Запасы окон не меньше рецептивного поля сети, поэтому результат
+        совпадает с расчетом всей последовательности целиком.
+        
+        Короткие входы дополняются повтором первой строки в начале.
+        Рецептивное поле сети простирается на NN_RECEPTIVE_FIELD_BACK
+        строк назад, что меньше запаса BUFFER_DEPTH, поэтому центральная
+        часть, вырезаемая в _process_predictions, от дополнения не зависит.
+        """
+        pieces = []
+        for index, nn_input in enumerate(prepared):
+            for window in self._windows(nn_input.shape[0]):
+                pieces.append((index,) + window)
+        
+        buckets = {}
+        for piece in pieces:
+            length = piece[2] - piece[1]
+            if bucket_step:
+                length = -(-length // bucket_step) * bucket_step
+            buckets.setdefault(length, []).append(piece)
+        
+        jobs = []
+        for length, bucket in sorted(buckets.items()):
+            for start in range(0, len(bucket), batch_size):
+                chunk = bucket[start:start + batch_size]
+                pads = [
+                    length - (stop - begin) for _, begin, stop, _, _ in chunk
+                ]
+                jobs.append((chunk, pads))
+        
+        def run_job(job):
+            chunk, pads = job
+            batch = np.stack([
+                np.pad(
+                    prepared[i][begin:stop], ((pad, 0), (0, 0)), mode='edge'
                 )
-                print(f"✅ Модель загружена: {self.model_path}")
-            except Exception as e:
-                raise Exception(f"Ошибка загрузки модели ONNX: {str(e)}")
+                for (i, begin, stop, _, _), pad in zip(chunk, pads)
+            ])
+            with metrics.timer('session_run'):
+                return self._session.run(
+                    [self._output_name], 
+                    {self._input_name: batch}
+                )[0]
+        
+        results = [None] * len(prepared)
+        for (chunk, pads), raw_predictions in zip(jobs, map_func(run_job, jobs)):
+            for k, ((i, begin, _, core_start, core_end), pad) in enumerate(
+                zip(chunk, pads)
+            ):
+                if results[i] is None:
+                    results[i] = np.empty(
+                        (1, prepared[i].shape[0], raw_predictions.shape[2]),
+                        dtype=raw_predictions.dtype
+                    )
+                offset = pad - begin
+                results[i][0, core_start:core_end] = raw_predictions[
+                    k, offset + core_start:offset + core_end
+                ]
+        
+        return results
+
+    def _init_onnx_session(self):
+        key = (self.model_path, tuple(sorted(self.session_config.items())))
         
-        self._session = _session_cache
+        with _session_lock:
+            if key not in _session_cache:
+                # Проверяем наличие файла модели
+                if not os.path.exists(self.model_path):
+                    raise FileNotFoundError(
+                        f"Модель ONNX не найдена: {self.model_path}. "
+                        "Убедитесь, что файл находится в корневой директории."
+                    )
+            
+                try:
+                    _session_cache[key] = create_onnx_session(
+                        self.model_path, **self.session_config
+                    )
+                    print(f"✅ Модель загружена: {self.model_path}")
+                except Exception as e:
+                    raise Exception(f"Ошибка загрузки модели ONNX: {str(e)}")
+        
+        self._session = _session_cache[key]
         self._input_name = self._session.get_inputs()[0].name
         self._output_name = self._session.get_outputs()[0].name
 
+    def warm_up(self, length=WARMUP_LENGTH):
+        """
+        Загрузка модели и прогон фиктивного входа, чтобы первый
+        пользователь не ждал инициализации сессии.
+        """
+        if self._session is None:
+            self._init_onnx_session()
+        
+        n_features = self._session.get_inputs()[0].shape[-1]
+        if not isinstance(n_features, int):
+            n_features = 8
+        dummy_input = np.zeros((1, length, n_features), dtype=np.float32)
+        self._session.run([self._output_name], {self._input_name: dummy_input})
+        print(f"🔥 Модель прогрета: {self.model_path}")
+
+    @metrics.timed('postprocess')
     def _process_predictions(self, predictions, z):
         step = np.round(z[1] - z[0], 1)
         crop_size = int(np.round((z[-1] - z[0]) / 0.1)) + 1
@@ -327,6 +1311,221 @@ class BKZStd6GradientNNSolver:
         return predictions_exp
 
 
+def _load_and_solve(roh_path, rov_path, z_path):
+    """Загрузка входных файлов и расчет предсказаний."""
+    # Загружаем данные
+    print("📥 Загружаю данные из файлов...")
+    domain_h = load_obl_layers(roh_path)
+    domain_v = load_obl_layers(rov_path)
+    
+    # Для z.ini пропускаем первую строку (заголовок)
+    with metrics.timer('parse'):
+        z = np.loadtxt(z_path, dtype=np.float32, skiprows=1)
+    
+    return _solve_loaded(domain_h, domain_v, z)
+
+
+def _solve_loaded(domain_h, domain_v, z):
+    """Расчет предсказаний по загруженным данным."""
+    if len(z) == 0:
+        raise ValueError("Файл z.ini пуст или имеет неверный формат")
+    
+    print(f"✅ Данные загружены. Глубин: {len(z)}")
+    
+    # Инициализируем решатель
+    print("🧠 Инициализирую решатель...")
+    solver = BKZStd6GradientNNSolver(window_size=WINDOW_SIZE)
+    
+    # Получаем предсказания
+    print("⚙ Выполняю вычисления...")
+    all_predictions = solver(domain_h, domain_v, z)
+    
+    return z, all_predictions
+
+
+def _solve_intervals(domain_h, domain_v, z_list):
+    """Расчет предсказаний для нескольких интервалов одной модели."""
+    if any(len(z) == 0 for z in z_list):
+        raise ValueError("Интервал глубин пуст")
+    
+    print(f"✅ Данные загружены. Интервалов: {len(z_list)}")
+    
+    print("🧠 Инициализирую решатель...")
+    solver = BKZStd6GradientNNSolver(window_size=WINDOW_SIZE)
+    
+    print("⚙ Выполняю вычисления...")
+    return solver.solve_intervals(domain_h, domain_v, z_list)
+
+
+def iter_prediction_chunks(z, all_predictions, chunk_rows=WRITE_CHUNK_ROWS):
+    """
+    Текст файла .dat частями: заголовок, затем блоки по chunk_rows строк.
+    
+    Строки форматируются пачкой одним оператором %, результат
+    совпадает побайтно с построчным форматированием через
+    format_depth_value и f"{pred:10.3f}".
+    """
+    config_names = [filename for _, filename in SOLVER_CONFIGS]
+    yield "DEPT  " + "  ".join(config_names) + "\n"
+    
+    z = np.asarray(z)
+    all_predictions = np.asarray(all_predictions)
+    if all_predictions.shape[0] < len(z):
+        raise ValueError(
+            f"Предсказаний меньше, чем глубин: "
+            f"{all_predictions.shape[0]} < {len(z)}"
+        )
+    
+    n_columns = all_predictions.shape[1]
+    predictions_format = "  ".join(["%10.3f"] * n_columns) + "\n"
+    # Правило format_depth_value: целая глубина без дробной части
+    # (бесконечность выводится одинаково при обоих форматах)
+    row_formats = np.where(
+        z == np.floor(z),
+        "%6.0f  " + predictions_format,
+        "%6.1f  " + predictions_format
+    )
+    
+    for start in range(0, len(z), chunk_rows):
+        stop = min(start + chunk_rows, len(z))
+        rows = np.empty((stop - start, n_columns + 1), dtype=np.float64)
+        rows[:, 0] = z[start:stop]
+        rows[:, 1:] = all_predictions[start:stop]
+        yield "".join(row_formats[start:stop].tolist()) % tuple(
+            rows.ravel().tolist()
+        )
+
+
+def iter_interval_chunks(z_list, predictions_list):
+    """Текст общего файла .dat нескольких интервалов: заголовок один раз."""
+    for index, (z, all_predictions) in enumerate(zip(z_list, predictions_list)):
+        chunks = iter_prediction_chunks(z, all_predictions)
+        if index:
+            next(chunks)
+        yield from chunks
+
+
+def _write_predictions(z, all_predictions, output_path=None):
+    """Сохранение предсказаний в файл .dat."""
+    # Создаём временный файл, если путь не указан
+    if output_path is None:
+        fd, output_path = tempfile.mkstemp(suffix='.dat', prefix='predictions_')
+        os.close(fd)
+        print(f"📄 Создан временный файл: {output_path}")
+    else:
+        # Создаем директорию, если её нет
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    
+    # Сохраняем результаты
+    print("💾 Сохраняю результаты...")
+    with metrics.timer('write'), open(output_path, 'w', encoding='utf-8') as f:
+        for chunk in iter_prediction_chunks(z, all_predictions):
+            f.write(chunk)
+    
+    print(f"✅ Результаты сохранены в: {output_path}")
+    print(f"📊 Обработано строк: {len(z)}")
+    
+    return output_path
+
+
+def predictions_to_bytes(z, all_predictions):
+    """Содержимое файла .dat в памяти (то же, что пишет _write_predictions)."""
+    with metrics.timer('write'):
+        return "".join(
+            iter_prediction_chunks(z, all_predictions)
+        ).encode('utf-8')
+
+
+def intervals_to_bytes(z_list, predictions_list, combined=False):
+    """
+    Файлы .dat интервалов в памяти.
+    
+    Returns:
+        list: bytes для каждого интервала или один общий файл (combined)
+    """
+    if not combined:
+        return [
+            predictions_to_bytes(z, all_predictions)
+            for z, all_predictions in zip(z_list, predictions_list)
+        ]
+    with metrics.timer('write'):
+        return ["".join(
+            iter_interval_chunks(z_list, predictions_list)
+        ).encode('utf-8')]
+
+
+def _cache_salt(model_path=DEFAULT_MODEL_PATH):
+    """Версия расчета для ключа кэша: меняется вместе с моделью."""
+    stat = os.stat(model_path)
+    return (
+        f"{CACHE_VERSION}:{os.path.abspath(model_path)}:"
+        f"{stat.st_size}:{stat.st_mtime_ns}"
+    )
+
+
+def _resolve_cache(cache):
+    """ResultCache по аргументу cache функций process_*."""
+    if cache is DEFAULT_CACHE:
+        return result_cache if config.RESULT_CACHE_ENABLED else None
+    return cache
+
+
+def _cache_get(cache, cache_key):
+    """Результат (z, предсказания) из кэша или None; учитывается в метриках."""
+    if cache is None or cache_key is None:
+        return None
+    cached = cache.get(cache_key)
+    metrics.inc(
+        'bkz_cache_requests_total',
+        result='hit' if cached is not None else 'miss'
+    )
+    return cached
+
+
+def _cache_put(cache, cache_key, z, all_predictions):
+    """
+    Сохранение результата в кэш. Ошибка записи (нет места, нет прав)
+    не делает успешный расчет ошибкой: она выводится и учитывается
+    в метриках.
+    """
+    try:
+        cache.put(cache_key, z, all_predictions)
+    except OSError as e:
+        metrics.inc('bkz_errors_total', source='cache')
+        print(f"⚠ Не удалось сохранить результат в кэш: {e}")
+
+
+def _cached_solve(cache, cache_key, solve):
+    """
+    Результат из кэша или расчет solve() с сохранением в кэш.
+    
+    Returns:
+        tuple: ((z, предсказания), взят ли результат из кэша)
+    """
+    cached = _cache_get(cache, cache_key)
+    if cached is not None:
+        print("♻️ Результат найден в кэше")
+        return cached, True
+    
+    result = solve()
+    if cache is not None and cache_key is not None:
+        _cache_put(cache, cache_key, *result)
+    return result, False
+
+
+@contextlib.contextmanager
+def _processing_errors():
+    """Ошибки обработки в виде Exception с понятным пользователю текстом."""
+    try:
+        yield
+    except FileNotFoundError as e:
+        raise Exception(f"Файл не найден: {str(e)}")
+    except ValueError as e:
+        raise Exception(f"Ошибка формата файла: {str(e)}")
+    except Exception as e:
+        raise Exception(f"Ошибка обработки файлов: {str(e)}")
+
+
 def process_files(roh_path, rov_path, z_path, output_path=None):
     """
     Основная функция обработки файлов.
@@ -340,7 +1539,28 @@ def process_files(roh_path, rov_path, z_path, output_path=None):
     Returns:
         str: путь к созданному файлу с результатами
     """
-    try:
+    output_path, _ = process_files_cached(
+        roh_path, rov_path, z_path, output_path, cache=None
+    )
+    return output_path
+
+
+def process_files_cached(roh_path, rov_path, z_path, output_path=None,
+                         cache=DEFAULT_CACHE):
+    """
+    Обработка файлов с кэшем результатов по содержимому входных файлов.
+    
+    Args:
+        roh_path, rov_path, z_path, output_path: как в process_files
+        cache: ResultCache; по умолчанию общий кэш, если он включен
+            в config.py; None - без кэша
+    
+    Returns:
+        tuple: (путь к файлу с результатами, взят ли результат из кэша)
+    """
+    cache = _resolve_cache(cache)
+    
+    with _processing_errors():
         print(f"🔍 Начинаю обработку файлов:")
         print(f"   roH: {roh_path}")
         print(f"   roV: {rov_path}")
@@ -351,105 +1571,235 @@ def process_files(roh_path, rov_path, z_path, output_path=None):
             if not os.path.exists(path):
                 raise FileNotFoundError(f"Файл не найден: {path}")
         
-        # Загружаем данные
-        print("📥 Загружаю данные из файлов...")
-        domain_h = load_obl_file_with_separator(roh_path)  
-        domain_v = load_obl_file_with_separator(rov_path)  
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.key_for(
+                [roh_path, rov_path, z_path], salt=_cache_salt()
+            )
+        (z, all_predictions), from_cache = _cached_solve(
+            cache, cache_key,
+            lambda: _load_and_solve(roh_path, rov_path, z_path)
+        )
         
-        # Для z.ini пропускаем первую строку (заголовок)
-        z = np.loadtxt(z_path, dtype=np.float32, skiprows=1)
+        output_path = _write_predictions(z, all_predictions, output_path)
         
-        if len(z) == 0:
-            raise ValueError("Файл z.ini пуст или имеет неверный формат")
+        return output_path, from_cache
+
+
+def cache_key_for_digests(digests):
+    """Ключ кэша результатов по хэшам roH, roV и z из prepare_input."""
+    return ResultCache.key_for_digests(digests, salt=_cache_salt())
+
+
+def process_prepared(domain_h, domain_v, z, cache_key=None,
+                     cache=DEFAULT_CACHE):
+    """
+    Обработка заранее разобранных входных данных (см. prepare_input).
+    
+    Args:
+        domain_h, domain_v: LayerTable для roH и roV
+        z: массив глубин
+        cache_key: ключ из cache_key_for_digests; None - без кэша
+        cache: как в process_files_cached
+    
+    Returns:
+        tuple: (содержимое файла .dat в bytes, взят ли результат из кэша)
+    """
+    with _processing_errors():
+        (z, all_predictions), from_cache = _cached_solve(
+            _resolve_cache(cache), cache_key,
+            lambda: _solve_loaded(domain_h, domain_v, z)
+        )
+        
+        result = predictions_to_bytes(z, all_predictions)
+        print(f"📊 Обработано строк: {len(z)}")
+        
+        return result, from_cache
+
+
+def cache_keys_for_intervals(roh_digest, rov_digest, z_list):
+    """Ключи кэша результатов интервалов по хэшам roH, roV и глубинам."""
+    return [
+        cache_key_for_digests([
+            roh_digest, rov_digest,
+            ResultCache.digest(np.ascontiguousarray(z).tobytes())
+        ])
+        for z in z_list
+    ]
+
+
+def cached_results(cache_keys, cache=DEFAULT_CACHE):
+    """
+    Готовые результаты из кэша без расчета (например, до постановки
+    задачи в очередь). Попадания и промахи не учитываются в метриках:
+    их учитывает тот, кто отдает результат или считает его.
+    
+    Returns:
+        list: (z, предсказания) или None для каждого ключа
+    """
+    cache = _resolve_cache(cache)
+    if cache is None:
+        return [None] * len(cache_keys)
+    return [cache.get(cache_key) for cache_key in cache_keys]
+
+
+def process_intervals(domain_h, domain_v, z_list, combined=False,
+                      cache_keys=None, cache=DEFAULT_CACHE):
+    """
+    Обработка нескольких интервалов глубин одной модели (см. split_z_intervals).
+    
+    Args:
+        domain_h, domain_v: LayerTable для roH и roV
+        z_list: массивы глубин интервалов
+        combined: один общий файл вместо файла на интервал
+        cache_keys: ключи из cache_keys_for_intervals; None - без кэша
+        cache: как в process_files_cached
+    
+    Returns:
+        list: содержимое файлов .dat в bytes (см. intervals_to_bytes)
+    """
+    cache = _resolve_cache(cache)
+    if cache_keys is None:
+        cache = None
+    
+    with _processing_errors():
+        predictions_list = [None] * len(z_list)
+        if cache is not None:
+            for i, cache_key in enumerate(cache_keys):
+                cached = _cache_get(cache, cache_key)
+                if cached is not None:
+                    predictions_list[i] = cached[1]
         
-        print(f"✅ Данные загружены. Глубин: {len(z)}")
+        to_solve = [
+            i for i, predictions in enumerate(predictions_list)
+            if predictions is None
+        ]
+        if to_solve:
+            solved = _solve_intervals(
+                domain_h, domain_v, [z_list[i] for i in to_solve]
+            )
+            for i, predictions in zip(to_solve, solved):
+                predictions_list[i] = predictions
+                if cache is not None:
+                    _cache_put(cache, cache_keys[i], z_list[i], predictions)
         
-        # Инициализируем решатель
-        print("🧠 Инициализирую решатель...")
-        solver = BKZStd6GradientNNSolver()
+        result = intervals_to_bytes(z_list, predictions_list, combined)
+        print(f"📊 Обработано строк: {sum(len(z) for z in z_list)}")
         
-        # Получаем предсказания
-        print("⚙ Выполняю вычисления...")
-        all_predictions = solver(domain_h, domain_v, z)
+        return result
+
+
+def process_files_intervals(roh_path, rov_path, z_path, intervals,
+                            output_dir=None, combined=False):
+    """
+    Обработка нескольких интервалов глубин по файлам.
+    
+    Args:
+        roh_path, rov_path, z_path: как в process_files
+        intervals: пары (кровля, подошва), см. parse_depth_intervals
+        output_dir: папка для результатов (по умолчанию - временная)
+        combined: один общий файл predictions_intervals.dat
+            вместо файла на интервал (interval_filename)
+    
+    Returns:
+        list: пути к созданным файлам с результатами
+    """
+    with _processing_errors():
+        for path in [roh_path, rov_path, z_path]:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Файл не найден: {path}")
         
-        config_names = [filename for _, filename in SOLVER_CONFIGS]
+        print("📥 Загружаю данные из файлов...")
+        domain_h = load_obl_layers(roh_path)
+        domain_v = load_obl_layers(rov_path)
+        with metrics.timer('parse'):
+            z = np.loadtxt(z_path, dtype=np.float32, skiprows=1)
         
-        # Создаём временный файл, если путь не указан
-        if output_path is None:
-            fd, output_path = tempfile.mkstemp(suffix='.dat', prefix='predictions_')
-            os.close(fd)
-            print(f"📄 Создан временный файл: {output_path}")
-        else:
-            # Создаем директорию, если её нет
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # Сохраняем результаты
-        print("💾 Сохраняю результаты...")
-        with open(output_path, 'w', encoding='utf-8') as f:
-            header = "DEPT  " + "  ".join(config_names)
-            f.write(header + "\n")
-            
-            for i in range(len(z)):
-                depth_str = format_depth_value(z[i])
-                pred_str = "  ".join([
-                    f"{pred:10.3f}" for pred in all_predictions[i]
-                ])
-                line = f"{depth_str:>6}  {pred_str}"
-                f.write(line + "\n")
+        z_list = split_z_intervals(z, intervals)
+        predictions_list = _solve_intervals(domain_h, domain_v, z_list)
         
+        if output_dir is None:
+            output_dir = tempfile.mkdtemp(prefix='predictions_')
+        
+        if not combined:
+            return [
+                _write_predictions(
+                    z_part, all_predictions,
+                    os.path.join(output_dir, interval_filename(top, bottom))
+                )
+                for (top, bottom), z_part, all_predictions
+                in zip(intervals, z_list, predictions_list)
+            ]
+        
+        output_path = os.path.join(output_dir, "predictions_intervals.dat")
+        os.makedirs(output_dir, exist_ok=True)
+        with metrics.timer('write'), open(output_path, 'w', encoding='utf-8') as f:
+            for chunk in iter_interval_chunks(z_list, predictions_list):
+                f.write(chunk)
         print(f"✅ Результаты сохранены в: {output_path}")
-        print(f"📊 Обработано строк: {len(z)}")
         
-        return output_path
+        return [output_path]
+
+
+def process_wells(wells, cache_keys=None, cache=DEFAULT_CACHE):
+    """
+    Пакетная обработка нескольких скважин (например, из архива).
+    
+    Скважины, которых нет в кэше, считаются вместе через solve_many:
+    входы близкой длины идут в общие вызовы session.run.
+    
+    Args:
+        wells: тройки (domain_h, domain_v, z) заранее разобранных данных
+        cache_keys: ключи из cache_key_for_digests для каждой скважины;
+            None - без кэша
+        cache: как в process_files_cached
+    
+    Returns:
+        list: содержимое файлов .dat в bytes для каждой скважины
+    """
+    cache = _resolve_cache(cache)
+    if cache_keys is None:
+        cache = None
+    
+    with _processing_errors():
+        results = [None] * len(wells)
+        if cache is not None:
+            results = [_cache_get(cache, cache_key) for cache_key in cache_keys]
+        
+        to_solve = [i for i, result in enumerate(results) if result is None]
+        if to_solve:
+            if any(len(wells[i][2]) == 0 for i in to_solve):
+                raise ValueError("Файл z.ini пуст или имеет неверный формат")
+            
+            print(f"⚙ Выполняю вычисления для скважин: {len(to_solve)}...")
+            solver = BKZStd6GradientNNSolver(window_size=WINDOW_SIZE)
+            predictions_list = solver.solve_many(
+                [wells[i] for i in to_solve], bucket_step=WELLS_BUCKET_STEP
+            )
+            for i, all_predictions in zip(to_solve, predictions_list):
+                results[i] = (wells[i][2], all_predictions)
+                if cache is not None:
+                    _cache_put(cache, cache_keys[i], *results[i])
         
-    except FileNotFoundError as e:
-        raise Exception(f"Файл не найден: {str(e)}")
-    except ValueError as e:
-        raise Exception(f"Ошибка формата файла: {str(e)}")
-    except Exception as e:
-        raise Exception(f"Ошибка обработки файлов: {str(e)}")
+        return [
+            predictions_to_bytes(z, all_predictions)
+            for z, all_predictions in results
+        ]
 
 
 def get_file_type_by_content(filepath):
     """
-    Определяет тип файла по его содержимому.
+    Определяет тип файла по его содержимому (см. utils.detect_file_type).
     
     Returns:
         'roh', 'rov', 'z' или 'unknown'
     """
     try:
-        filename = os.path.basename(filepath).lower()
-        
-        # Сначала по имени
-        if 'roh' in filename:
-            return 'roh'
-        elif 'rov' in filename:
-            return 'rov'
-        elif 'z' in filename or filename.endswith('.ini'):
-            return 'z'
-        
-        # Если не определили по имени, пробуем по содержимому
-        if filename.endswith('.obl'):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                first_line = f.readline().strip()
-                if not first_line:
-                    return 'unknown'
-                
-                values = first_line.split()
-                # roH обычно имеет 5 или 7 значений в строке
-                # roV обычно имеет 6 или 8 значений в строке
-                if len(values) == 5 or len(values) == 7:
-                    return 'roh'
-                elif len(values) == 6 or len(values) == 8:
-                    return 'rov'
-        
-        elif filename.endswith('.ini'):
-            return 'z'
-            
-    except Exception:
-        pass
-    
-    return 'unknown'
+        return detect_file_type(
+            read_file_head(filepath), os.path.basename(filepath)
+        )
+    except OSError:
+        return 'unknown'
 
 
 # Тестовая функция для локальной проверки
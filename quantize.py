@@ -0,0 +1,299 @@
+"""
+Квантование модели в INT8 с проверкой точности относительно FP32.
+
+Примеры:
+    python quantize.py                        # статическое квантование
+    python quantize.py --fp32-nodes NAME ...  # эти свертки остаются в FP32
+    python quantize.py --check-only           # только проверка точности
+
+Калибровка и проверка идут на синтетических скважинах из benchmark.py
+(параметры слоев в реалистичных диапазонах LAYER_PARAMETERS), вход сети
+строится тем же конвейером, что и при обычном расчете.
+Модель сохраняется рядом с исходной как <имя>.int8.onnx, только если
+прошла проверку точности; бот ее не использует (см. README, замер -
+python benchmark.py --model <имя>.int8.onnx).
+Нужен пакет onnx: pip install -r requirements-quantize.txt
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from onnxruntime.quantization import (
+    CalibrationDataReader, QuantFormat, QuantType, quantize_static
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+import benchmark
+import processor
+
+# Квантуются только свертки: на них приходится почти все время расчета,
+# а поэлементные операции между ними в INT8 заметно теряют точность
+OP_TYPES_TO_QUANTIZE = ['Conv']
+
+# Допуск по умолчанию: 95-й процентиль |ln(INT8) - ln(FP32)|
+# в каждом столбце SOLVER_CONFIGS (0.05 - около 5%)
+DEFAULT_TOLERANCE = 0.05
+ERROR_PERCENTILE = 95
+
+# Параметры синтетических скважин для калибровки и проверки
+LAYER_RANGE = (10, 500)
+INTERVAL_M = 300.0
+
+
+def synthetic_wells(count, seed):
+    """Синтетические скважины (domain_h, domain_v, z) разного строения."""
+    rng = np.random.default_rng(seed)
+    wells = []
+    for index in range(count):
+        roh_data, rov_data, z_data = benchmark.make_dataset(
+            layers=int(rng.integers(*LAYER_RANGE)),
+            interval_m=INTERVAL_M,
+            anisotropic=benchmark.ANISOTROPIC_FRACTIONS[
+                index % len(benchmark.ANISOTROPIC_FRACTIONS)
+            ],
+            z_step=benchmark.Z_STEPS[index % len(benchmark.Z_STEPS)],
+            seed=seed + index,
+        )
+        wells.append((
+            processor.parse_input(roh_data, 'roh'),
+            processor.parse_input(rov_data, 'rov'),
+            processor.parse_input(z_data, 'z'),
+        ))
+    return wells
+
+
+class _CalibrationReader(CalibrationDataReader):
+    """Входы сети синтетических скважин для статического квантования."""
+
+    def __init__(self, wells, input_name):
+        self._inputs = iter([
+            {input_name: processor.prepare_nn_input(*well)[None]}
+            for well in wells
+        ])
+
+    def get_next(self):
+        return next(self._inputs, None)
+
+
+def quantized_path(model_path):
+    """Путь к квантованной модели по умолчанию: <имя>.int8.onnx."""
+    root, ext = os.path.splitext(model_path)
+    return f"{root}.int8{ext}"
+
+
+def quantize(model_path, output_path, calibration_wells=32, seed=0,
+             fp32_nodes=()):
+    """
+    Статическое квантование сверток модели в INT8 (QDQ, веса по каналам).
+
+    Args:
+        model_path: исходная модель FP32
+        output_path: файл квантованной модели
+        calibration_wells: число синтетических скважин для калибровки
+        seed: зерно генератора синтетических скважин
+        fp32_nodes: имена сверток, которые остаются в FP32
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Подготовка графа (свертка констант, формы) перед квантованием
+        prepared_path = os.path.join(temp_dir, 'prepared.onnx')
+        quant_pre_process(model_path, prepared_path, skip_symbolic_shape=True)
+
+        input_name = processor.create_onnx_session(
+            model_path, graph_optimization='disable'
+        ).get_inputs()[0].name
+        quantize_static(
+            prepared_path, output_path,
+            _CalibrationReader(
+                synthetic_wells(calibration_wells, seed), input_name
+            ),
+            quant_format=QuantFormat.QDQ,
+            op_types_to_quantize=OP_TYPES_TO_QUANTIZE,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            nodes_to_exclude=list(fp32_nodes),
+        )
+
+
+def _run_solver(solver, wells):
+    """Предсказания для всех скважин и время расчета."""
+    start = time.perf_counter()
+    # Значения вне float32 учитываются в check_accuracy как расхождения
+    with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        predictions = [np.log(solver(*well)) for well in wells]
+    return predictions, time.perf_counter() - start
+
+
+def check_accuracy(model_path, candidate_path, wells,
+                   tolerance=DEFAULT_TOLERANCE):
+    """
+    Сравнение предсказаний квантованной модели с FP32.
+
+    Для каждого столбца SOLVER_CONFIGS считается |ln(INT8) - ln(FP32)|
+    по всем глубинам всех скважин. Глубины, где обе модели выдают
+    значения вне float32, не учитываются; если вне float32 только одна
+    из моделей, это расхождение (finite_mismatches). Проверка пройдена,
+    если расхождений нет и ERROR_PERCENTILE-й процентиль каждого столбца
+    не больше tolerance.
+
+    Returns:
+        dict: ошибки по столбцам, время расчета и итог проверки
+    """
+    reference = processor.BKZStd6GradientNNSolver(
+        model_path, grid_cache=None
+    )
+    quantized = processor.BKZStd6GradientNNSolver(
+        candidate_path, grid_cache=None
+    )
+    reference.warm_up()
+    quantized.warm_up()
+
+    reference_predictions, reference_time = _run_solver(reference, wells)
+    quantized_predictions, quantized_time = _run_solver(quantized, wells)
+
+    quantized_values = np.concatenate(quantized_predictions)
+    reference_values = np.concatenate(reference_predictions)
+    quantized_finite = np.isfinite(quantized_values)
+    reference_finite = np.isfinite(reference_values)
+    with np.errstate(invalid='ignore'):
+        errors = np.abs(quantized_values - reference_values)
+
+    columns = {}
+    for column, (_, name) in enumerate(processor.SOLVER_CONFIGS):
+        both_finite = quantized_finite[:, column] & reference_finite[:, column]
+        column_errors = errors[both_finite, column]
+        stats = {
+            'finite_mismatches': int(np.count_nonzero(
+                quantized_finite[:, column] != reference_finite[:, column]
+            )),
+            'median': None, f'p{ERROR_PERCENTILE}': None, 'max': None,
+        }
+        if len(column_errors):
+            stats.update({
+                'median': float(np.median(column_errors)),
+                f'p{ERROR_PERCENTILE}': float(
+                    np.percentile(column_errors, ERROR_PERCENTILE)
+                ),
+                'max': float(column_errors.max()),
+            })
+        columns[name] = stats
+
+    passed = all(
+        stats['finite_mismatches'] == 0
+        and stats[f'p{ERROR_PERCENTILE}'] is not None
+        and stats[f'p{ERROR_PERCENTILE}'] <= tolerance
+        for stats in columns.values()
+    )
+    return {
+        'tolerance': tolerance,
+        'columns': columns,
+        'fp32_time_s': reference_time,
+        'int8_time_s': quantized_time,
+        'speedup': reference_time / quantized_time if quantized_time else None,
+        'passed': passed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', default=processor.DEFAULT_MODEL_PATH,
+                        help="исходная модель FP32")
+    parser.add_argument('--output', help="файл квантованной модели "
+                                         "(по умолчанию <имя>.int8.onnx)")
+    parser.add_argument('--fp32-nodes', nargs='+', default=(),
+                        metavar='NAME',
+                        help="свертки (имена узлов Conv), которые "
+                             "остаются в FP32")
+    parser.add_argument('--calibration-wells', type=int, default=32,
+                        help="скважин для калибровки")
+    parser.add_argument('--check-wells', type=int, default=12,
+                        help="скважин для проверки точности")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f"допуск {ERROR_PERCENTILE}-го процентиля "
+                             f"|ln(INT8) - ln(FP32)|")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="зерно генератора синтетических скважин")
+    parser.add_argument('--check-only', action='store_true',
+                        help="проверить уже созданную модель --output")
+    parser.add_argument('--force', action='store_true',
+                        help="сохранить модель, даже если проверка не пройдена")
+    args = parser.parse_args(argv)
+
+    if args.calibration_wells < 1 or args.check_wells < 1:
+        parser.error("Число скважин должно быть положительным")
+    output_path = args.output or quantized_path(args.model)
+
+    def log(text):
+        print(text, file=sys.stderr)
+
+    with benchmark.json_safe_stdout():
+        if args.check_only:
+            candidate_path = output_path
+        else:
+            fd, candidate_path = tempfile.mkstemp(
+                suffix='.onnx', dir=os.path.dirname(os.path.abspath(output_path))
+            )
+            os.close(fd)
+            log("⚙ Квантование...")
+            quantize(
+                args.model, candidate_path, args.calibration_wells,
+                args.seed, args.fp32_nodes
+            )
+
+        try:
+            log("🔍 Проверка точности...")
+            # Скважины проверки не пересекаются с калибровочными
+            report = check_accuracy(
+                args.model, candidate_path,
+                synthetic_wells(args.check_wells, args.seed + 1_000_000),
+                args.tolerance
+            )
+        except BaseException:
+            if not args.check_only:
+                os.remove(candidate_path)
+            raise
+
+    for name, stats in report['columns'].items():
+        if stats['median'] is None:
+            text = "нет конечных значений"
+        else:
+            text = (
+                f"медиана {stats['median']:.4f}, "
+                f"p{ERROR_PERCENTILE} {stats[f'p{ERROR_PERCENTILE}']:.4f}, "
+                f"максимум {stats['max']:.4f}"
+            )
+        if stats['finite_mismatches']:
+            text += (
+                f", вне float32 только у одной модели: "
+                f"{stats['finite_mismatches']}"
+            )
+        log(f"  {name}: {text}")
+    log(
+        f"  Время: FP32 {report['fp32_time_s'] * 1000:.0f} мс, "
+        f"INT8 {report['int8_time_s'] * 1000:.0f} мс "
+        f"({report['speedup']:.2f}x)"
+    )
+
+    if not args.check_only:
+        report['fp32_nodes'] = list(args.fp32_nodes)
+        report['saved'] = report['passed'] or args.force
+        if report['saved']:
+            os.replace(candidate_path, output_path)
+            log(f"✅ Модель сохранена: {output_path}")
+        else:
+            os.remove(candidate_path)
+    report['model'] = output_path
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if not report['passed']:
+        log(f"❌ Проверка точности не пройдена (допуск {args.tolerance})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
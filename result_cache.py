@@ -0,0 +1,148 @@
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+import config
+
+
+class ResultCache:
+    """
+    Кэш результатов обработки на диске.
+
+    Ключ - хэш содержимого входных файлов. Каждая запись хранится
+    отдельным .npz файлом; время изменения файла обновляется при каждом
+    попадании и служит временем последнего использования. Записи старше
+    max_age удаляются, при превышении max_bytes удаляются давно
+    не использованные (LRU).
+    """
+
+    def __init__(self, directory, max_bytes, max_age):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(paths, salt=""):
+        """Ключ кэша по содержимому файлов (порядок файлов важен)."""
+        digests = []
+        for path in paths:
+            file_hash = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    file_hash.update(chunk)
+            digests.append(file_hash.digest())
+        return ResultCache.key_for_digests(digests, salt)
+
+    @staticmethod
+    def digest(data):
+        """Хэш содержимого одного файла для key_for_digests."""
+        return hashlib.sha256(data).digest()
+
+    @staticmethod
+    def key_for_digests(digests, salt=""):
+        """Ключ кэша по заранее посчитанным хэшам файлов (digest)."""
+        key_hash = hashlib.sha256(salt.encode('utf-8'))
+        for digest in digests:
+            key_hash.update(digest)
+        return key_hash.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        """
+        Чтение записи.
+
+        Returns:
+            tuple: (z, predictions) или None, если записи нет
+        """
+        path = self._entry_path(key)
+        with self._lock:
+            try:
+                if time.time() - os.path.getmtime(path) > self.max_age:
+                    os.remove(path)
+                    return None
+                with np.load(path) as entry:
+                    z, predictions = entry['z'], entry['predictions']
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+            except Exception:
+                # Поврежденная запись
+                self._remove(path)
+                return None
+        return z, predictions
+
+    def put(self, key, z, predictions):
+        """Сохранение записи с последующим вытеснением старых."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._entry_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                np.savez(f, z=z, predictions=predictions)
+            with self._lock:
+                os.replace(temp_path, path)
+                self._evict()
+        except BaseException:
+            # Недописанный временный файл не должен оставаться в кэше
+            self._remove(temp_path)
+            raise
+
+    def clear(self):
+        """Удаление всех записей."""
+        with self._lock:
+            for path, _, _ in self._entries():
+                self._remove(path)
+
+    def _entries(self):
+        """Записи кэша: (путь, время использования, размер)."""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _evict(self):
+        now = time.time()
+        entries = []
+        for path, used_at, size in self._entries():
+            if now - used_at > self.max_age:
+                self._remove(path)
+            else:
+                entries.append((path, used_at, size))
+
+        total_size = sum(size for _, _, size in entries)
+        for path, _, size in sorted(entries, key=lambda entry: entry[1]):
+            if total_size <= self.max_bytes:
+                break
+            self._remove(path)
+            total_size -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+result_cache = ResultCache(
+    config.RESULT_CACHE_DIR,
+    max_bytes=config.RESULT_CACHE_MAX_MB * 1024 * 1024,
+    max_age=config.RESULT_CACHE_MAX_AGE_HOURS * 3600,
+)
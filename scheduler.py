@@ -0,0 +1,266 @@
+import asyncio
+from collections import OrderedDict, deque
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+from metrics import metrics
+from worker_pool import (
+    ProcessPoolBackend, run_shared_with_metrics, share_args, unpack_result
+)
+
+
+class QueueFullError(Exception):
+    """Очередь задач переполнена."""
+
+
+# Сколько последних ключей affinity помнить
+AFFINITY_SIZE = 1024
+
+
+class _Job:
+    def __init__(self, user_id, func, args, on_position, affinity):
+        self.user_id = user_id
+        self.func = func
+        self.args = args
+        self.on_position = on_position
+        self.affinity = affinity
+        self.position = None
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class JobScheduler:
+    """
+    Очередь задач обработки с пулом процессов.
+
+    Одновременно выполняется не больше workers задач, ожидать может
+    не больше max_queue задач, из них не больше max_user_queue задач одного
+    пользователя (дальше - QueueFullError; задача, которая сразу попадает
+    в свободный процесс, не ждет и не учитывается). У каждого пользователя
+    своя очередь, задачи берутся из них по кругу, и у одного пользователя
+    выполняется не больше per_user_limit задач сразу.
+    Сами задачи выполняются в процессах ProcessPoolBackend (с заранее
+    загруженной моделью), чтобы расчеты не делили GIL с циклом событий бота;
+    массивы аргументов передаются процессам через общую память. Задача
+    с ключом affinity по возможности отправляется в тот процесс, где
+    выполнялась прошлая задача с этим ключом (там модель уже в кэше).
+    """
+
+    def __init__(self, workers, max_queue, per_user_limit,
+                 max_user_queue=None, backend=None):
+        if max_user_queue is None:
+            max_user_queue = max_queue
+        if (workers < 1 or max_queue < 0 or per_user_limit < 1
+                or max_user_queue < 0):
+            raise ValueError("Некорректные параметры очереди задач")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.per_user_limit = per_user_limit
+        self.max_user_queue = max_user_queue
+        self._backend = backend or ProcessPoolBackend(workers)
+        self._pending = OrderedDict()  # user_id: deque[_Job]
+        self._running = {}  # user_id: число выполняемых задач
+        self._running_total = 0
+        self._idle_workers = list(range(workers))
+        self._affinity = OrderedDict()  # ключ affinity: номер процесса
+        self._callbacks = set()
+
+    @property
+    def queued(self):
+        """Число ожидающих задач."""
+        return sum(len(jobs) for jobs in self._pending.values())
+
+    @property
+    def running(self):
+        """Число выполняемых задач."""
+        return self._running_total
+
+    async def submit(self, user_id, func, *args, on_position=None,
+                     affinity=None):
+        """
+        Постановка задачи в очередь и ожидание результата.
+
+        Args:
+            user_id: владелец задачи
+            func: функция уровня модуля (передается в другой процесс)
+            args: аргументы func
+            on_position: async-функция, вызываемая с позицией задачи
+                в очереди (1 - следующая), пока задача ждет
+            affinity: ключ данных задачи (например, хэши roH и roV)
+                для выбора процесса; None - любой свободный процесс
+
+        Returns:
+            результат func
+        """
+        if not self._can_start(user_id):
+            if self.queued >= self.max_queue:
+                raise QueueFullError(
+                    f"В очереди уже {self.queued} задач, попробуйте позже"
+                )
+            user_queued = len(self._pending.get(user_id, ()))
+            if user_queued >= self.max_user_queue:
+                raise QueueFullError(
+                    f"У вас уже {user_queued} задач в очереди, "
+                    f"дождитесь их завершения"
+                )
+
+        job = _Job(user_id, func, args, on_position, affinity)
+        self._pending.setdefault(user_id, deque()).append(job)
+        self._dispatch()
+        return await job.future
+
+    def start(self):
+        """Запуск процессов пула с загрузкой модели (блокирующий вызов)."""
+        self._backend.start()
+
+    def shutdown(self):
+        """Отмена ожидающих задач и остановка пула процессов."""
+        for jobs in self._pending.values():
+            for job in jobs:
+                job.future.cancel()
+        self._pending.clear()
+        self._backend.shutdown()
+
+    def _can_start(self, user_id):
+        """Задача пользователя запустится сразу, без ожидания."""
+        # После _dispatch ожидающие задачи есть при свободных процессах
+        # только у пользователей, достигших per_user_limit
+        return (
+            bool(self._idle_workers)
+            and self._running.get(user_id, 0) < self.per_user_limit
+            and not self._pending.get(user_id)
+        )
+
+    def _next_job(self):
+        """Следующая задача по кругу среди пользователей ниже лимита."""
+        for user_id in list(self._pending):
+            jobs = self._pending[user_id]
+            # Задачи, которые уже никто не ждет, не запускаются
+            while jobs and jobs[0].future.done():
+                jobs.popleft()
+            if not jobs:
+                del self._pending[user_id]
+                continue
+            if self._running.get(user_id, 0) >= self.per_user_limit:
+                continue
+            job = jobs.popleft()
+            # Пользователь уходит в конец круга
+            del self._pending[user_id]
+            if jobs:
+                self._pending[user_id] = jobs
+            return job
+        return None
+
+    def _dispatch(self):
+        while self._idle_workers:
+            job = self._next_job()
+            if job is None:
+                break
+            self._start(job)
+        self._notify_positions()
+
+    def _take_worker(self, affinity):
+        """Свободный процесс, предпочтительно тот, что видел affinity."""
+        index = self._affinity.get(affinity) if affinity is not None else None
+        if index in self._idle_workers:
+            self._idle_workers.remove(index)
+        else:
+            index = self._idle_workers.pop(0)
+        if affinity is not None:
+            self._affinity[affinity] = index
+            self._affinity.move_to_end(affinity)
+            if len(self._affinity) > AFFINITY_SIZE:
+                self._affinity.popitem(last=False)
+        return index
+
+    def _start(self, job):
+        self._running[job.user_id] = self._running.get(job.user_id, 0) + 1
+        self._running_total += 1
+        worker = self._take_worker(job.affinity)
+
+        loop = asyncio.get_running_loop()
+        shm = None
+        try:
+            shm, shared = share_args(job.args)
+            task = loop.run_in_executor(
+                self._backend.executor(worker), run_shared_with_metrics,
+                job.func, shared
+            )
+        except Exception as e:
+            task = loop.create_future()
+            task.set_exception(e)
+        task.add_done_callback(
+            lambda done: self._finish(job, worker, done, shm)
+        )
+
+    def _finish(self, job, worker, done, shm=None):
+        # Процесс пула уже скопировал аргументы из общей памяти
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+        self._running[job.user_id] -= 1
+        if not self._running[job.user_id]:
+            del self._running[job.user_id]
+        self._running_total -= 1
+        self._idle_workers.append(worker)
+
+        if done.cancelled():
+            job.future.cancel()
+        else:
+            try:
+                result = unpack_result(done.result())
+            except BrokenProcessPool as e:
+                # Процесс пула завершился аварийно; следующие задачи
+                # этого слота пойдут в новый процесс
+                self._backend.reset(worker)
+                metrics.inc('bkz_jobs_total', status='error')
+                metrics.inc('bkz_errors_total', source='worker_died')
+                if not job.future.done():
+                    error = Exception(
+                        "Процесс обработки завершился аварийно "
+                        "(возможно, не хватило памяти), попробуйте ещё раз"
+                    )
+                    error.__cause__ = e
+                    job.future.set_exception(error)
+            except Exception as e:
+                metrics.inc('bkz_jobs_total', status='error')
+                metrics.inc('bkz_errors_total', source='processing')
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                metrics.inc('bkz_jobs_total', status='ok')
+                if not job.future.done():
+                    job.future.set_result(result)
+        self._dispatch()
+
+    def _queue_order(self):
+        """Ожидающие задачи в порядке обхода по кругу (без учета лимитов)."""
+        queues = [list(jobs) for jobs in self._pending.values()]
+        order = []
+        for round_index in range(max(map(len, queues), default=0)):
+            order.extend(
+                jobs[round_index] for jobs in queues if round_index < len(jobs)
+            )
+        return order
+
+    def _notify_positions(self):
+        for position, job in enumerate(self._queue_order(), 1):
+            if job.position == position or job.on_position is None:
+                continue
+            job.position = position
+            callback = asyncio.ensure_future(job.on_position(position))
+            self._callbacks.add(callback)
+            callback.add_done_callback(self._callback_done)
+
+    def _callback_done(self, callback):
+        self._callbacks.discard(callback)
+        if not callback.cancelled() and callback.exception() is not None:
+            print(f"❌ Ошибка уведомления об очереди: {callback.exception()}")
+
+
+job_scheduler = JobScheduler(
+    workers=config.PROCESSING_WORKERS,
+    max_queue=config.PROCESSING_QUEUE_SIZE,
+    per_user_limit=config.PROCESSING_PER_USER_LIMIT,
+    max_user_queue=config.PROCESSING_PER_USER_QUEUE,
+)
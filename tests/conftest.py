@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def _repo_root(monkeypatch):
+    """Модель и настройки берутся относительно корня репозитория."""
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture(scope='session')
+def make_well():
+    """
+    Разобранная синтетическая скважина (domain_h, domain_v, z):
+    make_well(layers, interval_m, anisotropic, z_step, seed=0) с теми же
+    аргументами, что benchmark.make_dataset.
+    """
+    import benchmark
+    import processor
+
+    def make(*args, **kwargs):
+        roh_data, rov_data, z_data = benchmark.make_dataset(*args, **kwargs)
+        return (
+            processor.parse_input(roh_data, 'roh'),
+            processor.parse_input(rov_data, 'rov'),
+            processor.parse_input(z_data, 'z'),
+        )
+
+    return make
+
+
+@pytest.fixture
+def bot_module(monkeypatch):
+    """Модуль bot; Bot проверяет формат токена при импорте."""
+    import config
+    monkeypatch.setattr(config, 'BOT_TOKEN', '123456:TEST', raising=False)
+    import bot
+    return bot
@@ -0,0 +1,103 @@
+"""Пакетная обработка с диска: batch.main."""
+import os
+
+import pytest
+
+import batch
+import benchmark
+import processor
+
+
+def _write_well(folder, seed, files=('roh', 'rov', 'z')):
+    roh_data, rov_data, z_data = benchmark.make_dataset(20, 60.0, 0.5, 0.2, seed=seed)
+    data = {'roh': roh_data, 'rov': rov_data, 'z': z_data}
+    os.makedirs(folder, exist_ok=True)
+    # Имена файлов не важны: тип определяется по содержимому
+    for index, file_type in enumerate(files):
+        with open(os.path.join(folder, f"file{index}.txt"), 'wb') as f:
+            f.write(data[file_type])
+    return tuple(processor.parse_input(data[file_type], file_type) for file_type in files)
+
+
+def _mtimes(output_dir):
+    return {
+        name: os.stat(os.path.join(output_dir, name)).st_mtime_ns
+        for name in sorted(os.listdir(output_dir))
+    }
+
+
+@pytest.fixture
+def wells_dir(tmp_path):
+    root = tmp_path / 'wells'
+    expected = {
+        "predictions_field_w1.dat": _write_well(root / 'field' / 'w1', seed=0),
+        "predictions_w2.dat": _write_well(root / 'w2', seed=1),
+    }
+    return str(root), {
+        name: processor.process_wells([well], cache=None)[0]
+        for name, well in expected.items()
+    }
+
+
+def test_processes_wells_and_skips_existing(tmp_path, wells_dir):
+    root, expected = wells_dir
+    output_dir = str(tmp_path / 'out')
+
+    assert batch.main([root, '-o', output_dir]) == 0
+    for name, data in expected.items():
+        with open(os.path.join(output_dir, name), 'rb') as f:
+            assert f.read() == data
+
+    # Готовые результаты новее входных файлов не пересчитываются
+    mtimes = _mtimes(output_dir)
+    assert batch.main([root, '-o', output_dir, '--batch-wells', '1']) == 0
+    assert _mtimes(output_dir) == mtimes
+
+    # Измененный входной файл - пересчет только этой скважины
+    changed = os.path.join(root, 'w2', 'file0.txt')
+    os.utime(changed, ns=(mtimes["predictions_w2.dat"] + 10 ** 9,) * 2)
+    assert batch.main([root, '-o', output_dir]) == 0
+    after = _mtimes(output_dir)
+    assert after["predictions_field_w1.dat"] == mtimes["predictions_field_w1.dat"]
+    assert after["predictions_w2.dat"] != mtimes["predictions_w2.dat"]
+
+    assert batch.main([root, '-o', output_dir, '--force']) == 0
+    assert all(
+        _mtimes(output_dir)[name] != after[name] for name in expected
+    )
+
+
+def test_incomplete_folders_and_failures(tmp_path, wells_dir):
+    root, expected = wells_dir
+    output_dir = str(tmp_path / 'out')
+    _write_well(os.path.join(root, 'no_z'), seed=2, files=('roh', 'rov'))
+    # Одна глубина в z.ini: ошибка разбора при расчете
+    _write_well(os.path.join(root, 'bad'), seed=3, files=('roh', 'rov'))
+    with open(os.path.join(root, 'bad', 'z.ini'), 'wb') as f:
+        f.write(b"DEPT\n1000.0\n")
+
+    # Неполная папка и ошибка одной скважины не мешают остальным
+    assert batch.main([root, '-o', output_dir, '--batch-wells', '3']) == 1
+    assert sorted(os.listdir(output_dir)) == sorted(expected)
+
+    wells, skipped = batch.find_wells([root], output_dir)
+    assert [well.name for well in wells] == ['bad', 'field/w1', 'w2']
+    assert skipped == [('no_z', "нет файлов: z")]
+
+    # Код 1 и при одной только ошибке расчета
+    for name in os.listdir(os.path.join(root, 'no_z')):
+        os.remove(os.path.join(root, 'no_z', name))
+    assert batch.main([root, '-o', output_dir]) == 1
+
+
+def test_nothing_found(tmp_path):
+    empty = tmp_path / 'empty'
+    empty.mkdir()
+    assert batch.main([str(empty), '-o', str(tmp_path / 'out')]) == 1
+
+
+def test_glob_patterns(tmp_path, wells_dir):
+    root, expected = wells_dir
+    output_dir = str(tmp_path / 'out')
+    assert batch.main([os.path.join(root, 'field', '*'), '-o', output_dir]) == 0
+    assert os.listdir(output_dir) == ["predictions_w1.dat"]
@@ -0,0 +1,27 @@
+"""Векторизованный расчет расстояний до границ слоев совпадает с циклом."""
+import numpy as np
+import pytest
+
+import processor
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_border_distances_numpy_matches_loop(seed, dtype):
+    rng = np.random.default_rng(seed)
+    # Толстые слои, слои тоньше шага сетки и границы точно на узлах сетки
+    thickness = np.concatenate([
+        rng.uniform(0.5, 5.0, 40),
+        rng.uniform(0.001, 0.05, 40),
+        np.full(20, processor.MODEL_STEP * 3),
+    ])
+    rng.shuffle(thickness)
+    first_elements = (1000.0 + np.concatenate(([0.0], np.cumsum(thickness))))
+    first_elements = first_elements.astype(dtype)
+    num_rows = int((first_elements[-1] - first_elements[0]) / processor.MODEL_STEP) + 1
+
+    numpy_result = processor.border_distances(num_rows, first_elements, 'numpy')
+    loop_result = processor.border_distances(num_rows, first_elements, 'loop')
+    assert len(numpy_result) == len(loop_result)
+    for a, b in zip(numpy_result, loop_result):
+        assert np.array_equal(a, b, equal_nan=True)
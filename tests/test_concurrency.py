@@ -0,0 +1,106 @@
+"""Параллельные расчеты дают те же результаты, что и последовательные."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import benchmark
+import processor
+
+WELLS = [
+    # (число слоев, интервал z в м, доля анизотропных слоев, шаг z)
+    (20, 150.0, 0.0, 0.1),
+    (300, 400.0, 0.5, 0.1),
+    (1000, 250.0, 1.0, 0.2),
+    (60, 600.0, 0.5, 0.2),
+]
+
+
+def _assert_same(actual, expected):
+    assert len(actual) == len(expected)
+    for a, b in zip(actual, expected):
+        assert np.array_equal(a, b, equal_nan=True)
+
+
+@pytest.fixture(scope='module')
+def wells(make_well):
+    return [make_well(*params, seed=seed) for seed, params in enumerate(WELLS)]
+
+
+def test_predictions_not_degenerate(wells):
+    # Иначе сравнение ниже сводится к сравнению нулей и бесконечностей
+    solver = processor.BKZStd6GradientNNSolver(grid_cache=None)
+    for well in wells:
+        predictions = np.asarray(solver(*well))
+        assert np.all(np.isfinite(predictions))
+        assert np.all(predictions > 0.0)
+
+
+def test_prepare_nn_input_threads_match_serial(wells):
+    serial = [processor.prepare_nn_input(*well) for well in wells]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        threaded = list(pool.map(
+            lambda well: processor.prepare_nn_input(*well), wells * 2
+        ))
+    _assert_same(threaded, serial * 2)
+
+
+def test_solve_many_threads_match_serial(wells):
+    solver = processor.BKZStd6GradientNNSolver(grid_cache=None)
+    serial = [solver(*well) for well in wells]
+    threaded = solver.solve_many(wells, workers=4)
+    batched = solver.solve_many(wells, workers=4, bucket_step=1024)
+    _assert_same(threaded, serial)
+    _assert_same(batched, serial)
+
+
+def test_process_files_concurrent_calls(tmp_path):
+    paths = []
+    for index, params in enumerate(WELLS):
+        dataset = benchmark.make_dataset(*params, seed=index)
+        well_paths = []
+        for name, data in zip(('roH.obl', 'roV.obl', 'z.ini'), dataset):
+            path = tmp_path / f"{index}_{name}"
+            path.write_bytes(data)
+            well_paths.append(str(path))
+        paths.append(well_paths)
+
+    def run(args):
+        index, (roh_path, rov_path, z_path), suffix = args
+        output_path = tmp_path / f"{index}_{suffix}.dat"
+        processor.process_files(roh_path, rov_path, z_path, str(output_path))
+        return output_path.read_bytes()
+
+    serial = [run((i, well, 'serial')) for i, well in enumerate(paths)]
+    # Каждая скважина считается дважды одновременно
+    tasks = [(i, well, f"thread{n}") for n in range(2) for i, well in enumerate(paths)]
+    with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+        concurrent = list(pool.map(run, tasks))
+    assert concurrent == serial * 2
+
+
+def test_session_cache_shared_between_threads(monkeypatch):
+    # Отдельные настройки, чтобы сессия создавалась именно в этом тесте
+    session_config = {'graph_optimization': 'basic', 'intra_op_threads': 1}
+    n_threads = 8
+    barrier = threading.Barrier(n_threads)
+    created = []
+    create_onnx_session = processor.create_onnx_session
+
+    def counting_create(*args, **kwargs):
+        created.append(args)
+        return create_onnx_session(*args, **kwargs)
+
+    monkeypatch.setattr(processor, 'create_onnx_session', counting_create)
+
+    def init(_):
+        solver = processor.BKZStd6GradientNNSolver(session_config=session_config)
+        barrier.wait()
+        solver._init_onnx_session()
+        return solver._session
+
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        sessions = list(pool.map(init, range(n_threads)))
+    assert len(created) == 1
+    assert all(session is sessions[0] for session in sessions)
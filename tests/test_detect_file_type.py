@@ -0,0 +1,66 @@
+"""Определение типа файла по содержимому utils.detect_file_type."""
+import pytest
+
+from utils import SNIFF_BYTES, detect_file_type
+
+ROH_ISOTROPIC = "970.0 972.5 0.25 0.2 10.0 0.8 25.0"
+ROH_ANISOTROPIC = "972.5 980.0 0.25 0.2 40.0"
+ROV_ISOTROPIC = "970.0 972.5 0.25 0.2 10.0 0.8 25.0 25.0"
+ROV_ANISOTROPIC = "972.5 980.0 0.25 0.2 40.0 60.0"
+
+
+@pytest.mark.parametrize('lines, expected', [
+    ([ROH_ISOTROPIC], 'roh'),
+    ([ROH_ANISOTROPIC], 'roh'),
+    ([ROH_ISOTROPIC, ROH_ANISOTROPIC], 'roh'),
+    ([ROV_ISOTROPIC], 'rov'),
+    ([ROV_ANISOTROPIC], 'rov'),
+    ([ROV_ISOTROPIC, ROV_ANISOTROPIC], 'rov'),
+    # Смешение roH и roV в одном файле
+    ([ROH_ISOTROPIC, ROV_ISOTROPIC], 'unknown'),
+    (["1 2 3 4"], 'unknown'),
+    ([ROH_ISOTROPIC, "970.0 abc 0.25 0.2 10.0"], 'unknown'),
+    (["DEPT", "1000.0", "1000.1"], 'z'),
+    (["DEPT", "1000.0 1.0"], 'unknown'),
+    (["", "  ", ROH_ANISOTROPIC, ""], 'roh'),
+])
+def test_columns(lines, expected):
+    head = "\n".join(lines) + "\n"
+    assert detect_file_type(head) == expected
+    assert detect_file_type(head.encode()) == expected
+
+
+def test_header_only_z():
+    # Одного заголовка недостаточно: тип берется по имени
+    assert detect_file_type(b"DEPT\n") == 'unknown'
+    assert detect_file_type(b"DEPT\n", "z.ini") == 'z'
+
+
+@pytest.mark.parametrize('line, expected', [
+    (ROH_ISOTROPIC, 'roh'), (ROV_ANISOTROPIC, 'rov'),
+])
+def test_truncated_final_line(line, expected):
+    data = ((line + "\n") * (SNIFF_BYTES // len(line) + 10)).encode()
+    # Обрезанная на SNIFF_BYTES последняя строка не учитывается
+    assert len(data[:SNIFF_BYTES].splitlines()[-1].split()) != len(line.split())
+    assert detect_file_type(data[:SNIFF_BYTES]) == expected
+    assert detect_file_type(data) == expected
+
+
+def test_short_file_last_line_is_used():
+    # Файл короче SNIFF_BYTES прочитан целиком, последняя строка полная
+    assert detect_file_type(ROH_ISOTROPIC + "\n" + "1 2 3") == 'unknown'
+
+
+@pytest.mark.parametrize('head, filename, expected', [
+    (b"", "roH.obl", 'roh'),
+    (b"", "well_roV.obl", 'rov'),
+    (b"", "z.ini", 'z'),
+    (b"", "depths.ini", 'z'),
+    (b"", "data.txt", 'unknown'),
+    (b"garbage", "roh.obl", 'roh'),
+    # Содержимое важнее имени
+    (ROV_ISOTROPIC.encode(), "roh.obl", 'rov'),
+])
+def test_name_fallback(head, filename, expected):
+    assert detect_file_type(head, filename) == expected
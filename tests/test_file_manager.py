@@ -0,0 +1,118 @@
+"""Хранилище загрузок FileManager: квоты, устаревание и восстановление."""
+import os
+import time
+
+import pytest
+
+from utils import FileManager, QuotaExceededError
+
+ROH = b"970.0 972.5 0.25 0.2 10.0 0.8 25.0\n"
+ROV = b"970.0 972.5 0.25 0.2 10.0 0.8 25.0 30.0\n"
+Z = b"DEPT\n1000.0\n1000.1\n"
+
+
+def _manager(root, ttl=3600, max_total_bytes=10 ** 6, max_user_bytes=10 ** 6):
+    return FileManager(str(root), ttl, max_total_bytes, max_user_bytes)
+
+
+def _write(folder, name, data, age=0):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if age:
+        used_at = time.time() - age
+        os.utime(path, (used_at, used_at))
+    return path
+
+
+def _names(manager, user_id):
+    return [user_file.name for user_file in manager.user_files.get(user_id, [])]
+
+
+def test_same_type_replaces_file(tmp_path):
+    manager = _manager(tmp_path)
+    manager.add_data(1, "a.obl", ROH, 'roh')
+    replaced = manager.add_data(1, "b.obl", ROH + ROH, 'roh')
+    assert replaced.name == "a.obl"
+    assert _names(manager, 1) == ["b.obl"]
+    assert manager.total_bytes == 2 * len(ROH)
+
+
+def test_user_quota_evicts_least_recently_used(tmp_path):
+    manager = _manager(tmp_path, max_user_bytes=3 * len(ROV))
+    manager.add_data(1, "roh.obl", ROH, 'roh')
+    manager.add_data(1, "z.ini", Z, 'z')
+    manager.add_data(1, "old.txt", ROV, 'unknown')
+    manager.user_files[1][0].used_at -= 100  # roh.obl давно не использовался
+
+    manager.add_data(1, "rov.obl", ROV, 'rov')
+    assert _names(manager, 1) == ["z.ini", "old.txt", "rov.obl"]
+    assert manager.get_user_file(1, 'roh') is None
+    assert manager.total_bytes == len(Z) + 2 * len(ROV)
+
+
+def test_total_quota_evicts_other_users(tmp_path):
+    manager = _manager(tmp_path, max_total_bytes=2 * len(ROV))
+    manager.add_data(1, "rov.obl", ROV, 'rov')
+    manager.add_data(2, "rov.obl", ROV, 'rov')
+    manager.user_files[2][0].used_at -= 100
+
+    manager.add_data(3, "rov.obl", ROV, 'rov')
+    assert sorted(manager.user_files) == [1, 3]
+    assert manager.total_bytes == 2 * len(ROV)
+
+
+def test_file_larger_than_quota(tmp_path):
+    manager = _manager(tmp_path, max_user_bytes=len(ROH) - 1)
+    path = _write(manager.user_dir(1), "roh.obl", ROH)
+    with pytest.raises(QuotaExceededError):
+        manager.add_file(1, path, 'roh')
+    assert not os.path.exists(manager.user_dir(1))
+    assert manager.total_bytes == 0
+
+
+def test_sweep_removes_expired_files(tmp_path):
+    manager = _manager(tmp_path, ttl=60)
+    removed = []
+    manager.on_remove = lambda user_id, user_file: removed.append(user_file.name)
+    old_path = _write(manager.user_dir(1), "roh.obl", ROH)
+    manager.add_file(1, old_path, 'roh')
+    manager.add_data(2, "z.ini", Z, 'z')
+    manager.user_files[1][0].used_at -= 120
+
+    assert manager.sweep() == 1
+    assert removed == ["roh.obl"]
+    assert not os.path.exists(manager.user_dir(1))
+    assert list(manager.user_files) == [2]
+    assert manager.total_bytes == len(Z)
+    assert manager.sweep() == 0
+
+
+def test_restore_after_restart(tmp_path):
+    manager = _manager(tmp_path, ttl=3600)
+    folder = manager.user_dir(7)
+    _write(folder, "first.txt", ROH, age=30)
+    _write(folder, "second.txt", ROV, age=20)
+    _write(folder, "expired.ini", Z, age=7200)
+    empty_folder = manager.user_dir(8)
+    os.makedirs(empty_folder)
+    other = _write(tmp_path / "other_dir", "roh.obl", ROH)
+
+    assert manager.restore() == 2
+    # Порядок загрузки по времени изменения, тип по содержимому
+    assert _names(manager, 7) == ["first.txt", "second.txt"]
+    assert manager.get_user_file(7, 'roh').name == "first.txt"
+    assert manager.get_user_file(7, 'rov').name == "second.txt"
+    assert not os.path.exists(os.path.join(folder, "expired.ini"))
+    assert not os.path.exists(empty_folder)
+    assert os.path.exists(other)
+    assert manager.total_bytes == len(ROH) + len(ROV)
+
+    # Повторное восстановление не дублирует файлы
+    assert manager.restore() == 0
+    assert _names(manager, 7) == ["first.txt", "second.txt"]
+
+
+def test_restore_missing_root(tmp_path):
+    assert _manager(tmp_path / "missing").restore() == 0
@@ -0,0 +1,116 @@
+"""Кэш подготовки входа сети ModelGridCache и ModelGrid."""
+import numpy as np
+import pytest
+
+import processor
+from metrics import metrics
+
+
+@pytest.fixture(scope='module')
+def model(make_well):
+    return make_well(200, 300.0, 0.5, 0.1, seed=3)
+
+
+def _z(start, stop, step=0.1):
+    return np.round(np.arange(start, stop + step / 2, step), 1).astype(np.float32)
+
+
+def _requests():
+    counts = {}
+    prefix = 'bkz_grid_cache_requests_total{result="'
+    for line in metrics.render().splitlines():
+        if line.startswith(prefix):
+            result, value = line[len(prefix):].split('"} ')
+            counts[result] = int(value)
+    return counts
+
+
+def _requests_since(before):
+    after = _requests()
+    return {key: after[key] - before.get(key, 0) for key in after
+            if after[key] != before.get(key, 0)}
+
+
+@pytest.mark.parametrize('z_range', [
+    (1000.0, 1100.0), (950.0, 1020.0), (1250.0, 1400.0), (800.0, 850.0),
+])
+def test_grid_window_matches_prepare_nn_input(model, z_range):
+    domain_h, domain_v, _ = model
+    z = _z(*z_range)
+    grid = processor.ModelGrid(domain_h, domain_v)
+    expected = processor.prepare_nn_input(domain_h, domain_v, z)
+    assert np.array_equal(grid.window(z), expected)
+
+
+def test_hits_and_grid_reuse(model):
+    domain_h, domain_v, z = model
+    cache = processor.ModelGridCache(10 ** 8)
+    before = _requests()
+
+    first = cache.prepare(domain_h, domain_v, z)
+    assert _requests_since(before) == {'miss': 1}
+    assert not first.flags.writeable
+
+    # Те же крайние глубины с другим шагом z: готовый вход целиком
+    assert cache.prepare(domain_h, domain_v, z[::2]) is first
+    assert _requests_since(before) == {'miss': 1, 'hit': 1}
+
+    # Другой интервал той же модели собирается из ModelGrid
+    other = cache.prepare(domain_h, domain_v, z[10:-10])
+    assert _requests_since(before) == {'miss': 1, 'hit': 1, 'grid': 1}
+    expected = processor.prepare_nn_input(domain_h, domain_v, z[10:-10])
+    assert np.array_equal(other, expected)
+
+
+def test_changed_model_is_not_reused(model):
+    domain_h, domain_v, z = model
+    cache = processor.ModelGridCache(10 ** 8)
+    first = cache.prepare(domain_h, domain_v, z)
+
+    # Ключ по содержимому: измененный слой - новая запись
+    changed_h = processor.LayerTable(
+        domain_h.top, domain_h.bottom, domain_h.values * 2, domain_h.offsets
+    )
+    before = _requests()
+    changed = cache.prepare(changed_h, domain_v, z)
+    assert _requests_since(before) == {'miss': 1}
+    assert not np.array_equal(changed, first)
+
+    cache.clear()
+    before = _requests()
+    again = cache.prepare(domain_h, domain_v, z)
+    assert _requests_since(before) == {'miss': 1}
+    assert again is not first and np.array_equal(again, first)
+
+
+def test_lru_eviction(model):
+    domain_h, domain_v, _ = model
+    grid_bytes = processor.ModelGrid(domain_h, domain_v).nbytes
+    window_bytes = processor.ModelGridCache(10 ** 8).prepare(
+        domain_h, domain_v, _z(1000.0, 1050.0)
+    ).nbytes
+    # Помещаются ModelGrid и два входа сети
+    cache = processor.ModelGridCache(grid_bytes + 2 * window_bytes)
+
+    windows = [_z(start, start + 50.0) for start in (1000.0, 1100.0, 1200.0)]
+    first = cache.prepare(domain_h, domain_v, windows[0])
+    cache.prepare(domain_h, domain_v, windows[1])
+    # Обращение к первому входу делает второй самым старым
+    assert cache.prepare(domain_h, domain_v, windows[0]) is first
+    cache.prepare(domain_h, domain_v, windows[2])
+    assert cache._total_bytes <= cache.max_bytes
+
+    before = _requests()
+    assert cache.prepare(domain_h, domain_v, windows[0]) is first
+    cache.prepare(domain_h, domain_v, windows[1])
+    assert _requests_since(before) == {'hit': 1, 'grid': 1}
+
+
+def test_entry_larger_than_cache_is_not_stored(model):
+    domain_h, domain_v, z = model
+    cache = processor.ModelGridCache(1024)
+    before = _requests()
+    cache.prepare(domain_h, domain_v, z)
+    cache.prepare(domain_h, domain_v, z)
+    assert _requests_since(before) == {'miss': 2}
+    assert cache._total_bytes == 0
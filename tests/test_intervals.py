@@ -0,0 +1,62 @@
+"""Разбор интервалов глубин для /intervals."""
+import numpy as np
+import pytest
+
+import processor
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("1000-1100", [(1000.0, 1100.0)]),
+    ("1000-1100 1250.5-1300", [(1000.0, 1100.0), (1250.5, 1300.0)]),
+    ("1000-1100,1200-1300; 1400-1500", [
+        (1000.0, 1100.0), (1200.0, 1300.0), (1400.0, 1500.0)
+    ]),
+    ("1000–1100 1200—1300", [(1000.0, 1100.0), (1200.0, 1300.0)]),
+    # Порядок перечисления сохраняется, перекрытия допускаются
+    ("1200-1300 1000-1250", [(1200.0, 1300.0), (1000.0, 1250.0)]),
+    ("  1000-1100\n", [(1000.0, 1100.0)]),
+])
+def test_parse_depth_intervals(text, expected):
+    assert processor.parse_depth_intervals(text) == expected
+
+
+@pytest.mark.parametrize('text, message', [
+    ("", "Не указаны интервалы"),
+    (" , ; ", "Не указаны интервалы"),
+    ("1000", "Неверный интервал '1000'"),
+    ("1000-1100-1200", "Неверный интервал '1000-1100-1200'"),
+    ("1000-abc", "Неверный интервал '1000-abc'"),
+    ("1000 - 1100", "Неверный интервал '1000'"),
+    ("1100-1000", "Кровля интервала 1100-1000 должна быть выше подошвы"),
+    ("1000-1000", "Кровля интервала 1000-1000"),
+])
+def test_parse_depth_intervals_errors(text, message):
+    with pytest.raises(ValueError, match=message):
+        processor.parse_depth_intervals(text)
+
+
+def test_split_z_intervals():
+    z = np.round(np.arange(1000.0, 1010.05, 0.1), 1).astype(np.float32)
+    z_list = processor.split_z_intervals(
+        z, [(1000.0, 1001.0), (1005.05, 1005.35), (999.0, 1000.1), (1009.9, 2000.0)]
+    )
+    # Границы включаются, глубины не пересчитываются
+    assert [part.tolist() for part in z_list] == [
+        z[:11].tolist(), z[51:54].tolist(), z[:2].tolist(), z[-2:].tolist()
+    ]
+    assert all(part.dtype == z.dtype for part in z_list)
+
+
+@pytest.mark.parametrize('interval, message', [
+    ((900.0, 950.0), "В интервале 900-950 м нет глубин из z.ini"),
+    ((1003.02, 1003.08), "В интервале 1003.0-1003.1 м нет глубин"),
+    ((1010.0, 1100.0), "В интервале 1010-1100 м только одна глубина"),
+])
+def test_split_z_intervals_errors(interval, message):
+    z = np.round(np.arange(1000.0, 1010.05, 0.1), 1).astype(np.float32)
+    with pytest.raises(ValueError, match=message):
+        processor.split_z_intervals(z, [(1000.0, 1001.0), interval])
+
+
+def test_interval_filename():
+    assert processor.interval_filename(1000.0, 1100.5) == "predictions_1000-1100.5.dat"
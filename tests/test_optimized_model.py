@@ -0,0 +1,37 @@
+"""Сохранение оптимизированной модели (ONNX_OPTIMIZED_MODEL_PATH)."""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import processor
+
+
+def _run(session):
+    dummy_input = np.zeros((1, 500, 8), dtype=np.float32)
+    return session.run(None, {session.get_inputs()[0].name: dummy_input})[0]
+
+
+def test_concurrent_sessions_save_one_complete_file(tmp_path):
+    optimized_path = str(tmp_path / 'optimized.onnx')
+
+    def create(_):
+        return processor.create_onnx_session(
+            processor.DEFAULT_MODEL_PATH, optimized_model_path=optimized_path
+        )
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        sessions = list(pool.map(create, range(4)))
+
+    # Временные файлы перенесены на место или удалены
+    assert os.listdir(tmp_path) == ['optimized.onnx']
+    expected = _run(sessions[0])
+    for session in sessions[1:]:
+        assert np.array_equal(_run(session), expected)
+
+    # Сохраненная модель загружается без повторной оптимизации
+    reloaded = processor.create_onnx_session(
+        processor.DEFAULT_MODEL_PATH, optimized_model_path=optimized_path
+    )
+    assert np.allclose(_run(reloaded), expected, rtol=1e-5, atol=1e-6)
+    assert os.listdir(tmp_path) == ['optimized.onnx']
@@ -0,0 +1,72 @@
+"""Разбор файлов roH/roV parse_obl_buffer."""
+import numpy as np
+import pytest
+
+import processor
+
+LINES = [
+    "970.0 972.5 0.25 0.2 10.0 0.8 25.0",
+    "972.5 980.0 0.25 0.2 40.0",
+]
+
+
+def _layers(buffer):
+    return processor.LayerTable.from_flat(*processor.parse_obl_buffer(buffer))
+
+
+def _assert_layers(table, expected_lines):
+    assert len(table) == len(expected_lines)
+    for index, line in enumerate(expected_lines):
+        values = np.array(line.split(), dtype=np.float32)
+        assert table.top[index] == values[0]
+        assert table.bottom[index] == values[1]
+        assert np.array_equal(table.layer(index), values[2:])
+
+
+@pytest.mark.parametrize('buffer', [
+    "\n".join(LINES) + "\n",
+    "\r\n".join(LINES) + "\r\n",
+    "\n".join(LINES),
+    "\n".join(line.replace(" ", "\t") for line in LINES),
+    "\n\n  " + "\n   \n".join(LINES) + "  \n\n",
+])
+def test_separators(buffer):
+    _assert_layers(_layers(buffer.encode()), LINES)
+
+
+def test_scientific_notation():
+    table = _layers(b"9.7e2 972.5 2.5E-1 2e-1 1e+1 8E-1 2.5e1\n")
+    _assert_layers(table, LINES[:1])
+
+
+def test_bytes_and_str_match():
+    buffer = "\n".join(LINES)
+    expected = processor.parse_obl_buffer(buffer.encode())
+    actual = processor.parse_obl_buffer(buffer)
+    for a, b in zip(actual, expected):
+        assert np.array_equal(a, b)
+
+
+@pytest.mark.parametrize('buffer, line, token', [
+    (LINES[0] + "\n972.5 980.0 0.25 abc 40.0\n", 2, 'abc'),
+    ("970,0 972.5 0.25 0.2 10.0\n", 1, '970,0'),
+    (LINES[0] + "\n972.5 980.0 0.25 0.2 4e\n", 2, '4e'),
+])
+def test_bad_token(buffer, line, token):
+    with pytest.raises(ValueError, match=f"строке {line}: {token}"):
+        processor.parse_obl_buffer(buffer.encode())
+
+
+@pytest.mark.parametrize('buffer', [b"", b"   \n\t\r\n  \n"])
+def test_blank_file(buffer):
+    data, layer_bounds = processor.parse_obl_buffer(buffer)
+    assert data.size == 0 and layer_bounds.shape == (0, 2)
+    with pytest.raises(ValueError, match="пуст"):
+        processor.parse_input(buffer, 'roh')
+
+
+@pytest.mark.filterwarnings('error')
+def test_no_warnings():
+    _assert_layers(_layers("\n".join(LINES).encode()), LINES)
+    with pytest.raises(ValueError, match="строке 1: 10.0x"):
+        processor.parse_obl_buffer(b"970.0 972.5 0.25 0.2 10.0x\n")
@@ -0,0 +1,46 @@
+"""Проверка точности quantize.py на синтетических скважинах."""
+import numpy as np
+import pytest
+
+pytest.importorskip('onnx')
+
+import processor
+import quantize
+
+
+@pytest.fixture(scope='module')
+def wells():
+    return quantize.synthetic_wells(4, seed=0)
+
+
+def test_synthetic_wells_predictions_in_range(wells):
+    solver = processor.BKZStd6GradientNNSolver(grid_cache=None)
+    for well in wells:
+        predictions = np.asarray(solver(*well))
+        assert np.all(np.isfinite(predictions))
+        assert np.all(predictions > 0.0)
+
+
+def test_fp32_against_itself_passes(wells):
+    report = quantize.check_accuracy(
+        processor.DEFAULT_MODEL_PATH, processor.DEFAULT_MODEL_PATH, wells
+    )
+    assert report['passed']
+    for stats in report['columns'].values():
+        assert stats['finite_mismatches'] == 0
+        assert stats[f'p{quantize.ERROR_PERCENTILE}'] == 0.0
+
+
+def test_int8_model_fails_gate(tmp_path, wells):
+    # Почему бот работает только с FP32: см. README, «Квантованная модель»
+    candidate_path = str(tmp_path / 'model.int8.onnx')
+    quantize.quantize(
+        processor.DEFAULT_MODEL_PATH, candidate_path, calibration_wells=4
+    )
+    report = quantize.check_accuracy(
+        processor.DEFAULT_MODEL_PATH, candidate_path, wells
+    )
+    assert not report['passed']
+    for stats in report['columns'].values():
+        assert stats['finite_mismatches'] == 0
+        assert stats[f'p{quantize.ERROR_PERCENTILE}'] > quantize.DEFAULT_TOLERANCE
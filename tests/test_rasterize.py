@@ -0,0 +1,93 @@
+"""Векторизованное построение модели по слоям совпадает с циклом по слоям."""
+import numpy as np
+import pytest
+
+import processor
+
+
+def _rasterize_loop(domain_h, domain_v):
+    """Эталон: поочередное заполнение сетки слоями (до векторизации)."""
+    top_depth = np.round(domain_h.top[0], 3)
+    bottom_depth = np.round(domain_h.bottom[-1], 3)
+    n_depths = int((bottom_depth - top_depth) / processor.MODEL_STEP) + 1
+    nn_resistivity_model = np.zeros((n_depths, 6), dtype=np.float32)
+
+    for i in range(min(len(domain_h), len(domain_v))):
+        values_h = domain_h.layer(i)
+        if values_h.shape[0] == 5:  # изотропный слой
+            data_row = np.hstack((values_h, values_h[-1]))
+        else:  # анизотропный слой
+            data_row = np.hstack((
+                values_h[:3], 0.0, values_h[-1], domain_v.layer(i)[-1]
+            ))
+
+        start_idx = int(np.round((domain_h.top[i] - top_depth) / processor.MODEL_STEP))
+        end_idx = int(np.round((domain_h.bottom[i] - top_depth) / processor.MODEL_STEP))
+        start_idx = max(0, min(start_idx, n_depths - 1))
+        end_idx = max(0, min(end_idx, n_depths - 1))
+        if start_idx <= end_idx:
+            nn_resistivity_model[start_idx:end_idx + 1] = data_row
+
+    return nn_resistivity_model
+
+
+def _tables(seed, n_layers=300):
+    """Слои roH/roV: толстые, тоньше шага сетки, с зазорами и перекрытиями."""
+    rng = np.random.default_rng(seed)
+    thickness = rng.choice(
+        [0.01, 0.04, 0.05, 0.06, 0.1, 0.15, 0.25, 1.0, 3.7], n_layers
+    )
+    # Зазоры между слоями (непокрытые строки) и перекрытия соседних слоев
+    shifts = rng.choice([0.0, 0.0, 0.0, 0.3, -0.02], n_layers)
+    tops = 1000.0 + np.concatenate(([0.0], np.cumsum(thickness[:-1] + shifts[:-1])))
+    bottoms = tops + thickness
+    h_rows, v_rows = [], []
+    for top, bottom in zip(tops, bottoms):
+        values = rng.uniform(0.1, 100.0, 5).round(3)
+        if rng.random() < 0.5:
+            h_rows.append([top, bottom, *values])
+            v_rows.append([top, bottom, *values, values[-1]])
+        else:
+            h_rows.append([top, bottom, *values[:3]])
+            v_rows.append([top, bottom, *values[:3], rng.uniform(0.1, 100.0)])
+
+    def table(rows):
+        text = "\n".join(" ".join(f"{value:.4f}" for value in row) for row in rows)
+        return processor.LayerTable.from_flat(*processor.parse_obl_buffer(text))
+
+    return table(h_rows), table(v_rows), tops[0], bottoms[-1]
+
+
+def _assert_same(domain_h, domain_v):
+    expected = _rasterize_loop(domain_h, domain_v)
+    actual = processor.create_model_for_nn_bkz_std_6_gradient(domain_h, domain_v)
+    assert actual.dtype == expected.dtype
+    assert np.array_equal(actual, expected)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_rasterize_matches_loop(seed):
+    domain_h, domain_v, _, _ = _tables(seed)
+    _assert_same(domain_h, domain_v)
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('z_range', [
+    (-50.0, -20.0),  # выше модели
+    (-20.0, 10.0),   # начинается выше модели
+    (5.0, 30.0),     # внутри модели
+    (-30.0, 2000.0), # шире модели
+    (1e4, 1e4 + 5),  # ниже модели
+])
+def test_cropped_rasterize_matches_loop(seed, z_range):
+    domain_h, domain_v, top, _ = _tables(seed)
+    z = np.arange(top + z_range[0], top + z_range[1], processor.MODEL_STEP)
+    cropped_h, cropped_v, _ = processor.crop_input_model_bkz_std_6_gradient(
+        domain_h, domain_v, z.astype(np.float32)
+    )
+    _assert_same(cropped_h, cropped_v)
+
+
+def test_roh_and_rov_layer_counts_differ():
+    domain_h, domain_v, _, _ = _tables(0, n_layers=50)
+    _assert_same(domain_h, domain_v.slice(0, 40))
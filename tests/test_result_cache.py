@@ -0,0 +1,50 @@
+"""Кэш результатов: ошибка записи не делает расчет ошибкой."""
+import numpy as np
+import pytest
+
+import processor
+from metrics import metrics
+from result_cache import ResultCache
+
+
+class UnwritableCache(ResultCache):
+    def put(self, key, z, predictions):
+        raise OSError(28, "No space left on device")
+
+
+@pytest.fixture(scope='module')
+def well(make_well):
+    return make_well(50, 100.0, 0.5, 0.1)
+
+
+def _cache_errors():
+    prefix = 'bkz_errors_total{source="cache"} '
+    for line in metrics.render().splitlines():
+        if line.startswith(prefix):
+            return int(line[len(prefix):])
+    return 0
+
+
+def test_put_failure_returns_result(tmp_path, well):
+    cache = UnwritableCache(str(tmp_path), 10 ** 8, 3600)
+    expected, _ = processor.process_prepared(*well, cache=None)
+    errors = _cache_errors()
+
+    result, from_cache = processor.process_prepared(
+        *well, cache_key='key', cache=cache
+    )
+    assert (result, from_cache) == (expected, False)
+    assert processor.process_wells([well], ['key'], cache=cache) == [expected]
+    assert _cache_errors() == errors + 2
+
+
+def test_put_failure_leaves_no_temp_file(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path), 10 ** 8, 3600)
+
+    def fail_replace(src, dst):
+        raise OSError("replace failed")
+
+    monkeypatch.setattr('result_cache.os.replace', fail_replace)
+    with pytest.raises(OSError):
+        cache.put('key', np.zeros(3), np.zeros((3, 6)))
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,97 @@
+"""Очередь задач JobScheduler с пулом потоков вместо процессов."""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from scheduler import JobScheduler, QueueFullError
+
+release = threading.Event()
+
+
+def blocking_job(value):
+    release.wait(5)
+    return value
+
+
+class BrokenExecutor:
+    """Пул, процесс которого завершился аварийно."""
+
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("worker died")
+
+
+class ThreadBackend:
+    """Бэкенд JobScheduler с пулами потоков."""
+
+    def __init__(self, workers):
+        self._executors = [ThreadPoolExecutor(max_workers=1) for _ in range(workers)]
+        self.resets = []
+
+    def executor(self, index):
+        return self._executors[index]
+
+    def reset(self, index):
+        self.resets.append(index)
+        self._executors[index] = ThreadPoolExecutor(max_workers=1)
+
+    def start(self):
+        pass
+
+    def shutdown(self):
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+@pytest.fixture(autouse=True)
+def _release_jobs():
+    release.clear()
+    yield
+    release.set()
+
+
+def test_per_user_queue_limit():
+    async def scenario():
+        scheduler = JobScheduler(
+            workers=1, max_queue=10, per_user_limit=1, max_user_queue=2,
+            backend=ThreadBackend(1)
+        )
+        # Первая задача выполняется, две ждут
+        tasks = [
+            asyncio.ensure_future(scheduler.submit(1, blocking_job, n))
+            for n in range(3)
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.running == 1 and scheduler.queued == 2
+
+        with pytest.raises(QueueFullError):
+            await scheduler.submit(1, blocking_job, 3)
+        # Другой пользователь в общую очередь попадает
+        other = asyncio.ensure_future(scheduler.submit(2, blocking_job, 4))
+        await asyncio.sleep(0)
+        assert scheduler.queued == 3
+
+        release.set()
+        assert await asyncio.gather(*tasks, other) == [0, 1, 2, 4]
+        scheduler.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_broken_worker_is_replaced():
+    async def scenario():
+        backend = ThreadBackend(1)
+        backend._executors[0] = BrokenExecutor()
+        scheduler = JobScheduler(
+            workers=1, max_queue=10, per_user_limit=1, backend=backend
+        )
+        release.set()
+        with pytest.raises(Exception, match="аварийно"):
+            await scheduler.submit(1, blocking_job, 1)
+        assert backend.resets == [0]
+        assert await scheduler.submit(1, blocking_job, 2) == 2
+        scheduler.shutdown()
+
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+"""Заранее начатая обработка отменяется вместе с удалением ее файлов."""
+import asyncio
+import time
+
+import pytest
+
+from utils import file_manager
+
+USER_ID = 424242
+
+
+@pytest.fixture
+def bot(bot_module, monkeypatch):
+    bot = bot_module
+
+    async def never_finishes(user_id, *files):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(bot, 'run_processing', never_finishes)
+    for file_type in ('roh', 'rov', 'z'):
+        file_manager.add_data(USER_ID, f"{file_type}.txt", b"1", file_type)
+    yield bot
+    file_manager.clear_user_files(USER_ID)
+    bot.speculative_runs.clear()
+
+
+def _run_and_remove(bot, remove):
+    async def scenario():
+        bot.start_speculative_run(USER_ID)
+        task = bot.speculative_runs[USER_ID][1]
+        remove()
+        await asyncio.sleep(0)
+        return task
+
+    return asyncio.run(scenario())
+
+
+def test_sweep_discards_speculative_run(bot):
+    def expire():
+        for user_file in file_manager.user_files[USER_ID]:
+            user_file.used_at = time.time() - file_manager.ttl - 1
+        assert file_manager.sweep() == 3
+
+    task = _run_and_remove(bot, expire)
+    assert USER_ID not in bot.speculative_runs
+    assert task.cancelled()
+
+
+def test_removed_file_discards_speculative_run(bot):
+    def remove_z():
+        file_manager.remove_file(USER_ID, file_manager.get_user_file(USER_ID, 'z'))
+
+    task = _run_and_remove(bot, remove_z)
+    assert USER_ID not in bot.speculative_runs
+    assert task.cancelled()
@@ -0,0 +1,144 @@
+"""Чтение архивов скважин (well_archive) и ошибки обработки архива в боте."""
+import asyncio
+import io
+import tarfile
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+
+import benchmark
+import well_archive
+
+MB = 1024 * 1024
+ROH, ROV, Z = benchmark.make_dataset(20, 150.0, 0.0, 0.1, seed=0)
+
+
+def _zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for path, data in files.items():
+            archive.writestr(path, data)
+    buffer.seek(0)
+    return buffer
+
+
+def _tar(files):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for path, data in files.items():
+            info = tarfile.TarInfo(path)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+def _well(folder):
+    # Тип определяется по содержимому, а не по имени файла
+    return {f"{folder}/a.txt": ROH, f"{folder}/b.txt": ROV, f"{folder}/c.txt": Z}
+
+
+def _read(fileobj, filename='wells.zip', max_wells=10,
+          max_file_bytes=MB, max_total_bytes=10 * MB):
+    return well_archive.read_wells(
+        fileobj, filename, max_wells, max_file_bytes, max_total_bytes
+    )
+
+
+@pytest.mark.parametrize('pack, filename', [(_zip, 'wells.zip'), (_tar, 'wells.tar.gz')])
+def test_nested_folders(pack, filename):
+    files = {**_well("field/w1"), **_well("field/deep/w2")}
+    wells, skipped = _read(pack(files), filename)
+    assert [well.name for well in wells] == ["field/w1", "field/deep/w2"]
+    assert skipped == []
+    assert len(wells[0].z) == len(Z.splitlines()) - 1
+
+
+def test_files_in_archive_root():
+    files = {"roh.obl": ROH, "rov.obl": ROV, "z.ini": Z}
+    wells, skipped = _read(_zip(files), 'well7.zip')
+    assert [well.name for well in wells] == ["well7"]
+
+
+def test_incomplete_and_broken_wells():
+    files = {
+        **_well("ok"),
+        "no_z/a.txt": ROH, "no_z/b.txt": ROV,
+        **_well("twice"), "twice/d.txt": ROH,
+        # Тип файла с ошибкой определяется по имени
+        "broken/roh.obl": ROH.replace(b"0.056", b"0.0.56"),
+        "broken/b.txt": ROV, "broken/c.txt": Z,
+        "notes/readme.txt": b"comment\nline\n",
+        "__MACOSX/ok/._a.txt": b"junk", "ok/.hidden": ROH,
+    }
+    wells, skipped = _read(_zip(files))
+    assert [well.name for well in wells] == ["ok"]
+    reasons = dict(skipped)
+    assert reasons["no_z"] == "нет файлов: z"
+    assert reasons["twice"] == "несколько файлов типа roh"
+    assert reasons["broken"].startswith("roh.obl: Некорректное значение")
+    assert "notes" not in reasons
+
+
+def test_limits():
+    files = {**_well("w1"), **_well("w2"), **_well("w3")}
+    with pytest.raises(ValueError, match="больше 2 скважин"):
+        _read(_zip(files), max_wells=2)
+    assert len(_read(_zip(files), max_wells=3)[0]) == 3
+
+    with pytest.raises(ValueError, match="Файл w1/a.txt больше"):
+        _read(_zip(files), max_file_bytes=len(ROH) - 1)
+    with pytest.raises(ValueError, match="Распакованные файлы архива больше"):
+        _read(_zip(files), max_total_bytes=len(ROH) + len(ROV))
+
+    with pytest.raises(ValueError, match="Не удалось прочитать архив"):
+        _read(io.BytesIO(b"not an archive"))
+
+
+def test_pack_predictions():
+    results = [("field/w1", b"1"), ("field_w1", b"2"), ("w2", b"3")]
+    with zipfile.ZipFile(io.BytesIO(well_archive.pack_predictions(results))) as archive:
+        assert archive.namelist() == [
+            "predictions_field_w1.dat", "predictions_field_w1_2.dat",
+            "predictions_w2.dat",
+        ]
+        assert [archive.read(name) for name in archive.namelist()] == [
+            b"1", b"2", b"3"
+        ]
+
+
+class FakeMessage:
+    def __init__(self, document):
+        self.from_user = SimpleNamespace(id=1)
+        self.document = document
+        self.answers = []
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+        return self
+
+    async def edit_text(self, text, **kwargs):
+        pass
+
+    async def answer_document(self, document, **kwargs):
+        raise RuntimeError("сеть недоступна")
+
+
+@pytest.mark.parametrize('failure', ['download', 'send'])
+def test_handle_archive_reports_unexpected_errors(bot_module, monkeypatch, failure):
+    async def download(document):
+        if failure == 'download':
+            raise RuntimeError("сеть недоступна")
+        return _zip(_well("w1"))
+
+    async def run_archive_wells(user_id, wells, on_position=None):
+        return [(well.name, b"1") for well in wells], []
+
+    monkeypatch.setattr(bot_module.bot, 'download', download)
+    monkeypatch.setattr(bot_module, 'run_archive_wells', run_archive_wells)
+    message = FakeMessage(SimpleNamespace(file_name='wells.zip', file_size=1))
+
+    asyncio.run(bot_module.handle_archive(message))
+    assert message.answers[-1].startswith("❌ Ошибка обработки архива wells.zip")
+    assert "сеть недоступна" in message.answers[-1]
@@ -0,0 +1,53 @@
+"""Оконный режим (ONNX_WINDOW_SIZE) дает тот же результат, что и расчет целиком."""
+import numpy as np
+import pytest
+
+import processor
+
+# Окна короче скважины: 6000 строк модели при длине окна 500 + запасы
+WINDOW_SIZE = 500
+
+
+@pytest.fixture(scope='module')
+def wells(make_well):
+    return [
+        make_well(*params, seed=seed)
+        for seed, params in enumerate([(60, 600.0, 0.5, 0.1), (20, 150.0, 0.0, 0.2)])
+    ]
+
+
+def test_solver_windowed_matches_full(wells):
+    full = processor.BKZStd6GradientNNSolver(grid_cache=None)
+    windowed = processor.BKZStd6GradientNNSolver(
+        window_size=WINDOW_SIZE, grid_cache=None
+    )
+    assert len(windowed._windows(6000)) > 1
+
+    for well in wells:
+        assert np.array_equal(windowed(*well), full(*well), equal_nan=True)
+
+
+def test_processing_uses_window_size(wells, monkeypatch):
+    full = [processor.process_prepared(*well, cache=None)[0] for well in wells]
+    full_wells = processor.process_wells(wells)
+
+    monkeypatch.setattr(processor, 'WINDOW_SIZE', WINDOW_SIZE)
+    windows = []
+    original = processor.BKZStd6GradientNNSolver._windows
+
+    def record_windows(self, length):
+        windows.append(self.window_size)
+        return original(self, length)
+
+    monkeypatch.setattr(
+        processor.BKZStd6GradientNNSolver, '_windows', record_windows
+    )
+
+    assert [
+        processor.process_prepared(*well, cache=None)[0] for well in wells
+    ] == full
+    assert processor.process_wells(wells) == full_wells
+    assert processor.process_intervals(
+        *wells[0][:2], [wells[0][2]], cache=None
+    )[0] == full[0]
+    assert windows and set(windows) == {WINDOW_SIZE}
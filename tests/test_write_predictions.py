@@ -0,0 +1,47 @@
+"""Запись файла .dat блоками (iter_prediction_chunks)."""
+import numpy as np
+import pytest
+
+import processor
+
+
+def _rowwise_text(z, all_predictions):
+    """Построчная запись .dat в прежнем виде (до записи блоками)."""
+    config_names = [filename for _, filename in processor.SOLVER_CONFIGS]
+    lines = ["DEPT  " + "  ".join(config_names) + "\n"]
+    for i in range(len(z)):
+        depth_str = processor.format_depth_value(z[i])
+        pred_str = "  ".join([f"{pred:10.3f}" for pred in all_predictions[i]])
+        lines.append(f"{depth_str:>6}  {pred_str}\n")
+    return "".join(lines)
+
+
+def _special_values(dtype):
+    rng = np.random.default_rng(0)
+    z = np.round(np.arange(995.0, 1005.0, 0.1), 1).astype(dtype)
+    z = np.concatenate([
+        z, np.array([0.0, -0.0, -5.0, -0.5, 12345678.0, 0.05, 0.25,
+                     np.nan, np.inf, -np.inf], dtype=dtype)
+    ])
+    predictions = rng.lognormal(2.0, 3.0, size=(len(z), len(processor.SOLVER_CONFIGS)))
+    predictions[:8, 0] = [np.nan, np.inf, -np.inf, -0.0, 0.0, -0.0004, 0.0005, 1e12]
+    predictions[-1] = -0.0
+    return z, predictions.astype(dtype)
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+@pytest.mark.parametrize('chunk_rows', [1, 7, processor.WRITE_CHUNK_ROWS])
+def test_chunks_match_rowwise_writer(dtype, chunk_rows):
+    z, predictions = _special_values(dtype)
+    text = "".join(processor.iter_prediction_chunks(z, predictions, chunk_rows))
+    expected = _rowwise_text(z, predictions)
+    assert text.encode('utf-8') == expected.encode('utf-8')
+    assert "   nan  " in text and "      -inf" in text and "    -0.000" in text
+
+
+def test_more_predictions_than_depths():
+    z, predictions = _special_values(np.float32)
+    text = "".join(processor.iter_prediction_chunks(z[:5], predictions))
+    assert text == _rowwise_text(z[:5], predictions)
+    with pytest.raises(ValueError, match="Предсказаний меньше"):
+        list(processor.iter_prediction_chunks(z, predictions[:5]))
@@ -0,0 +1,137 @@
+import asyncio
+from collections import OrderedDict, deque
+
+from metrics import metrics
+
+
+class UpdateQueue:
+    """
+    Очередь обновлений Telegram для вебхука.
+
+    Вебхук только кладет обновление в очередь и сразу отвечает Telegram,
+    обновления обрабатывают consumers фоновых задач. Повторные доставки
+    одного обновления отбрасываются по update_id (помнятся последние
+    dedup_size идентификаторов). Обновления одного пользователя
+    обрабатываются строго по очереди, в порядке поступления: пока одно
+    обрабатывается, следующие откладываются и не занимают consumers.
+    """
+
+    def __init__(self, dispatcher, bot, consumers, max_size, dedup_size):
+        if consumers < 1 or max_size < 1 or dedup_size < 1:
+            raise ValueError("Некорректные параметры очереди обновлений")
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.consumers = consumers
+        self.max_size = max_size
+        self.dedup_size = dedup_size
+        self._queue = asyncio.Queue()
+        self._seen = OrderedDict()  # update_id: None
+        # user_id: отложенные обновления пользователя, пока обрабатывается
+        # его предыдущее обновление
+        self._user_pending = {}
+        self._parked = 0  # число отложенных обновлений
+        self._tasks = []
+
+    @property
+    def size(self):
+        """Число ожидающих обновлений."""
+        return self._queue.qsize() + self._parked
+
+    def start(self):
+        """Запуск задач-обработчиков."""
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._consume())
+            for _ in range(self.consumers)
+        ]
+
+    async def stop(self, timeout=None):
+        """
+        Остановка обработчиков.
+
+        Принятые обновления (Telegram уже получил ответ и не пришлет их
+        снова) обрабатываются до timeout секунд, оставшиеся отбрасываются.
+        """
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                print(
+                    f"⚠️ Очередь обновлений не обработана до остановки, "
+                    f"отброшено: {self.size}"
+                )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._user_pending.clear()
+        self._parked = 0
+
+    def put(self, update):
+        """
+        Постановка обновления в очередь.
+
+        Returns:
+            bool: False, если обновление с таким update_id уже было
+
+        Raises:
+            asyncio.QueueFull: очередь переполнена (обновление не запомнено,
+                повторная доставка будет принята)
+        """
+        if update.update_id in self._seen:
+            self._seen.move_to_end(update.update_id)
+            return False
+
+        # Отложенные обновления пользователей тоже занимают место в очереди
+        if self.size >= self.max_size:
+            raise asyncio.QueueFull
+        self._queue.put_nowait(update)
+        self._seen[update.update_id] = None
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+        return True
+
+    async def _consume(self):
+        while True:
+            update = await self._queue.get()
+            user_id = self._user_id(update)
+            if user_id is None:
+                # Обновления без пользователя не упорядочиваются
+                await self._handle(update)
+                continue
+
+            pending = self._user_pending.get(user_id)
+            if pending is not None:
+                # Обновление выполнит consumer, занятый этим пользователем,
+                # после текущего; этот consumer свободен для других
+                pending.append(update)
+                self._parked += 1
+                continue
+
+            pending = self._user_pending[user_id] = deque()
+            try:
+                await self._handle(update)
+                while pending:
+                    update = pending.popleft()
+                    self._parked -= 1
+                    await self._handle(update)
+            finally:
+                del self._user_pending[user_id]
+
+    async def _handle(self, update):
+        try:
+            await self.dispatcher.feed_update(self.bot, update)
+        except Exception as e:
+            print(f"❌ Ошибка обработки обновления {update.update_id}: {e}")
+            metrics.inc('bkz_errors_total', source='update')
+        finally:
+            self._queue.task_done()
+
+    @staticmethod
+    def _user_id(update):
+        try:
+            user = getattr(update.event, 'from_user', None)
+        except Exception:
+            return None
+        return user.id if user is not None else None
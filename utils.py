@@ -1,41 +1,302 @@
+import asyncio
 import os
+import re
 import tempfile
 import shutil
+import time
+
+import config
+
+# Сколько байт начала файла читается для определения типа
+SNIFF_BYTES = 4096
+
+
+class QuotaExceededError(Exception):
+    """Файл не помещается в квоту хранилища загрузок."""
+
+
+class UserFile:
+    """Загруженный файл: содержимое в памяти (data) или на диске (path)."""
+    
+    def __init__(self, name, data=None, path=None, file_type='unknown',
+                 used_at=None):
+        self.name = name
+        self.data = data
+        self.path = path
+        self.file_type = file_type
+        self.size = len(data) if data is not None else os.path.getsize(path)
+        self.used_at = time.time() if used_at is None else used_at
+        # Задача разбора файла, запущенная при загрузке (см. bot.py)
+        self.prepared = None
+    
+    def read(self):
+        """Содержимое файла."""
+        if self.data is not None:
+            return self.data
+        with open(self.path, 'rb') as f:
+            return f.read()
+
 
 class FileManager:
-    """Менеджер для работы с временными файлами."""
+    """
+    Хранилище загруженных файлов.
+    
+    У пользователя хранится не больше одного файла каждого типа
+    (roh/rov/z): новый файл того же типа заменяет старый. Файлы, которые
+    не использовались дольше ttl, удаляет периодическая задача sweep.
+    При превышении квоты на пользователя или на все хранилище удаляются
+    давно не использованные файлы (LRU). Файлы на диске лежат в папках
+    tg_bot_<user_id>, по которым restore восстанавливает состояние после
+    перезапуска.
+    """
+    
+    DIR_PREFIX = "tg_bot_"
+    
+    def __init__(self, root, ttl, max_total_bytes, max_user_bytes):
+        self.root = root
+        self.ttl = ttl
+        self.max_total_bytes = max_total_bytes
+        self.max_user_bytes = max_user_bytes
+        self.user_files = {}  # user_id: [UserFile] в порядке загрузки
+        self._by_type = {}  # user_id: {тип: UserFile}
+        self._total_bytes = 0
+        self._sweeper = None
+        # Вызывается как on_remove(user_id, user_file) после удаления файла
+        # (очистка, устаревание, вытеснение по квоте, замена)
+        self.on_remove = None
+    
+    @property
+    def total_bytes(self):
+        """Суммарный размер всех файлов."""
+        return self._total_bytes
     
-    def __init__(self):
-        self.user_files = {}  # user_id: [file_paths]
+    def user_dir(self, user_id):
+        """Папка для файлов пользователя на диске."""
+        return os.path.join(self.root, f"{self.DIR_PREFIX}{user_id}")
     
-    def add_file(self, user_id, file_path):
-        if user_id not in self.user_files:
-            self.user_files[user_id] = []
-        self.user_files[user_id].append(file_path)
+    def add_file(self, user_id, file_path, file_type='unknown'):
+        """Добавляет файл, сохраненный на диске."""
+        return self._add(user_id, UserFile(
+            os.path.basename(file_path), path=file_path, file_type=file_type
+        ))
+    
+    def add_data(self, user_id, filename, data, file_type='unknown'):
+        """Добавляет файл, содержимое которого хранится в памяти."""
+        return self._add(
+            user_id, UserFile(filename, data=data, file_type=file_type)
+        )
+    
+    def _add(self, user_id, user_file):
+        """
+        Returns:
+            UserFile: замененный файл того же типа или None
+        
+        Raises:
+            QuotaExceededError: файл больше квоты на пользователя
+        """
+        if user_file.size > min(self.max_user_bytes, self.max_total_bytes):
+            self._delete_from_disk(user_file, keep_path=None)
+            raise QuotaExceededError(
+                f"Файл больше допустимого объема хранилища "
+                f"({self.max_user_bytes / 1024 / 1024:.0f} МБ)"
+            )
+        
+        replaced = None
+        if user_file.file_type != 'unknown':
+            replaced = self._by_type.get(user_id, {}).get(user_file.file_type)
+        # Файл с тем же путем уже перезаписан новым
+        for old_file in list(self.user_files.get(user_id, [])):
+            if old_file is replaced or (
+                    user_file.path is not None and old_file.path == user_file.path):
+                self._remove(user_id, old_file, keep_path=user_file.path)
+        
+        self.user_files.setdefault(user_id, []).append(user_file)
+        if user_file.file_type != 'unknown':
+            self._by_type.setdefault(user_id, {})[user_file.file_type] = user_file
+        self._total_bytes += user_file.size
+        self._enforce_quotas(user_id, user_file)
+        return replaced
     
     def get_user_files(self, user_id):
-        return self.user_files.get(user_id, [])
+        """Файлы пользователя в порядке загрузки (отмечаются использованными)."""
+        files = self.user_files.get(user_id, [])
+        now = time.time()
+        for user_file in files:
+            user_file.used_at = now
+        return files
+    
+    def get_user_file(self, user_id, file_type):
+        """Файл пользователя заданного типа или None."""
+        user_file = self._by_type.get(user_id, {}).get(file_type)
+        if user_file is not None:
+            user_file.used_at = time.time()
+        return user_file
+    
+    def remove_file(self, user_id, user_file):
+        """Удаляет один файл пользователя."""
+        self._remove(user_id, user_file)
     
     def clear_user_files(self, user_id):
         """Удаляет все файлы пользователя."""
-        if user_id in self.user_files:
-            for file_path in self.user_files[user_id]:
-                try:
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                    # Удаляем папку, если она пустая
-                    folder = os.path.dirname(file_path)
-                    if os.path.exists(folder) and not os.listdir(folder):
-                        shutil.rmtree(folder)
-                except:
-                    pass
-            del self.user_files[user_id]
+        for user_file in list(self.user_files.get(user_id, [])):
+            self._remove(user_id, user_file)
+    
     def clear_all(self):
         """Удаляет все файлы всех пользователей."""
         for user_id in list(self.user_files.keys()):
             self.clear_user_files(user_id)
+    
+    def sweep(self):
+        """Удаляет файлы, не использовавшиеся дольше ttl."""
+        expire_before = time.time() - self.ttl
+        removed = 0
+        for user_id, files in list(self.user_files.items()):
+            for user_file in list(files):
+                if user_file.used_at < expire_before:
+                    self._remove(user_id, user_file)
+                    removed += 1
+        return removed
+    
+    def start_sweeper(self, interval):
+        """Запуск периодической очистки в текущем цикле событий."""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever(interval))
+    
+    async def stop_sweeper(self):
+        """Остановка периодической очистки."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+    
+    async def _sweep_forever(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = self.sweep()
+                if removed:
+                    print(f"🧹 Удалено устаревших файлов: {removed}")
+            except Exception as e:
+                print(f"❌ Ошибка очистки файлов: {e}")
+    
+    def restore(self):
+        """
+        Восстановление состояния по папкам tg_bot_<user_id> после перезапуска.
+        
+        Время последнего использования берется из времени изменения
+        файла; устаревшие файлы и пустые папки удаляются.
+        """
+        pattern = re.compile(rf"{self.DIR_PREFIX}(\d+)$")
+        try:
+            names = sorted(os.listdir(self.root))
+        except FileNotFoundError:
+            return 0
+        
+        expire_before = time.time() - self.ttl
+        restored = 0
+        for name in names:
+            match = pattern.match(name)
+            folder = os.path.join(self.root, name)
+            if match is None or not os.path.isdir(folder):
+                continue
+            user_id = int(match.group(1))
+            paths = [
+                os.path.join(folder, filename)
+                for filename in os.listdir(folder)
+                if os.path.isfile(os.path.join(folder, filename))
+            ]
+            # Порядок загрузки восстанавливается по времени изменения
+            for path in sorted(paths, key=os.path.getmtime):
+                if any(user_file.path == path
+                       for user_file in self.user_files.get(user_id, [])):
+                    continue
+                user_file = UserFile(
+                    os.path.basename(path), path=path,
+                    file_type=detect_file_type(
+                        read_file_head(path), os.path.basename(path)
+                    ),
+                    used_at=os.path.getmtime(path)
+                )
+                if user_file.used_at < expire_before:
+                    self._delete_from_disk(user_file, keep_path=None)
+                    continue
+                try:
+                    self._add(user_id, user_file)
+                    restored += 1
+                except QuotaExceededError:
+                    pass
+            self._remove_empty_dir(folder)
+        
+        return restored
+    
+    def _enforce_quotas(self, user_id, keep):
+        """Вытеснение давно не использованных файлов сверх квот."""
+        user_files = self.user_files.get(user_id, [])
+        for user_file in sorted(user_files, key=lambda f: f.used_at):
+            if sum(f.size for f in user_files) <= self.max_user_bytes:
+                break
+            if user_file is not keep:
+                self._remove(user_id, user_file)
+        
+        if self._total_bytes <= self.max_total_bytes:
+            return
+        all_files = sorted(
+            ((f.used_at, owner, f)
+             for owner, files in self.user_files.items() for f in files),
+            key=lambda entry: entry[0]
+        )
+        for _, owner, user_file in all_files:
+            if self._total_bytes <= self.max_total_bytes:
+                break
+            if user_file is not keep:
+                self._remove(owner, user_file)
+    
+    def _remove(self, user_id, user_file, keep_path=None):
+        files = self.user_files.get(user_id, [])
+        if user_file in files:
+            files.remove(user_file)
+            self._total_bytes -= user_file.size
+        if not files:
+            self.user_files.pop(user_id, None)
+        
+        by_type = self._by_type.get(user_id, {})
+        if by_type.get(user_file.file_type) is user_file:
+            del by_type[user_file.file_type]
+        if not by_type:
+            self._by_type.pop(user_id, None)
+        
+        self._delete_from_disk(user_file, keep_path)
+        if self.on_remove is not None:
+            self.on_remove(user_id, user_file)
+    
+    def _delete_from_disk(self, user_file, keep_path):
+        if user_file.path is None or user_file.path == keep_path:
+            return
+        try:
+            if os.path.exists(user_file.path):
+                os.remove(user_file.path)
+            # Удаляем папку, если она пустая
+            self._remove_empty_dir(os.path.dirname(user_file.path))
+        except OSError:
+            pass
+    
+    @staticmethod
+    def _remove_empty_dir(folder):
+        try:
+            if os.path.exists(folder) and not os.listdir(folder):
+                shutil.rmtree(folder)
+        except OSError:
+            pass
 
-file_manager = FileManager()
+file_manager = FileManager(
+    root=tempfile.gettempdir(),
+    ttl=config.UPLOAD_TTL_MINUTES * 60,
+    max_total_bytes=config.UPLOAD_MAX_TOTAL_MB * 1024 * 1024,
+    max_user_bytes=config.UPLOAD_MAX_USER_MB * 1024 * 1024,
+)
 
 
 def get_file_type(filename):
@@ -46,20 +307,67 @@ def get_file_type(filename):
         return 'roh'
     elif 'rov' in name_lower:
         return 'rov'
-    elif 'z' in name_lower or filename.endswith('.ini'):
+    elif 'z' in name_lower or name_lower.endswith('.ini'):
         return 'z'
-    else:
-        # Попробуем определить по расширению
-        if filename.endswith('.obl'):
-            # Нужно посмотреть содержимое
-            try:
-                with open(filename, 'r') as f:
-                    first_line = f.readline().strip()
-                    values = first_line.split()
-                    if len(values) > 5:
-                        return 'rov'
-                    else:
-                        return 'roh'
-            except:
-                return 'unknown'
-        return 'unknown'
\ No newline at end of file
+    return 'unknown'
+
+
+def read_file_head(path):
+    """Начало файла для detect_file_type."""
+    with open(path, 'rb') as f:
+        return f.read(SNIFF_BYTES)
+
+
+def detect_file_type(head, filename=''):
+    """
+    Определяет тип файла по началу содержимого (SNIFF_BYTES байт),
+    а если по содержимому не удалось - по имени.
+    
+    roH: в строках 5 или 7 чисел, roV: 6 или 8 чисел,
+    z: строка заголовка и дальше по одному числу в строке.
+    
+    Returns:
+        'roh', 'rov', 'z' или 'unknown'
+    """
+    if isinstance(head, str):
+        head = head.encode('utf-8')
+    lines = head[:SNIFF_BYTES].splitlines()
+    # Последняя строка могла быть обрезана
+    if len(head) >= SNIFF_BYTES and len(lines) > 1:
+        lines = lines[:-1]
+    rows = [line.split() for line in lines if line.strip()]
+    
+    file_type = _file_type_by_columns(rows)
+    if file_type == 'unknown' and filename:
+        return get_file_type(filename)
+    return file_type
+
+
+def _file_type_by_columns(rows):
+    if not rows:
+        return 'unknown'
+    
+    if not _is_numeric(rows[0]):
+        # Заголовок z.ini
+        values = rows[1:]
+        if values and all(len(row) == 1 and _is_numeric(row) for row in values):
+            return 'z'
+        return 'unknown'
+    
+    if not all(_is_numeric(row) for row in rows):
+        return 'unknown'
+    columns = {len(row) for row in rows}
+    if columns <= {5, 7}:
+        return 'roh'
+    if columns <= {6, 8}:
+        return 'rov'
+    return 'unknown'
+
+
+def _is_numeric(row):
+    try:
+        for token in row:
+            float(token)
+    except ValueError:
+        return False
+    return True
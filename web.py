@@ -1,39 +1,113 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import PlainTextResponse
 from aiogram import Bot, Dispatcher, types
 from contextlib import asynccontextmanager
 import asyncio
-from config import BOT_TOKEN, APP_URL
+from config import (
+    BOT_TOKEN, APP_URL, ONNX_WARMUP, UPLOAD_SWEEP_INTERVAL_SECONDS,
+    WEBHOOK_ASYNC, WEBHOOK_CONSUMERS, WEBHOOK_QUEUE_SIZE, WEBHOOK_DEDUP_SIZE,
+    WEBHOOK_DRAIN_SECONDS
+)
 import bot
+from metrics import metrics
+from scheduler import job_scheduler
+from update_queue import UpdateQueue
 from utils import file_manager  # добавить этот импорт
 
 bot_instance = Bot(token=BOT_TOKEN)
 dp = bot.dp
+update_queue = None
+
+# Текущие значения для /metrics
+metrics.add_gauge(
+    'bkz_queue_depth', "Задачи обработки, ожидающие в очереди",
+    lambda: job_scheduler.queued
+)
+metrics.add_gauge(
+    'bkz_jobs_running', "Выполняемые задачи обработки",
+    lambda: job_scheduler.running
+)
+metrics.add_gauge(
+    'bkz_webhook_queue_depth', "Обновления Telegram, ожидающие обработки",
+    lambda: update_queue.size if update_queue is not None else 0
+)
+metrics.add_gauge(
+    'bkz_upload_bytes', "Размер загруженных файлов пользователей",
+    lambda: file_manager.total_bytes
+)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global update_queue
+    
+    # Файлы, оставшиеся на диске с прошлого запуска
+    restored = file_manager.restore()
+    if restored:
+        print(f"📂 Восстановлено файлов: {restored}")
+    file_manager.start_sweeper(UPLOAD_SWEEP_INTERVAL_SECONDS)
+    
+    # Очередь обновлений запускается до вебхука
+    if WEBHOOK_ASYNC:
+        update_queue = UpdateQueue(
+            dp, bot_instance,
+            consumers=WEBHOOK_CONSUMERS,
+            max_size=WEBHOOK_QUEUE_SIZE,
+            dedup_size=WEBHOOK_DEDUP_SIZE
+        )
+        update_queue.start()
+    
     # Установка вебхука
     webhook_url = f"{APP_URL}/webhook"
     await bot_instance.set_webhook(webhook_url)
     print(f"✅ Webhook установлен: {webhook_url}")
     
+    # Запуск процессов пула с загрузкой и прогревом модели до первого
+    # запроса (расчеты выполняются только в них)
+    if ONNX_WARMUP:
+        try:
+            await asyncio.to_thread(job_scheduler.start)
+            print("✅ Процессы обработки запущены")
+        except Exception as e:
+            print(f"❌ Ошибка прогрева модели: {e}")
+    
     yield
     
     # Очистка при остановке
+    if update_queue is not None:
+        # Принятые обновления Telegram повторно не пришлет
+        await update_queue.stop(timeout=WEBHOOK_DRAIN_SECONDS)
     from utils import file_manager
-    file_manager.clear_all()  # Очищаем все файлы
+    from scheduler import job_scheduler
+    job_scheduler.shutdown()
+    # Файлы на диске не удаляются: restore подхватит их при следующем
+    # запуске, а устаревшие удалит периодическая очистка
+    await file_manager.stop_sweeper()
     await bot_instance.delete_webhook()
     print("🛑 Webhook удален")
 
 app = FastAPI(lifespan=lifespan)
 
 @app.post("/webhook")
-async def webhook(request: Request):
+async def webhook(request: Request, response: Response):
     try:
         update = types.Update(**await request.json())
-        await dp.feed_update(bot_instance, update)
-        return {"status": "ok"}
+        if update_queue is None:
+            await dp.feed_update(bot_instance, update)
+            return {"status": "ok"}
+        
+        # Обработка в фоне, Telegram получает ответ сразу
+        if not update_queue.put(update):
+            return {"status": "duplicate"}
+        return {"status": "queued"}
+    except asyncio.QueueFull:
+        # Telegram повторит доставку позже
+        print("🚦 Очередь обновлений переполнена")
+        metrics.inc('bkz_errors_total', source='webhook_queue_full')
+        response.status_code = 503
+        return {"status": "busy"}
     except Exception as e:
         print(f"❌ Ошибка в webhook: {e}")
+        metrics.inc('bkz_errors_total', source='webhook')
         return {"status": "error", "detail": str(e)}
 
 @app.get("/")
@@ -45,4 +119,10 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4"
+    )
\ No newline at end of file
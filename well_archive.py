@@ -0,0 +1,172 @@
+import io
+import posixpath
+import tarfile
+import zipfile
+
+import processor
+from utils import detect_file_type, SNIFF_BYTES
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+FILE_TYPES = ('roh', 'rov', 'z')
+
+
+class ArchiveWell:
+    """Скважина из архива: разобранные roH, roV, z и хэши их содержимого."""
+
+    def __init__(self, name, prepared):
+        self.name = name
+        (self.domain_h, roh_digest), (self.domain_v, rov_digest), (
+            self.z, z_digest
+        ) = (prepared[file_type] for file_type in FILE_TYPES)
+        self.digests = [roh_digest, rov_digest, z_digest]
+
+
+def is_archive_name(filename):
+    """Архив со скважинами по имени файла."""
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _skipped_member(path):
+    """Служебные файлы архиваторов и скрытые файлы."""
+    parts = path.split('/')
+    return parts[0] == '__MACOSX' or any(part.startswith('.') for part in parts)
+
+
+def _read_member(fileobj, path, max_file_bytes):
+    data = fileobj.read(max_file_bytes + 1)
+    if len(data) > max_file_bytes:
+        raise ValueError(
+            f"Файл {path} больше {max_file_bytes // 1024 // 1024} МБ"
+        )
+    return data
+
+
+def iter_archive_files(fileobj, filename, max_file_bytes, max_total_bytes):
+    """
+    Файлы архива по одному, без распаковки на диск.
+
+    zip читается по оглавлению, tar (в том числе сжатый) - потоком.
+    Размеры проверяются по фактически прочитанным данным, а не по
+    заголовкам архива.
+
+    Yields:
+        tuple: (путь внутри архива, содержимое в bytes)
+    """
+    total_bytes = 0
+
+    def checked(path, data):
+        nonlocal total_bytes
+        total_bytes += len(data)
+        if total_bytes > max_total_bytes:
+            raise ValueError(
+                f"Распакованные файлы архива больше "
+                f"{max_total_bytes // 1024 // 1024} МБ"
+            )
+        return path, data
+
+    try:
+        if filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(fileobj) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or _skipped_member(info.filename):
+                        continue
+                    with archive.open(info) as member:
+                        yield checked(info.filename, _read_member(
+                            member, info.filename, max_file_bytes
+                        ))
+        else:
+            with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+                for info in archive:
+                    if not info.isfile() or _skipped_member(info.name):
+                        continue
+                    member = archive.extractfile(info)
+                    yield checked(info.name, _read_member(
+                        member, info.name, max_file_bytes
+                    ))
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+        raise ValueError(f"Не удалось прочитать архив: {e}") from None
+
+
+def read_wells(fileobj, filename, max_wells, max_file_bytes, max_total_bytes):
+    """
+    Скважины архива: файлы roH, roV и z, сгруппированные по папкам.
+
+    Тип каждого файла определяется по содержимому (detect_file_type),
+    файл разбирается сразу после распаковки, поэтому в памяти остаются
+    только массивы. Файлы неизвестного типа пропускаются.
+
+    Returns:
+        tuple: (список ArchiveWell в порядке архива,
+            список пар (папка, причина) для пропущенных папок)
+    """
+    folders = {}  # папка: {тип: (разобранный файл, хэш)}
+    errors = {}  # папка: причина пропуска
+
+    for path, data in iter_archive_files(
+        fileobj, filename, max_file_bytes, max_total_bytes
+    ):
+        folder = posixpath.dirname(path.rstrip('/'))
+        name = posixpath.basename(path)
+        file_type = detect_file_type(data[:SNIFF_BYTES], name)
+        if file_type == 'unknown' or folder in errors:
+            continue
+
+        files = folders.setdefault(folder, {})
+        if file_type in files:
+            errors[folder] = f"несколько файлов типа {file_type}"
+            continue
+        if len(folders) > max_wells:
+            raise ValueError(f"В архиве больше {max_wells} скважин")
+
+        try:
+            files[file_type] = processor.prepare_input(data, file_type)
+        except ValueError as e:
+            errors[folder] = f"{name}: {e}"
+
+    wells = []
+    skipped = []
+    for folder, files in folders.items():
+        well_name = folder or posixpath.splitext(filename)[0]
+        missing = [file_type for file_type in FILE_TYPES if file_type not in files]
+        if folder in errors:
+            skipped.append((well_name, errors[folder]))
+        elif missing:
+            skipped.append((well_name, "нет файлов: " + ", ".join(missing)))
+        else:
+            wells.append(ArchiveWell(well_name, files))
+
+    return wells, skipped
+
+
+def prediction_filenames(well_names):
+    """Имена файлов predictions_<скважина>.dat, без повторов."""
+    filenames = []
+    used = set()
+    for well_name in well_names:
+        stem = "predictions_" + well_name.strip('/').replace('/', '_')
+        filename = f"{stem}.dat"
+        suffix = 1
+        while filename in used:
+            suffix += 1
+            filename = f"{stem}_{suffix}.dat"
+        used.add(filename)
+        filenames.append(filename)
+    return filenames
+
+
+def pack_predictions(results):
+    """
+    Архив .zip с результатами.
+
+    Args:
+        results: пары (имя скважины, содержимое .dat в bytes)
+
+    Returns:
+        bytes: содержимое архива
+    """
+    buffer = io.BytesIO()
+    filenames = prediction_filenames([well_name for well_name, _ in results])
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, (_, data) in zip(filenames, results):
+            archive.writestr(filename, data)
+    return buffer.getvalue()
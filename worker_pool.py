@@ -0,0 +1,260 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+import config
+import processor
+from metrics import metrics
+
+# Выравнивание массивов в блоке общей памяти (байт)
+_ALIGNMENT = 64
+
+# Решатель процесса пула, создается в _init_worker
+_worker_solver = None
+
+
+def _share_arrays(arrays):
+    """
+    Копирование массивов в один блок общей памяти.
+
+    Returns:
+        tuple: (блок SharedMemory, описание для _attach_arrays)
+    """
+    layout = []
+    size = 0
+    for key, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        size = -(-size // _ALIGNMENT) * _ALIGNMENT
+        layout.append((key, array.dtype.str, array.shape, size))
+        size += array.nbytes
+
+    shm = SharedMemory(create=True, size=max(size, 1))
+    for (_, dtype, shape, offset), array in zip(layout, arrays.values()):
+        target = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        target[...] = array
+        del target
+    return shm, (shm.name, layout)
+
+
+def _attach_arrays(spec):
+    """
+    Подключение к блоку общей памяти из _share_arrays.
+
+    Массивы ссылаются на память блока: перед shm.close() все ссылки
+    на них должны быть удалены.
+    """
+    name, layout = spec
+    shm = SharedMemory(name=name)
+    arrays = {
+        key: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        for key, dtype, shape, offset in layout
+    }
+    return shm, arrays
+
+
+def threads_per_worker(workers):
+    """
+    Потоков ONNX Runtime внутри операции для каждого из workers процессов.
+
+    ONNX_INTRA_OP_THREADS, если задан, иначе ядра делятся между
+    процессами поровну, чтобы процессы не конкурировали за все ядра.
+    """
+    return config.ONNX_INTRA_OP_THREADS or max(1, (os.cpu_count() or 1) // workers)
+
+
+def configure_worker(session_config=None, grid_cache_bytes=None):
+    """
+    Настройки процесса пула: сессия ONNX Runtime и размер кэша входа сети.
+
+    session_config применяется к processor.SESSION_CONFIG, чтобы задачи
+    (processor.process_prepared и др.) использовали ту же сессию.
+    """
+    processor.SESSION_CONFIG.update(session_config or {})
+    if grid_cache_bytes is not None and processor.model_grid_cache is not None:
+        processor.model_grid_cache.max_bytes = grid_cache_bytes
+
+
+def _init_worker(model_path, session_config, grid_cache_bytes=None):
+    """Загрузка модели один раз при запуске процесса пула."""
+    global _worker_solver
+    configure_worker(session_config, grid_cache_bytes)
+    _worker_solver = processor.BKZStd6GradientNNSolver(
+        model_path, window_size=processor.WINDOW_SIZE
+    )
+    _worker_solver.warm_up()
+    # Прогрев не учитывается в метриках
+    metrics.take_snapshot()
+
+
+def run_with_metrics(func, args):
+    """
+    Выполнение задачи в процессе пула вместе с его метриками.
+    
+    Returns:
+        tuple: (результат или None, исключение или None,
+                MetricsRegistry.take_snapshot процесса)
+    """
+    try:
+        result, error = func(*args), None
+    except Exception as e:
+        result, error = None, e
+    return result, error, metrics.take_snapshot()
+
+
+def unpack_result(outcome):
+    """Результат run_with_metrics в основном процессе: метрики учитываются."""
+    result, error, snapshot = outcome
+    metrics.merge(snapshot)
+    if error is not None:
+        raise error
+    return result
+
+
+def _pack_value(value, arrays):
+    """Замена массивов NumPy и LayerTable ссылками на arrays."""
+    if isinstance(value, processor.LayerTable):
+        return ('table', [
+            _pack_value(array, arrays)
+            for array in (value.top, value.bottom, value.values, value.offsets)
+        ])
+    if isinstance(value, np.ndarray):
+        key = str(len(arrays))
+        arrays[key] = value
+        return ('array', key)
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, [_pack_value(item, arrays) for item in value])
+    return ('value', value)
+
+
+def _unpack_value(node, arrays):
+    """Обратное к _pack_value; массивы копируются из общей памяти."""
+    kind, value = node
+    if kind == 'array':
+        return arrays[value].copy()
+    if kind == 'table':
+        return processor.LayerTable(
+            *(_unpack_value(item, arrays) for item in value)
+        )
+    if kind == 'list':
+        return [_unpack_value(item, arrays) for item in value]
+    if kind == 'tuple':
+        return tuple(_unpack_value(item, arrays) for item in value)
+    return value
+
+
+def share_args(args):
+    """
+    Аргументы задачи для передачи в процесс пула через общую память.
+
+    Массивы NumPy и LayerTable (в том числе внутри списков и кортежей,
+    как скважины process_wells) копируются в один блок общей памяти,
+    остальные аргументы передаются обычной сериализацией.
+
+    Returns:
+        tuple: (блок SharedMemory или None - его нужно закрыть и удалить
+            после завершения задачи, описание для run_shared_with_metrics)
+    """
+    arrays = {}
+    template = _pack_value(tuple(args), arrays)
+    if not arrays:
+        return None, (None, template)
+    shm, spec = _share_arrays(arrays)
+    return shm, (spec, template)
+
+
+def _unshare_args(shared):
+    spec, template = shared
+    if spec is None:
+        return _unpack_value(template, {})
+    shm, arrays = _attach_arrays(spec)
+    try:
+        return _unpack_value(template, arrays)
+    finally:
+        arrays.clear()
+        shm.close()
+
+
+def run_shared_with_metrics(func, shared):
+    """run_with_metrics для аргументов, переданных через share_args."""
+    try:
+        args = _unshare_args(shared)
+    except Exception as e:
+        return None, e, metrics.take_snapshot()
+    return run_with_metrics(func, args)
+
+
+def _ping():
+    return None
+
+
+class ProcessPoolBackend:
+    """
+    Пул процессов для расчетов с моделью, загруженной в каждом процессе.
+
+    У каждого процесса свой однопроцессный ProcessPoolExecutor, чтобы
+    задачу можно было отправить в конкретный процесс (например, туда,
+    где в кэше уже есть подготовленная модель). Массивы аргументов задач
+    передаются процессам через общую память (share_args), а не
+    сериализацией. Ядра (threads_per_worker) и кэш подготовки входа сети
+    (GRID_CACHE_MAX_MB) делятся между процессами поровну.
+    """
+
+    def __init__(self, workers, model_path=processor.DEFAULT_MODEL_PATH,
+                 session_config=None):
+        if workers < 1:
+            raise ValueError("Число процессов должно быть положительным")
+        self.workers = workers
+        self.model_path = model_path
+        self.session_config = dict(
+            {'intra_op_threads': threads_per_worker(workers)},
+            **(session_config or {})
+        )
+        self.grid_cache_bytes = config.GRID_CACHE_MAX_MB * 1024 * 1024 // workers
+        self._executors = [None] * workers
+
+    def executor(self, index):
+        """ProcessPoolExecutor процесса index с загруженной моделью."""
+        if self._executors[index] is None:
+            self._executors[index] = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(
+                    self.model_path, self.session_config, self.grid_cache_bytes
+                ),
+            )
+        return self._executors[index]
+
+    def reset(self, index):
+        """
+        Замена процесса index после его аварийного завершения
+        (BrokenProcessPool, например при нехватке памяти): новый процесс
+        сразу запускается и загружает модель.
+        """
+        executor = self._executors[index]
+        self._executors[index] = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.executor(index).submit(_ping)
+
+    def start(self):
+        """
+        Запуск всех процессов пула с загрузкой и прогревом модели.
+
+        Без этого процессы запускаются при первых задачах.
+        """
+        futures = [
+            self.executor(index).submit(_ping) for index in range(self.workers)
+        ]
+        for future in futures:
+            future.result()
+
+    def shutdown(self, wait=False):
+        """Остановка процессов пула."""
+        for index, executor in enumerate(self._executors):
+            if executor is not None:
+                executor.shutdown(wait=wait, cancel_futures=True)
+                self._executors[index] = None